@@ -1,88 +1,167 @@
 # app.py
 import base64
 import json
-import re
 import tempfile
 import uuid
-from datetime import datetime
 from pathlib import Path
-from zoneinfo import ZoneInfo
+from typing import Optional
+from urllib.parse import quote, urlencode
 
 import streamlit as st
 import streamlit.components.v1 as components
 
 from core.extract_text import extract_text
-from core.tts import tts_to_wav_file, tts_to_mp3_file
-from core.stt import whisper_segments_verbose_json, extract_segments, merge_segments
-from core.storage import LocalStorage, B2Storage, Storage
-from core.audio_utils import wav_duration_seconds, stitch_wavs, convert_wav_to_mp3
-from core.alignment import align_segments_to_text, AlignConfig
+from core.tts import tts_to_mp3_file
+from core.config import get_secret
+from core.storage import Storage, get_storage
+from core.history import HistoryStore, history_store, now_pt_string, record_ts
+from core.media_server import (
+    DEFAULT_MEDIA_HOST,
+    DEFAULT_MEDIA_PORT,
+    VERSION_PARAM,
+    media_server_healthy,
+    start_media_server,
+)
+from core.jobs import JobQueue, QUEUED, RUNNING, DONE, FAILED
+from core.worker import default_db_path, spawn_local_workers
+from core.pipeline import TIMING_MODES
+from core.audio_utils import RENDITION_CODECS, parse_hls_playlist
+from core.cache import MemoryLru
+from core.checkpoints import live_chunks
+from core.ratelimit import configure_rate_limits, rate_limit_db_path, shared_limiter_metrics
 
 # ----------------------------
 # Config
 # ----------------------------
 MAX_UPLOAD_BYTES = 2 * 1024 * 1024  # 2 MB
 
-# TTS: stay below the per-request limit with buffer
-TTS_CHUNK_MAX_CHARS = 3600
-
 PREVIEW_MAX_CHARS = 1200
 PREVIEW_HEIGHT_PX = 160
 
 DATA_DIR = Path.cwd() / "data"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
-HISTORY_KEY = "history.json"
-
 VOICES = ["cedar", "nova", "alloy", "marin"]
 VOICE_PREVIEW_TEXT = "Hi! I'm Peachy. This is a quick preview of the voice you're about to choose."
 
-# Merge for a nicer UI + better alignment anchors
-DISPLAY_SEG_MAX_SECONDS = 10.0
-DISPLAY_SEG_MAX_CHARS = 520
+TIMING_LABELS = {
+    "whisper": "Whisper (most natural, transcribes to sync text)",
+    "sentence": "Per-sentence (faster + cheaper, no transcription)",
+    "pause": "Pause detection (local, Whisper only where unsure)",
+}
 
 READING_HEIGHT_PX = 700
 
-TZ = ZoneInfo("America/Los_Angeles")
+# Formats the browser reports it can play (set by probe_audio_support); MP3/WAV play everywhere
+AUDIO_SUPPORT_COOKIE = "peachy_audio"
+ALWAYS_PLAYABLE = {"mp3", "wav"}
 
+# Item media (HLS segments, audio files) served over HTTP by core.media_server, so the player
+# fetches only what it plays. Opt-in: MEDIA_BASE_URL is where browsers reach it (e.g. a path
+# the app's reverse proxy forwards to it); empty = audio is embedded in the page. The app starts
+# one on MEDIA_HOST:MEDIA_PORT; MEDIA_PORT=0 if you run `python -m core.media_server` yourself.
+# Audio is only served by URL while a health check of MEDIA_BASE_URL passes.
+MEDIA_BASE_URL = str(get_secret("MEDIA_BASE_URL", "")).rstrip("/")
+MEDIA_HOST = str(get_secret("MEDIA_HOST", DEFAULT_MEDIA_HOST))
+MEDIA_PORT = int(get_secret("MEDIA_PORT", DEFAULT_MEDIA_PORT))
+MEDIA_HEALTH_TTL_SECONDS = 60
+# Presigned URLs handed to browsers (STORAGE_BACKEND=b2: audio comes straight from the bucket,
+# not through this server). A page never re-signs, so a URL must outlive the longest listening
+# session: each one is reused for PRESIGN_REUSE_SECONDS (reruns keep the same URL, and the
+# browser its cache) and signed for B2_PRESIGN_SECONDS on top, i.e. at least that long left
+# whenever it's handed out. S3 caps signatures at 7 days.
+PRESIGN_SECONDS = int(get_secret("B2_PRESIGN_SECONDS", 12 * 3600))
+PRESIGN_REUSE_SECONDS = 3600
+PRESIGN_MAX_SECONDS = 7 * 24 * 3600
 
-# ----------------------------
-# Storage selection (local vs B2)
-# ----------------------------
-def get_storage() -> Storage:
-    backend = (st.secrets.get("STORAGE_BACKEND") or "local").lower()
-
-    if backend == "b2":
-        return B2Storage(
-            endpoint_url=st.secrets["B2_S3_ENDPOINT"],
-            bucket=st.secrets["B2_BUCKET"],
-            access_key_id=st.secrets["B2_ACCESS_KEY_ID"],
-            secret_access_key=st.secrets["B2_SECRET_APPL_KEY"],
-            prefix=st.secrets.get("B2_PREFIX", ""),
-        )
+# Generation runs in worker processes (core.worker) fed by a SQLite job queue.
+# JOB_WORKERS = how many the app starts itself; 0 if you run `python -m core.worker` separately.
+LOCAL_WORKERS = int(get_secret("JOB_WORKERS", 1))
+JOB_POLL_SECONDS = 2.0
 
-    return LocalStorage(root=DATA_DIR)
+# History entries listed in the sidebar (newest first)
+HISTORY_PAGE_SIZE = 50
 
 
-storage = get_storage()
+@st.cache_resource
+def get_app_storage() -> Storage:
+    # one backend (and B2 connection pool) per process, shared by every session and rerun
+    return get_storage(DATA_DIR)
 
 
-# ----------------------------
-# Helpers
-# ----------------------------
-def load_history() -> list[dict]:
-    return storage.read_json(HISTORY_KEY, [])
+storage = get_app_storage()
 
 
-def save_history(items: list[dict]) -> None:
-    storage.write_json(HISTORY_KEY, items)
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    return JobQueue(default_db_path(DATA_DIR))
 
 
-def now_pt_string() -> str:
-    dt = datetime.now(TZ)
-    return dt.strftime("%Y-%m-%d %I:%M %p")
+@st.cache_resource
+def _local_worker_procs() -> list:
+    return []
+
+
+def ensure_local_workers() -> None:
+    procs = _local_worker_procs()
+    procs[:] = [p for p in procs if p.poll() is None]
+    missing = LOCAL_WORKERS - len(procs)
+    if missing > 0:
+        procs.extend(spawn_local_workers(missing, default_db_path(DATA_DIR), DATA_DIR))
+
+
+@st.cache_resource
+def _configure_rate_limits() -> bool:
+    # voice previews in this process draw from the same budget as the workers
+    configure_rate_limits(rate_limit_db_path(DATA_DIR))
+    return True
+
+
+@st.cache_resource
+def _start_media_server() -> bool:
+    """
+    Starts the in-process media server; False if none runs here (disabled, or the port is
+    taken, e.g. by another app process; the health check tells whether that one serves us).
+    """
+    if not MEDIA_BASE_URL or MEDIA_PORT <= 0:
+        return False
+    try:
+        start_media_server(storage, host=MEDIA_HOST, port=MEDIA_PORT)
+    except OSError:
+        return False
+    return True
 
 
+@st.cache_data(ttl=MEDIA_HEALTH_TTL_SECONDS, show_spinner=False)
+def _media_server_healthy() -> bool:
+    return media_server_healthy(MEDIA_BASE_URL)
+
+
+def media_available() -> bool:
+    if not MEDIA_BASE_URL:
+        return False
+    _start_media_server()
+    return _media_server_healthy()
+
+
+@st.cache_resource
+def get_history_store() -> HistoryStore:
+    return history_store(storage)
+
+
+def reset_history_pages() -> None:
+    # a new search starts from its newest match
+    st.session_state.history_cursors = [None]
+
+
+job_queue = get_job_queue()
+_configure_rate_limits()
+ensure_local_workers()
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
 def make_preview(text: str, max_chars: int = PREVIEW_MAX_CHARS) -> str:
     t = (text or "").strip()
     if not t:
@@ -140,81 +219,6 @@ def html_escape(s: str) -> str:
     )
 
 
-def split_text_into_chunks_with_offsets(text: str, max_chars: int) -> list[dict]:
-    """
-    Returns list of:
-      { "text": <exact substring>, "orig_start": int, "orig_end": int }
-    Splits on paragraph boundaries when possible, else splits inside long paragraphs.
-    """
-    if not text:
-        return []
-
-    # paragraph separators: 2+ newlines
-    sep_pat = re.compile(r"\n{2,}")
-    spans: list[tuple[int, int]] = []
-
-    start = 0
-    for m in sep_pat.finditer(text):
-        end = m.end()  # include separator in span
-        spans.append((start, end))
-        start = end
-    if start < len(text):
-        spans.append((start, len(text)))
-
-    chunks: list[dict] = []
-    cur_start = None
-    cur_end = None
-
-    def flush():
-        nonlocal cur_start, cur_end
-        if cur_start is None or cur_end is None or cur_end <= cur_start:
-            cur_start, cur_end = None, None
-            return
-        chunk_text = text[cur_start:cur_end]
-        chunks.append({"text": chunk_text, "orig_start": cur_start, "orig_end": cur_end})
-        cur_start, cur_end = None, None
-
-    for (p_start, p_end) in spans:
-        p_len = p_end - p_start
-
-        # If paragraph span itself is huge, split inside it
-        if p_len > max_chars:
-            flush()
-            i = p_start
-            while i < p_end:
-                j = min(p_end, i + max_chars)
-
-                # try to cut at sentence boundary
-                slice_ = text[i:j]
-                cut = slice_.rfind(". ")
-                if cut < int(max_chars * 0.55):
-                    cut = slice_.rfind(" ")
-                if cut <= 0:
-                    cut = len(slice_)
-
-                piece_end = i + cut
-                if piece_end <= i:
-                    piece_end = j
-
-                chunks.append({"text": text[i:piece_end], "orig_start": i, "orig_end": piece_end})
-                i = piece_end
-            continue
-
-        # Normal paragraph: try to add into current chunk
-        if cur_start is None:
-            cur_start, cur_end = p_start, p_end
-        else:
-            if (p_end - cur_start) <= max_chars:
-                cur_end = p_end
-            else:
-                flush()
-                cur_start, cur_end = p_start, p_end
-
-    flush()
-    # filter empty-ish
-    return [c for c in chunks if (c["text"] or "").strip()]
-
-
 def voice_preview_bytes(voice: str, speed: float) -> bytes:
     speed_key = f"{float(speed):.2f}".replace(".", "_")
     key = f"voice_previews/{voice}_s{speed_key}.mp3"
@@ -250,12 +254,292 @@ def try_close_sidebar_once() -> None:
     )
 
 
-def render_audio_and_clickable_doc(audio_bytes: bytes, mime: str, full_text: str, segments: list[dict], marker: str) -> None:
+def probe_audio_support() -> None:
+    """
+    Asks the browser which rendition formats it can play (canPlayType) and remembers the
+    answer in a cookie; the next run reads it back via st.context.cookies.
+    Only "probably" counts, deliberately: the player has no per-source fallback, so a
+    "maybe" that can't decode would leave the item silent, while skipping a rendition
+    just means a bigger file (Safari, which says "maybe" to Opus, says "probably" to AAC).
+    """
+    if AUDIO_SUPPORT_COOKIE in st.context.cookies:
+        return
+    types = {fmt: mime for fmt, (_, mime, _) in RENDITION_CODECS.items()}
+    components.html(
+        f"""
+        <script>
+          (function() {{
+            try {{
+              const types = {json.dumps(types)};
+              const a = document.createElement("audio");
+              const ok = Object.keys(types).filter(f => a.canPlayType(types[f]) === "probably");
+              window.parent.document.cookie =
+                "{AUDIO_SUPPORT_COOKIE}=" + (ok.join(".") || "none") + "; path=/; max-age=2592000; SameSite=Lax";
+            }} catch (e) {{}}
+          }})();
+        </script>
+        """,
+        height=0,
+    )
+
+
+def choose_rendition(audio: dict, existing: set[str]) -> tuple[str, str]:
+    """
+    (key, mime) of the smallest rendition in manifest["audio"] this browser can play.
+    Until the browser has been probed only the primary (MP3/WAV) counts as playable.
+    """
+    supported = ALWAYS_PLAYABLE | set(str(st.context.cookies.get(AUDIO_SUPPORT_COOKIE, "")).split("."))
+    for r in audio.get("renditions") or []:
+        if r.get("format") in supported and r.get("key") in existing:
+            return r["key"], r.get("mime") or "audio/mpeg"
+    return "", ""
+
+
+@st.cache_data(ttl=PRESIGN_REUSE_SECONDS, max_entries=4096, show_spinner=False)
+def presigned_url(key: str) -> Optional[str]:
+    # cached so reruns hand the browser the same URL (and it can reuse what it already fetched)
+    return storage.presigned_url(key, expires_in=min(PRESIGN_SECONDS + PRESIGN_REUSE_SECONDS, PRESIGN_MAX_SECONDS))
+
+
+def media_url_js(key: str, version: str = "") -> Optional[str]:
+    """
+    JS expression for a URL the browser can fetch `key` from: straight from the bucket
+    (presigned) when the storage backend can sign, else via the media server; None if neither.
+    Pass the item's version (manifest ETag) for media server URLs the browser may cache for good.
+    """
+    url = presigned_url(key)
+    if url:
+        return json.dumps(url)
+    if media_available():
+        query = f"?{urlencode({VERSION_PARAM: version})}" if version else ""
+        return json.dumps(f"{MEDIA_BASE_URL}/{quote(key)}{query}")
+    return None
+
+
+def item_media(audio_key: str, art: dict) -> Optional[dict]:
+    """
+    How the reading view loads an item's audio by URL (see media_player_js); None = embed it.
+    Presigned playlists can't point at their segments (each needs its own signature), so
+    for those the segment list is resolved here, with a presigned URL per segment.
+    """
+    if not audio_key:
+        return None
+    audio_url = media_url_js(audio_key, art["version"])
+    if audio_url is None:
+        return None
+    playlist_key = art["playlist_key"]
+    if not playlist_key:
+        return {"playlist_url": None, "audio_url": audio_url, "segments": None}
+    if not presigned_url(playlist_key):
+        return {"playlist_url": media_url_js(playlist_key, art["version"]), "audio_url": audio_url, "segments": None}
+
+    seg_dir = playlist_key.rsplit("/", 1)[0]
+    segs, t = [], 0.0
+    for uri, dur in art["playlist"]:
+        segs.append({"uri": presigned_url(f"{seg_dir}/{uri}"), "start": t, "end": t + dur})
+        t += dur
+    return {"playlist_url": None, "audio_url": audio_url, "segments": segs}
+
+
+@st.cache_resource
+def artifact_cache() -> MemoryLru:
+    # shared by all sessions; ARTIFACT_CACHE_MB bounds the bytes held
+    return MemoryLru(int(float(get_secret("ARTIFACT_CACHE_MB", 256)) * 1024 * 1024))
+
+
+def item_artifacts(item_prefix: str) -> dict:
+    """
+    full.txt, segments.json, manifest.json, the parsed HLS playlist and which audio objects
+    exist, cached in memory per item version. generate_item writes manifest.json last, so
+    its ETag versions the whole item: a repeat view costs one stat instead of the reads.
+    """
+    manifest_key = f"{item_prefix}/manifest.json"
+    info = storage.stat(manifest_key)
+    version = info.etag if info is not None else ""
+    ck = ("item", item_prefix, version)
+    if version:
+        hit = artifact_cache().get(ck)
+        if hit is not None:
+            return hit
+
+    full_text_key = f"{item_prefix}/full.txt"
+    raw_text = storage.read_bytes(full_text_key) if storage.exists(full_text_key) else b""
+    segments = storage.read_json(f"{item_prefix}/segments.json", [])
+    manifest = storage.read_json(manifest_key, {}) if info is not None else {}
+
+    audio = manifest.get("audio") or {}
+    candidates = {f"{item_prefix}/audio.mp3", f"{item_prefix}/audio.wav", audio.get("key")}
+    candidates |= {r.get("key") for r in audio.get("renditions") or []}
+    existing = {k for k in candidates if k and storage.exists(k)}
+
+    playlist_key = (manifest.get("hls") or {}).get("playlist", "")
+    playlist = parse_hls_playlist(storage.read_text(playlist_key)) if playlist_key and storage.exists(playlist_key) else []
+
+    art = {
+        "full_text": raw_text.decode("utf-8", errors="ignore"),
+        "segments": segments,
+        "manifest": manifest,
+        "existing": existing,
+        "playlist_key": playlist_key if playlist else "",
+        "playlist": playlist,
+        "version": version,
+    }
+    if version:
+        size = 2 * len(raw_text) + len(json.dumps(segments)) + len(json.dumps(manifest)) + 64 * len(playlist)
+        artifact_cache().put(ck, art, size)
+    return art
+
+
+def item_audio_bytes(audio_key: str, art: dict) -> bytes:
+    """
+    Audio to embed (no media URL available), cached alongside the item's other artifacts.
+    """
+    ck = ("audio", audio_key, art["version"])
+    data = artifact_cache().get(ck) if art["version"] else None
+    if data is None:
+        data = storage.read_bytes(audio_key)
+        if art["version"]:
+            artifact_cache().put(ck, data, len(data))
+    return data
+
+
+def media_player_js(audio_id: str, media: dict) -> str:
+    """
+    Points the <audio> at item media by URL (no bytes in the page), per item_media().
+    With HLS segments only the ones around the playback position are fetched: Media
+    Source Extensions where the browser has them, native HLS (Safari/iOS) otherwise.
+    Seeking (e.g. a clicked span) fetches just the segment that holds the new position.
+    Otherwise the whole file plays by URL (the browser fetches it with Range requests).
+    """
+    return f"""
+        (async function() {{
+          const audio = document.getElementById("{audio_id}");
+          if (!audio) return;
+          const url = {media["playlist_url"] or "null"};
+          const fallback = {media["audio_url"] or "null"};
+          let segs = {json.dumps(media["segments"])};
+
+          if (!url && !segs) {{
+            if (fallback) audio.src = fallback;
+            return;
+          }}
+
+          if (!(window.MediaSource && MediaSource.isTypeSupported("audio/mpeg"))) {{
+            if (url && audio.canPlayType("application/vnd.apple.mpegurl")) audio.src = url;
+            else if (fallback) audio.src = fallback;
+            return;
+          }}
+
+          if (!segs) try {{
+            segs = [];
+            const text = await (await fetch(url)).text();
+            let t = 0, dur = null;
+            for (const raw of text.split("\\n")) {{
+              const line = raw.trim();
+              if (line.startsWith("#EXTINF:")) dur = parseFloat(line.slice(8));
+              else if (line && !line.startsWith("#") && dur !== null) {{
+                // segments inherit the playlist's version query (see media_url_js)
+                const u = new URL(line, url);
+                if (!u.search) u.search = new URL(url).search;
+                segs.push({{ uri: u.href, start: t, end: t + dur }});
+                t += dur;
+                dur = null;
+              }}
+            }}
+          }} catch (err) {{}}
+          if (!segs.length) {{
+            if (fallback) audio.src = fallback;
+            return;
+          }}
+
+          const ms = new MediaSource();
+          audio.src = URL.createObjectURL(ms);
+          await new Promise(r => ms.addEventListener("sourceopen", r, {{ once: true }}));
+          ms.duration = segs[segs.length - 1].end;
+          // MPEG audio has no timestamps of its own: "sequence" mode, placed via timestampOffset
+          const sb = ms.addSourceBuffer("audio/mpeg");
+
+          // segments kept buffered on each side of the playhead (the rest is evicted)
+          const KEEP = 3;
+          const loaded = new Set();
+          let chain = Promise.resolve();
+          let gaveUp = false;
+
+          const run = (op) => {{
+            chain = chain.then(() => new Promise((resolve) => {{
+              const done = () => resolve();
+              sb.addEventListener("updateend", done, {{ once: true }});
+              try {{ op(); }} catch (err) {{ sb.removeEventListener("updateend", done); resolve(); }}
+            }}));
+            return chain;
+          }};
+
+          const segAt = (time) => {{
+            let lo = 0, hi = segs.length - 1;
+            while (lo < hi) {{
+              const mid = (lo + hi + 1) >> 1;
+              if (segs[mid].start <= time) lo = mid; else hi = mid - 1;
+            }}
+            return lo;
+          }};
+
+          const load = async (i) => {{
+            if (i < 0 || i >= segs.length || loaded.has(i)) return;
+            loaded.add(i);
+            try {{
+              const res = await fetch(segs[i].uri);
+              if (!res.ok) throw new Error("HTTP " + res.status);
+              const buf = await res.arrayBuffer();
+              await run(() => {{ sb.timestampOffset = segs[i].start; sb.appendBuffer(buf); }});
+              if (i === segs.length - 1 && ms.readyState === "open") {{
+                await chain;
+                try {{ ms.endOfStream(); }} catch (err) {{}}
+              }}
+            }} catch (err) {{
+              loaded.delete(i);
+              // nothing playable yet (e.g. a bucket without CORS rules for fetch): play the whole file instead
+              if (!loaded.size && !sb.buffered.length && fallback && !gaveUp) {{
+                gaveUp = true;
+                audio.src = fallback;
+              }}
+            }}
+          }};
+
+          const ensure = () => {{
+            if (gaveUp) return;
+            const cur = segAt(audio.currentTime || 0);
+            for (const j of Array.from(loaded)) {{
+              if (Math.abs(j - cur) > KEEP) {{
+                loaded.delete(j);
+                run(() => sb.remove(segs[j].start, segs[j].end));
+              }}
+            }}
+            load(cur).then(() => load(cur + 1));
+          }};
+
+          audio.addEventListener("timeupdate", ensure);
+          audio.addEventListener("seeking", ensure);
+          ensure();
+        }})();
+    """
+
+
+def render_audio_and_clickable_doc(
+    audio_bytes: bytes,
+    mime: str,
+    full_text: str,
+    segments: list[dict],
+    marker: str,
+    media: Optional[dict] = None,
+) -> None:
     """
     Shows original extracted text (format preserved via pre-wrap).
     Click highlighted spans to seek+play audio.
+    With `media` (see item_media) the audio is loaded by URL instead of being embedded
+    as audio_bytes: presigned from the bucket or via core.media_server, segment by
+    segment if the item has HLS output.
     """
-    if not audio_bytes:
+    if not audio_bytes and media is None:
         st.warning("Audio missing.")
         return
 
@@ -301,16 +585,23 @@ def render_audio_and_clickable_doc(audio_bytes: bytes, mime: str, full_text: str
 
     doc_html = "".join(parts)
 
-    audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
     audio_id = f"peachy_audio_{marker}_{uuid.uuid4().hex}"
     doc_id = f"peachy_doc_{marker}_{uuid.uuid4().hex}"
 
+    if media is not None:
+        audio_html = f'<audio id="{audio_id}" controls preload="metadata" style="width:100%;"></audio>'
+        player_js = media_player_js(audio_id, media)
+    else:
+        audio_b64 = base64.b64encode(audio_bytes).decode("utf-8")
+        audio_html = f"""<audio id="{audio_id}" controls style="width:100%;">
+            <source src="data:{mime};base64,{audio_b64}" type="{mime}" />
+          </audio>"""
+        player_js = ""
+
     components.html(
         f"""
         <div class="wrap">
-          <audio id="{audio_id}" controls style="width:100%;">
-            <source src="data:{mime};base64,{audio_b64}" type="{mime}" />
-          </audio>
+          {audio_html}
 
           <div id="{doc_id}" class="doc">
             {doc_html}
@@ -367,6 +658,7 @@ def render_audio_and_clickable_doc(audio_bytes: bytes, mime: str, full_text: str
               audio.play().catch(() => {{}});
             }});
           }})();
+          {player_js}
         </script>
         """,
         height=90 + READING_HEIGHT_PX + 40,
@@ -374,17 +666,343 @@ def render_audio_and_clickable_doc(audio_bytes: bytes, mime: str, full_text: str
     )
 
 
+def chunk_audio_b64(key: str) -> str:
+    # chunk keys embed the chunk fingerprint, so their bytes never change; bounded by the artifact LRU
+    ck = ("chunk_b64", key)
+    data = artifact_cache().get(ck)
+    if data is None:
+        data = base64.b64encode(storage.read_bytes(key)).decode("utf-8")
+        artifact_cache().put(ck, data, len(data))
+    return data
+
+
+def live_chunks_held(item_id: str, ready: list[int]) -> set[int]:
+    """
+    Embed fallback of the live player: indices of the ready chunks this session's page
+    already holds (inlined by an earlier render, kept in the parent page), so a rebuild
+    only inlines the newly ready ones. Stable until the ready set changes, so a poll
+    with nothing new renders identical HTML.
+    """
+    rec = st.session_state.get("live_embed") or {}
+    if rec.get("item") != item_id:
+        rec = {"item": item_id, "held": [], "ready": []}
+    if ready != rec["ready"]:
+        rec = {"item": item_id, "held": sorted(set(rec["held"]) | set(rec["ready"])), "ready": ready}
+    st.session_state.live_embed = rec
+    return set(rec["held"])
+
+
+def render_live_player(item_id: str, full_text: str, chunks: list[dict]) -> None:
+    """
+    Chunk-by-chunk player for an item that is still generating. Plays the ready prefix
+    of chunks back to back; the position lives in the parent page's sessionStorage, so
+    it survives the iframe being rebuilt when another chunk lands.
+    """
+    playable: list[dict] = []
+    for c in chunks:
+        if not c["audio_key"]:
+            break
+        playable.append(c)
+
+    # text: spans (chunk-local start times) where aligned, greyed out where not ready yet
+    parts: list[str] = []
+    pos = 0
+    n = len(full_text)
+    for c in chunks:
+        a, b = int(c["orig_char_start"]), min(int(c["orig_char_end"]), n)
+        if a > pos:
+            parts.append(html_escape(full_text[pos:a]))
+            pos = a
+        if c["segments"] is None or not c["audio_key"]:
+            cls = "pending" if not c["audio_key"] else ""
+            parts.append(f'<span class="{cls}">{html_escape(full_text[pos:b])}</span>')
+            pos = max(pos, b)
+            continue
+        for sg in sorted(c["segments"], key=lambda x: x["orig_char_start"]):
+            sa, sb = int(sg["orig_char_start"]), min(int(sg["orig_char_end"]), b)
+            if sa < pos or sb <= sa:
+                continue
+            if sa > pos:
+                parts.append(html_escape(full_text[pos:sa]))
+            parts.append(
+                f'<span class="seg" data-chunk="{c["index"]}" data-start="{float(sg["start"]):.3f}">'
+                f"{html_escape(full_text[sa:sb])}</span>"
+            )
+            pos = sb
+        if b > pos:
+            parts.append(html_escape(full_text[pos:b]))
+            pos = b
+    if pos < n:
+        parts.append(html_escape(full_text[pos:]))
+
+    urls = [media_url_js(c["audio_key"]) for c in playable]
+    if all(urls):
+        sources = "[" + ", ".join(urls) + "]"
+        inline = "{}"
+    else:
+        # data: URIs, but only for chunks the page doesn't hold yet (see liveBank in the script)
+        sources = "null"
+        held = live_chunks_held(item_id, [int(c["index"]) for c in playable])
+        inline = json.dumps(
+            {
+                str(c["index"]): f'data:{c["mime"]};base64,{chunk_audio_b64(c["audio_key"])}'
+                for c in playable
+                if int(c["index"]) not in held
+            }
+        )
+    status = f"{len(playable)}/{len(chunks)} chunks ready"
+
+    components.html(
+        f"""
+        <div class="wrap">
+          <div class="status" id="live_status">{status}</div>
+          <audio id="live_audio" controls style="width:100%;"></audio>
+          <div id="live_doc" class="doc">{"".join(parts)}</div>
+        </div>
+
+        <style>
+          .wrap {{
+            width: 100%;
+            font-family: ui-sans-serif, system-ui, -apple-system, Segoe UI, Roboto, Helvetica, Arial;
+          }}
+          .status {{
+            font-size: 13px;
+            color: #777;
+            margin-bottom: 6px;
+          }}
+          .doc {{
+            margin-top: 12px;
+            height: {READING_HEIGHT_PX}px;
+            overflow-y: auto;
+            border: 1px solid #ddd;
+            padding: 14px;
+            border-radius: 12px;
+            line-height: 1.55;
+            font-size: 16px;
+            background: #fff;
+            white-space: pre-wrap;
+          }}
+          .pending {{
+            color: #aaa;
+          }}
+          .seg {{
+            cursor: pointer;
+            border-radius: 6px;
+            padding: 0px 2px;
+          }}
+          .seg:hover {{
+            background: rgba(183, 91, 85, 0.12);
+          }}
+          .seg.active {{
+            background: rgba(183, 91, 85, 0.22);
+          }}
+        </style>
+
+        <script>
+          (function() {{
+            let sources = {sources};
+            if (sources === null) {{
+              // embedded chunks outlive this iframe in the parent page, so each rebuild
+              // only carries the chunks that became ready since the last one
+              let bank;
+              try {{ bank = window.parent.peachyLiveBank = window.parent.peachyLiveBank || {{}}; }}
+              catch (err) {{ bank = window.peachyLiveBank = window.peachyLiveBank || {{}}; }}
+              if (bank.item !== "{item_id}") {{ bank.item = "{item_id}"; bank.chunks = {{}}; }}
+              Object.assign(bank.chunks, {inline});
+              sources = [];
+              for (let k = 0; k < {len(playable)} && bank.chunks[k]; k++) sources.push(bank.chunks[k]);
+            }}
+            const total = {len(chunks)};
+            const stateKey = "peachy_live_{item_id}";
+            const audio = document.getElementById("live_audio");
+            const box = document.getElementById("live_doc");
+            const status = document.getElementById("live_status");
+
+            let store;
+            try {{ store = window.parent.sessionStorage; }} catch (err) {{ store = window.sessionStorage; }}
+
+            let cur = -1;
+            let waiting = false;  // reached the end of the ready chunks while playing
+
+            function save() {{
+              try {{
+                store.setItem(stateKey, JSON.stringify({{
+                  chunk: cur, time: audio.currentTime || 0, playing: !audio.paused || waiting, waiting: waiting
+                }}));
+              }} catch (err) {{}}
+            }}
+
+            function load(k, t, play) {{
+              if (k < 0 || k >= sources.length) return;
+              waiting = false;
+              if (k !== cur) {{
+                cur = k;
+                audio.src = sources[k];
+              }}
+              const seek = () => {{ try {{ audio.currentTime = Math.max(0, t); }} catch (err) {{}} }};
+              if (audio.readyState >= 1) seek(); else audio.addEventListener("loadedmetadata", seek, {{ once: true }});
+              if (play) audio.play().catch(() => {{}});
+              status.textContent = `Chunk ${{k + 1}} of ${{total}} · {status}`;
+            }}
+
+            audio.addEventListener("ended", () => {{
+              if (cur + 1 < sources.length) {{
+                load(cur + 1, 0, true);
+              }} else {{
+                waiting = cur + 1 < total;
+                if (waiting) status.textContent = "Waiting for the next chunk…";
+              }}
+              save();
+            }});
+            audio.addEventListener("timeupdate", save);
+            audio.addEventListener("pause", save);
+            audio.addEventListener("play", save);
+
+            box.addEventListener("click", (e) => {{
+              const el = e.target.closest(".seg");
+              if (!el) return;
+              try {{
+                box.querySelectorAll(".seg.active").forEach(x => x.classList.remove("active"));
+                el.classList.add("active");
+              }} catch (err) {{}}
+              load(parseInt(el.dataset.chunk || "0", 10), parseFloat(el.dataset.start || "0"), true);
+            }});
+
+            let st = {{}};
+            try {{ st = JSON.parse(store.getItem(stateKey) || "{{}}"); }} catch (err) {{}}
+            if (st.waiting && st.chunk + 1 < sources.length) {{
+              load(st.chunk + 1, 0, true);
+            }} else if (typeof st.chunk === "number" && st.chunk >= 0 && st.chunk < sources.length) {{
+              load(st.chunk, st.time || 0, !!st.playing && !st.waiting);
+              if (st.waiting) {{ cur = st.chunk; waiting = true; status.textContent = "Waiting for the next chunk…"; }}
+            }} else if (sources.length) {{
+              load(0, 0, false);
+            }} else {{
+              status.textContent = "Generating the first chunk…";
+            }}
+          }})();
+        </script>
+        """,
+        height=120 + READING_HEIGHT_PX + 40,
+        scrolling=False,
+    )
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_live_view(item_id: str, title: str) -> None:
+    """
+    Polls the item's chunk checkpoints; the player is only rebuilt when a chunk lands
+    (identical HTML leaves the iframe alone).
+    """
+    item_prefix = f"items/{item_id}"
+    full_text_key = f"{item_prefix}/full.txt"
+
+    st.subheader("Playback")
+    st.write(f"**Title:** {title}  |  *generating — playback starts as chunks finish*")
+
+    if storage.exists(f"{item_prefix}/manifest.json"):
+        # finished: its chunk previews are pruned, so hand over to the item's own playback view
+        if history.get(item_id) is None:
+            st.caption("Finishing up…")
+            return
+        st.session_state.selected_id = item_id
+        st.session_state.force_select_id = item_id
+        st.session_state.mode = "playback"
+        st.rerun(scope="app")
+
+    chunks = live_chunks(storage, item_prefix)
+    if not chunks or not storage.exists(full_text_key):
+        st.caption("Waiting for the job to start…")
+        return
+
+    if all(c["audio_key"] and c["segments"] is not None for c in chunks):
+        st.caption("All chunks are ready. Finishing the full audio…")
+
+    st.markdown("### Reading view (tap highlighted text to jump)")
+    render_live_player(item_id, storage.read_text(full_text_key), chunks)
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_jobs_panel() -> None:
+    """
+    Polls the job queue. When a job this session started finishes, reruns the whole
+    app so History picks it up and selects it.
+    """
+    for job_id in list(st.session_state.watch_job_ids):
+        job = job_queue.get(job_id)
+        if job is None or job.status == FAILED:
+            st.session_state.watch_job_ids.remove(job_id)
+        elif job.status == DONE:
+            st.session_state.watch_job_ids.remove(job_id)
+            st.session_state.selected_id = job.item_id
+            st.session_state.force_select_id = job.item_id
+            st.session_state.mode = "playback"
+            st.rerun(scope="app")
+
+    # only this session's jobs: others' titles, errors and Retry/Dismiss aren't ours to see
+    jobs = job_queue.list_jobs((QUEUED, RUNNING, FAILED), owner=st.session_state.owner_id)
+    if not jobs:
+        return
+
+    st.header("In progress")
+    for job in jobs:
+        if job.status == FAILED:
+            st.error(f"{job.title}: failed")
+            with st.expander("Details"):
+                st.code(job.error or "", language=None)
+            c_retry, c_dismiss = st.columns(2)
+            if c_retry.button("Retry", key=f"job_retry_{job.id}", use_container_width=True):
+                job_queue.retry(job.id, owner=st.session_state.owner_id)
+                if job.id not in st.session_state.watch_job_ids:
+                    st.session_state.watch_job_ids.append(job.id)
+                ensure_local_workers()
+                st.rerun(scope="fragment")
+            if c_dismiss.button("Dismiss", key=f"job_dismiss_{job.id}", use_container_width=True):
+                job_queue.dismiss(job.id, owner=st.session_state.owner_id)
+                st.rerun(scope="fragment")
+        else:
+            label = "Queued…" if job.status == QUEUED else (job.message or "Working…")
+            st.progress(job.fraction, text=f"{job.title} — {label}")
+            if job.payload.get("progressive") and st.session_state.live_item_id != job.item_id:
+                if st.button("Listen now", key=f"job_listen_{job.id}", use_container_width=True):
+                    st.session_state.live_item_id = job.item_id
+                    st.session_state.live_title = job.title
+                    st.session_state.mode = "live"
+                    st.rerun(scope="app")
+
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_api_usage() -> None:
+    """
+    Shared rate limiter usage; its own fragment, so it shows whether or not jobs are running.
+    """
+    db_path = rate_limit_db_path(DATA_DIR)
+    if not db_path:
+        return
+    rows = shared_limiter_metrics(db_path)
+    with st.expander("API usage"):
+        if not rows:
+            st.caption("No API requests in the last minute.")
+        for name in sorted({r["name"] for r in rows}):
+            rs = [r for r in rows if r["name"] == name]
+            per_min = sum(int(r["requests_last_minute"]) for r in rs)
+            in_flight = sum(int(r["in_flight"]) for r in rs)
+            throttled = sum(int(r.get("count_throttled", 0)) for r in rs)
+            st.caption(
+                f"{name.upper()}: {per_min}/{int(rs[0]['requests_per_minute_limit'])} req/min · "
+                f"{in_flight} in flight · {throttled} throttled · {len(rs)} process(es)"
+            )
+
+
 # ----------------------------
 # App state
 # ----------------------------
 st.set_page_config(page_title="Peachy", layout="wide")
 
-history = load_history()
-history_sorted = sorted(history, key=lambda x: x["created_at"], reverse=True)
-ids = [x["id"] for x in history_sorted]
+history = get_history_store()
 
 if "mode" not in st.session_state:
-    st.session_state.mode = "playback"  # "new" | "playback"
+    st.session_state.mode = "playback"  # "new" | "playback" | "live"
 if "selected_id" not in st.session_state:
     st.session_state.selected_id = None
 if "pending_doc" not in st.session_state:
@@ -395,6 +1013,26 @@ if "new_voice" not in st.session_state:
     st.session_state.new_voice = VOICES[0]
 if "request_close_sidebar" not in st.session_state:
     st.session_state.request_close_sidebar = False
+if "owner_id" not in st.session_state:
+    # tags the jobs this session queues (JobQueue owner)
+    st.session_state.owner_id = uuid.uuid4().hex
+if "watch_job_ids" not in st.session_state:
+    st.session_state.watch_job_ids = []
+if "live_item_id" not in st.session_state:
+    st.session_state.live_item_id = None
+    st.session_state.live_title = ""
+if "history_query" not in st.session_state:
+    st.session_state.history_query = ""
+if "history_cursors" not in st.session_state:
+    # start cursor of each page walked so far; the last one is the page shown
+    st.session_state.history_cursors = [None]
+
+# one page of (matching) history: the sidebar costs the same however long the history gets
+history_page = history.search(st.session_state.history_query, HISTORY_PAGE_SIZE + 1, st.session_state.history_cursors[-1])
+has_older = len(history_page) > HISTORY_PAGE_SIZE
+history_page = history_page[:HISTORY_PAGE_SIZE]
+by_id = {x["id"]: x for x in history_page}
+ids = list(by_id)
 
 if ids and st.session_state.selected_id is None:
     st.session_state.selected_id = ids[0]
@@ -402,7 +1040,20 @@ if ids and st.session_state.selected_id is None:
 if "history_select" not in st.session_state and st.session_state.selected_id:
     st.session_state.history_select = st.session_state.selected_id
 
-if st.session_state.force_select_id and st.session_state.force_select_id in ids:
+if st.session_state.selected_id and st.session_state.selected_id not in by_id:
+    # selected from an older page (or just finished): keep it listed
+    rec = history.get(st.session_state.selected_id)
+    if rec is not None:
+        by_id[rec["id"]] = rec
+        ids.append(rec["id"])
+
+if st.session_state.force_select_id and st.session_state.force_select_id not in by_id:
+    rec = history.get(st.session_state.force_select_id)
+    if rec is not None:
+        by_id[rec["id"]] = rec
+        ids.insert(0, rec["id"])
+
+if st.session_state.force_select_id and st.session_state.force_select_id in by_id:
     st.session_state.history_select = st.session_state.force_select_id
     st.session_state.force_select_id = None
 
@@ -440,18 +1091,40 @@ with st.sidebar:
             st.rerun()
 
     st.divider()
+    render_jobs_panel()
+    render_api_usage()
+
     st.header("History")
 
+    st.text_input(
+        "Search history",
+        key="history_query",
+        placeholder="Title or date, e.g. 2025-03",
+        on_change=reset_history_pages,
+        label_visibility="collapsed",
+    )
+
     if not ids:
-        st.caption("No history yet.")
+        st.caption("No matches." if st.session_state.history_query else "No history yet.")
     else:
 
         def fmt(item_id: str) -> str:
-            it = next(x for x in history_sorted if x["id"] == item_id)
+            it = by_id[item_id]
             return f'{it["created_at"]} — {it["title"]}'
 
         picked = st.selectbox("Select", ids, format_func=fmt, key="history_select")
 
+        cursors = st.session_state.history_cursors
+        n1, n2 = st.columns(2)
+        with n1:
+            if st.button("‹ Newer", disabled=len(cursors) <= 1, use_container_width=True, key="btn_history_newer"):
+                cursors.pop()
+                st.rerun()
+        with n2:
+            if st.button("Older ›", disabled=not has_older, use_container_width=True, key="btn_history_older"):
+                cursors.append((record_ts(history_page[-1]), history_page[-1]["id"]))
+                st.rerun()
+
         if picked != st.session_state.selected_id:
             st.session_state.selected_id = picked
             st.session_state.mode = "playback"
@@ -485,6 +1158,13 @@ if st.session_state.mode == "new":
 
     st.audio(voice_preview_bytes(voice, speed), format="audio/mp3")
 
+    timing = st.radio(
+        "Text sync",
+        options=list(TIMING_MODES),
+        format_func=lambda m: TIMING_LABELS.get(m, m),
+        key="new_timing",
+    )
+
     up = st.file_uploader(
         "Upload .txt / .docx / .pdf (max 2 MB)",
         type=["txt", "docx", "pdf"],
@@ -508,160 +1188,59 @@ if st.session_state.mode == "new":
         st.caption(f'Preview: {st.session_state.pending_doc["title"]}')
         scroll_box(make_preview(st.session_state.pending_doc["text"]), height_px=PREVIEW_HEIGHT_PX)
 
-        if st.button("Generate this mama jamma", use_container_width=True):
-            item_id = uuid.uuid4().hex
-            created_at = now_pt_string()
+        # Re-uploading an edited doc: reuse audio for unchanged chunks of an earlier item
+        latest_same = history.latest_by_title(st.session_state.pending_doc["title"])
+        same_title = latest_same["id"] if latest_same else ""
+        if latest_same and same_title not in by_id:
+            by_id[same_title] = latest_same
+            ids.append(same_title)
+        reuse_options = [""] + ids
+        reuse_id = st.selectbox(
+            "Regenerate from previous item (only changed parts are re-synthesized)",
+            reuse_options,
+            index=reuse_options.index(same_title),
+            format_func=lambda i: "None — generate from scratch" if not i else f'{by_id[i]["created_at"]} — {by_id[i]["title"]}',
+            key="new_reuse_from",
+        )
 
-            title = st.session_state.pending_doc["title"]
+        if st.button("Generate this mama jamma", use_container_width=True):
             full_text = st.session_state.pending_doc["text"] or ""
-
-            chunks = split_text_into_chunks_with_offsets(full_text, max_chars=TTS_CHUNK_MAX_CHARS)
-            if not chunks:
+            if not full_text.strip():
                 st.error("No text extracted from this file.")
                 st.stop()
 
-            item_prefix = f"items/{item_id}"
-            full_text_key = f"{item_prefix}/full.txt"
-            segments_key = f"{item_prefix}/segments.json"
-            manifest_key = f"{item_prefix}/manifest.json"
-
-            audio_mp3_key = f"{item_prefix}/audio.mp3"
-            audio_wav_key = f"{item_prefix}/audio.wav"
-
-            status = st.status("Working…", expanded=True)
-
-            try:
-                status.write(f"Step 1/3: Generating {len(chunks)} audio chunks (WAV) + STT…")
-
-                all_segments: list[dict] = []
-                manifest = {
-                    "id": item_id,
-                    "title": title,
-                    "created_at": created_at,
-                    "voice": voice,
-                    "speed": float(speed),
-                    "tts_chunk_max_chars": TTS_CHUNK_MAX_CHARS,
-                    "chunks": [],
-                }
-
-                align_cfg = AlignConfig(lookback=250, ahead=9000, threshold=78, min_query_len=10)
-
-                with tempfile.TemporaryDirectory() as td:
-                    td = Path(td)
-                    wav_paths: list[Path] = []
-                    audio_offset = 0.0
-
-                    for i, ch in enumerate(chunks):
-                        chunk_text = ch["text"]
-                        chunk_orig_start = int(ch["orig_start"])
-                        chunk_orig_end = int(ch["orig_end"])
-
-                        status.write(f"Chunk {i+1}/{len(chunks)}: TTS → WAV")
-                        wav_path = td / f"chunk_{i:04d}.wav"
-                        tts_to_wav_file(chunk_text, str(wav_path), voice=voice, speed=float(speed))
-
-                        dur = wav_duration_seconds(wav_path)
-                        wav_paths.append(wav_path)
-
-                        status.write(f"Chunk {i+1}/{len(chunks)}: STT (segments)")
-                        stt_verbose = whisper_segments_verbose_json(str(wav_path))
-                        segs = extract_segments(stt_verbose)
-
-                        # merge for readability + better alignment anchors
-                        segs = merge_segments(segs, max_seconds=DISPLAY_SEG_MAX_SECONDS, max_chars=DISPLAY_SEG_MAX_CHARS)
-
-                        # align merged segments back to THIS chunk's original text slice
-                        align_segments_to_text(chunk_text, segs, cfg=align_cfg)
-
-                        # finalize: offset time + convert local orig spans to global orig spans
-                        for s in segs:
-                            s["start"] = float(s.get("start", 0.0)) + audio_offset
-                            s["end"] = float(s.get("end", 0.0)) + audio_offset
-
-                            if "orig_char_start_local" in s and "orig_char_end_local" in s:
-                                local_a = int(s["orig_char_start_local"])
-                                local_b = int(s["orig_char_end_local"])
-
-                                s["orig_char_start"] = chunk_orig_start + local_a
-                                s["orig_char_end"] = chunk_orig_start + local_b
-
-                                # cleanup locals if you want
-                                del s["orig_char_start_local"]
-                                del s["orig_char_end_local"]
-
-                            all_segments.append(s)
-
-                        manifest["chunks"].append(
-                            {
-                                "index": i,
-                                "orig_char_start": chunk_orig_start,
-                                "orig_char_end": chunk_orig_end,
-                                "chars": len(chunk_text),
-                                "duration_seconds": dur,
-                                "audio_offset_seconds": audio_offset,
-                            }
-                        )
-
-                        audio_offset += dur
-
-                    status.write("Step 2/3: Stitching WAV chunks → master.wav")
-                    master_wav = td / "master.wav"
-                    stitch_wavs(wav_paths, master_wav)
-
-                    # store full original extracted text (for reading view)
-                    storage.write_text(full_text_key, full_text)
-
-                    status.write("Step 3/3: Convert master.wav → audio.mp3 (single encode)")
-                    master_mp3 = td / "audio.mp3"
-
-                    audio_key = audio_mp3_key
-                    audio_mime = "audio/mpeg"
-
-                    try:
-                        convert_wav_to_mp3(master_wav, master_mp3, bitrate_kbps=64)
-                        audio_bytes = master_mp3.read_bytes()
-                        storage.write_bytes(audio_key, audio_bytes, content_type="audio/mpeg")
-                        manifest["audio"] = {"format": "mp3", "key": audio_key, "mime": audio_mime}
-                    except Exception:
-                        # fallback: store wav if ffmpeg not present
-                        audio_key = audio_wav_key
-                        audio_mime = "audio/wav"
-                        audio_bytes = master_wav.read_bytes()
-                        storage.write_bytes(audio_key, audio_bytes, content_type="audio/wav")
-                        manifest["audio"] = {"format": "wav", "key": audio_key, "mime": audio_mime}
-
-                # persist aligned segments + manifest
-                storage.write_json(segments_key, all_segments)
-                storage.write_json(manifest_key, manifest)
-
-                status.update(label="Done", state="complete", expanded=False)
-
-            except Exception as e:
-                status.update(label="Failed", state="error", expanded=True)
-                st.exception(e)
-                st.stop()
-
-            history.append(
+            job = job_queue.enqueue(
                 {
-                    "id": item_id,
-                    "created_at": created_at,
-                    "title": title,
+                    "title": st.session_state.pending_doc["title"],
+                    "text": full_text,
                     "voice": voice,
                     "speed": float(speed),
-                    "item_dir": item_prefix,
-                }
+                    "created_at": now_pt_string(),
+                    "timing": timing,
+                    "reuse_from": (by_id[reuse_id].get("item_dir") or f"items/{reuse_id}") if reuse_id else None,
+                    "progressive": True,
+                },
+                owner=st.session_state.owner_id,
             )
-            save_history(history)
+            ensure_local_workers()
 
-            st.session_state.selected_id = item_id
-            st.session_state.force_select_id = item_id
-            st.session_state.mode = "playback"
+            st.session_state.watch_job_ids.append(job.id)
+            st.session_state.live_item_id = job.item_id
+            st.session_state.live_title = job.title
+            st.session_state.mode = "live"
             st.session_state.pending_doc = None
             st.rerun()
     else:
         st.caption("Upload a file to see a preview, then generate audio.")
 
 
+# ----------------------------
+# Main: Live view (item still generating)
+# ----------------------------
+elif st.session_state.mode == "live" and st.session_state.live_item_id:
+    render_live_view(st.session_state.live_item_id, st.session_state.live_title)
+
+
 # ----------------------------
 # Main: Playback view
 # ----------------------------
@@ -669,42 +1248,45 @@ else:
     if not ids:
         st.subheader("Create a new Peachy :)")
     else:
-        selected = next((x for x in history_sorted if x["id"] == st.session_state.selected_id), None)
+        selected = by_id.get(st.session_state.selected_id)
         if not selected:
             st.subheader("Create a new Peachy :)")
         else:
             item_id = selected["id"]
             item_prefix = selected.get("item_dir") or f"items/{item_id}"
 
-            full_text_key = f"{item_prefix}/full.txt"
-            segments_key = f"{item_prefix}/segments.json"
-            manifest_key = f"{item_prefix}/manifest.json"
-
             audio_mp3_key = f"{item_prefix}/audio.mp3"
             audio_wav_key = f"{item_prefix}/audio.wav"
 
-            full_text = storage.read_text(full_text_key) if storage.exists(full_text_key) else ""
-            segments = storage.read_json(segments_key, [])
-            manifest = storage.read_json(manifest_key, {})
-
-            # prefer mp3
-            if storage.exists(audio_mp3_key):
-                audio_key = audio_mp3_key
-                audio_mime = "audio/mpeg"
-            elif storage.exists(audio_wav_key):
-                audio_key = audio_wav_key
-                audio_mime = "audio/wav"
-            else:
-                ak = (manifest.get("audio") or {}).get("key")
-                am = (manifest.get("audio") or {}).get("mime")
-                if ak and storage.exists(ak):
-                    audio_key = ak
-                    audio_mime = am or "audio/mpeg"
-                else:
-                    audio_key = ""
-                    audio_mime = "audio/mpeg"
+            art = item_artifacts(item_prefix)
+            full_text = art["full_text"]
+            segments = art["segments"]
+            manifest = art["manifest"]
+            existing = art["existing"]
+
+            probe_audio_support()
+            audio_key, audio_mime = choose_rendition(manifest.get("audio") or {}, existing)
 
-            audio_bytes = storage.read_bytes(audio_key) if audio_key else b""
+            if not audio_key:
+                # prefer mp3
+                if audio_mp3_key in existing:
+                    audio_key = audio_mp3_key
+                    audio_mime = "audio/mpeg"
+                elif audio_wav_key in existing:
+                    audio_key = audio_wav_key
+                    audio_mime = "audio/wav"
+                else:
+                    ak = (manifest.get("audio") or {}).get("key")
+                    am = (manifest.get("audio") or {}).get("mime")
+                    if ak and ak in existing:
+                        audio_key = ak
+                        audio_mime = am or "audio/mpeg"
+                    else:
+                        audio_mime = "audio/mpeg"
+
+            # by URL (presigned, or the media server) when possible; embedding the bytes is the fallback
+            media = item_media(audio_key, art)
+            audio_bytes = item_audio_bytes(audio_key, art) if audio_key and media is None else b""
 
             st.subheader("Playback")
             st.write(
@@ -721,4 +1303,5 @@ else:
                 full_text=full_text,
                 segments=segments,
                 marker=item_id,
+                media=media,
             )
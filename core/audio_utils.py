@@ -1,10 +1,29 @@
 # core/audio_utils.py
 from __future__ import annotations
 
+import io
+import math
+import mmap
+import os
 import shutil
+import struct
 import subprocess
+import tempfile
+import threading
 import wave
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Optional, Union
+
+# WAV sample width (bytes) -> ffmpeg raw PCM format
+_PCM_FORMATS = {1: "u8", 2: "s16le", 3: "s24le", 4: "s32le"}
+
+# OpenAI TTS response_format="pcm": headerless 24 kHz, 16-bit little-endian, mono.
+# Specs are (channels, sampwidth_bytes, framerate_hz), same as _wav_spec.
+PCM_SPEC = (1, 2, 24000)
+
+Buffer = Union[bytes, bytearray, memoryview]
 
 
 def wav_duration_seconds(wav_path: Path) -> float:
@@ -111,3 +130,774 @@ def convert_wav_to_mp3(in_wav: Path, out_mp3: Path, bitrate_kbps: int = 64) -> N
     p = subprocess.run(cmd, capture_output=True, text=True)
     if p.returncode != 0:
         raise RuntimeError(f"ffmpeg failed: {p.stderr[:600]}")
+
+
+def decode_audio_range(data: bytes, start: int, end: Optional[int], spec: tuple[int, int, int]) -> bytes:
+    """
+    Raw PCM (in `spec`) of samples [start, end) of an encoded audio file (MP3, Opus, ...);
+    end=None decodes to the end. Sample-exact: ffmpeg decodes from the top (honouring the
+    encoder delay in the Info/LAME frame) and trims by sample count, not by seeking.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found")
+    ch, sw, fr = spec
+    cmd = [
+        ffmpeg, "-hide_banner", "-loglevel", "error", "-i", "pipe:0", "-vn",
+        "-af", f"aresample={fr},atrim=start_sample={int(start)}" + (f":end_sample={int(end)}" if end is not None else ""),
+        "-f", _PCM_FORMATS[sw], "-ac", str(ch), "-ar", str(fr), "pipe:1",
+    ]
+    p = subprocess.run(cmd, input=data, capture_output=True)
+    if p.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {p.stderr.decode('utf-8', 'replace')[:600]}")
+    return p.stdout
+
+
+# ----------------------------
+# Raw PCM (no WAV files)
+# ----------------------------
+def pcm_duration_seconds(nbytes: int, spec: tuple[int, int, int] = PCM_SPEC) -> float:
+    ch, sw, fr = spec
+    return nbytes / float(ch * sw * fr)
+
+
+def whole_frames(pcm: Buffer, spec: tuple[int, int, int] = PCM_SPEC) -> Buffer:
+    """
+    pcm without a trailing partial frame (a truncated response would otherwise shift
+    every sample after it by a byte once chunks are concatenated).
+    """
+    ch, sw, _ = spec
+    extra = len(pcm) % (ch * sw)
+    return pcm[: len(pcm) - extra] if extra else pcm
+
+
+def wav_header(nbytes: int, spec: tuple[int, int, int] = PCM_SPEC) -> bytes:
+    """
+    44-byte PCM WAV header for `nbytes` of frames.
+    """
+    ch, sw, fr = spec
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + nbytes, b"WAVE",
+        b"fmt ", 16, 1, ch, fr, fr * ch * sw, ch * sw, sw * 8,
+        b"data", nbytes,
+    )
+
+
+def pcm_to_wav_bytes(pcm: Buffer, spec: tuple[int, int, int] = PCM_SPEC) -> bytes:
+    return wav_header(len(pcm), spec) + bytes(pcm)
+
+
+def wav_bytes_to_pcm(data: bytes) -> tuple[bytes, tuple[int, int, int]]:
+    """
+    (frames, spec) of an in-memory WAV.
+    """
+    with wave.open(io.BytesIO(data), "rb") as w:
+        if w.getcomptype() != "NONE":
+            raise ValueError(f"WAV not PCM/uncompressed: comptype={w.getcomptype()}")
+        spec = (int(w.getnchannels()), int(w.getsampwidth()), int(w.getframerate()))
+        return w.readframes(w.getnframes()), spec
+
+
+def read_wav_frames(wav_paths: list[Path]) -> tuple[list[bytes], tuple[int, int, int]]:
+    """
+    Frames of each WAV (all must share one format, as for stitch_wavs) + that format.
+    """
+    if not wav_paths:
+        raise ValueError("No wavs to read")
+    spec = _wav_spec(Path(wav_paths[0]))
+    out: list[bytes] = []
+    for p in wav_paths:
+        if _wav_spec(Path(p)) != spec:
+            raise ValueError(f"WAV chunk format mismatch: {p}")
+        with wave.open(str(p), "rb") as w:
+            out.append(w.readframes(w.getnframes()))
+    return out, spec
+
+
+def write_wav_from_pcm(parts: list[Buffer], out_wav: Path, spec: tuple[int, int, int] = PCM_SPEC) -> None:
+    """
+    stitch_wavs for in-memory chunks: one header, then each buffer written as-is.
+    """
+    out_wav = Path(out_wav)
+    out_wav.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_wav, "wb") as f:
+        f.write(wav_header(sum(len(p) for p in parts), spec))
+        for p in parts:
+            f.write(p)
+
+
+class PcmArena:
+    """
+    Memory-mapped scratch space for chunk PCM. Each chunk gets a memoryview into a
+    block; blocks are never resized (so views stay valid) and a new block is mapped
+    when one fills up. Size the first block from an estimate of the whole item so
+    it usually is the only one. close() (or `with`) unmaps the blocks and deletes
+    their files; every view handed out is released then.
+    """
+
+    def __init__(self, work_dir: Path, initial_bytes: int = 64 * 1024 * 1024, block_bytes: int = 32 * 1024 * 1024) -> None:
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.block_bytes = int(block_bytes)
+        self._lock = threading.Lock()
+        self._blocks: list[mmap.mmap] = []
+        self._paths: list[Path] = []
+        self._views: list[memoryview] = []
+        self._free = 0  # offset of unused space in the last block
+        self._new_block(max(1, int(initial_bytes)))
+
+    def _new_block(self, size: int) -> None:
+        path = self.work_dir / f"pcm_arena_{len(self._blocks):03d}.bin"
+        with open(path, "w+b") as f:
+            f.truncate(size)
+            self._blocks.append(mmap.mmap(f.fileno(), size))
+        self._paths.append(path)
+        self._free = 0
+
+    def reserve(self, nbytes: int) -> memoryview:
+        if nbytes <= 0:
+            return memoryview(b"")
+        with self._lock:
+            if not self._blocks:
+                raise ValueError("PcmArena is closed")
+            block = self._blocks[-1]
+            if len(block) - self._free < nbytes:
+                self._new_block(max(self.block_bytes, nbytes))
+                block = self._blocks[-1]
+            view = memoryview(block)[self._free : self._free + nbytes]
+            self._free += nbytes
+            self._views.append(view)
+        return view
+
+    def add(self, data: Buffer) -> memoryview:
+        view = self.reserve(len(data))
+        view[:] = data
+        return view
+
+    def close(self) -> None:
+        with self._lock:
+            views, blocks, paths = self._views, self._blocks, self._paths
+            self._views, self._blocks, self._paths = [], [], []
+        for v in views:
+            try:
+                v.release()
+            except BufferError:
+                pass  # still exported (e.g. a live numpy array); unmapped when that goes away
+        for b in blocks:
+            try:
+                b.close()
+            except BufferError:
+                pass
+        for p in paths:
+            try:
+                p.unlink(missing_ok=True)
+            except OSError:
+                pass  # still mapped (Windows); the work dir goes with it
+
+    def __enter__(self) -> "PcmArena":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+class StreamingMp3Encoder:
+    """
+    One ffmpeg process for a whole item: chunks (WAV files or in-memory PCM) are fed
+    in order as raw PCM on its stdin, so the MP3 is done right after the last chunk (no master.wav, no second pass).
+
+    The PCM format is taken from the first chunk; later chunks must match (same rule
+    as stitch_wavs). Call close() to finish the file, or abort() to throw it away.
+    reservoir=False makes every frame self-contained (as the parallel encode's), so the
+    finished file can be cut into segments (mp3_audio_frames + write_mp3_segments).
+    """
+
+    def __init__(self, out_mp3: Path, bitrate_kbps: int = 64, reservoir: bool = True) -> None:
+        self.out_mp3 = Path(out_mp3)
+        self.bitrate_kbps = int(bitrate_kbps)
+        self.reservoir = bool(reservoir)
+        self.spec: Optional[tuple[int, int, int]] = None
+        self._proc: Optional[subprocess.Popen] = None
+        self._stderr = None
+
+    def _start(self, spec: tuple[int, int, int]) -> None:
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError("ffmpeg not found")
+
+        ch, sw, fr = spec
+        self.out_mp3.parent.mkdir(parents=True, exist_ok=True)
+        cmd = [
+            ffmpeg,
+            "-y",
+            "-f",
+            _PCM_FORMATS[sw],
+            "-ar",
+            str(fr),
+            "-ac",
+            str(ch),
+            "-i",
+            "pipe:0",
+            "-vn",
+            "-c:a",
+            "libmp3lame",
+            "-b:a",
+            f"{self.bitrate_kbps}k",
+        ]
+        if not self.reservoir:
+            cmd += ["-reservoir", "0"]
+        cmd.append(str(self.out_mp3))
+        # stderr to a file, not a pipe: nobody reads it until the end, and a full pipe would block ffmpeg
+        self._stderr = tempfile.TemporaryFile()
+        self._proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self._stderr)
+        self.spec = spec
+
+    def _ensure(self, spec: tuple[int, int, int], what: object) -> None:
+        if self.spec is None:
+            self._start(spec)
+        elif spec != self.spec:
+            raise ValueError(f"Audio chunk format mismatch: {spec} != {self.spec} ({what})")
+
+    def add_wav(self, wav_path: Path) -> None:
+        self._ensure(_wav_spec(Path(wav_path)), wav_path)
+        assert self._proc is not None and self._proc.stdin is not None
+        with wave.open(str(wav_path), "rb") as w:
+            while True:
+                data = w.readframes(65536)
+                if not data:
+                    break
+                self._proc.stdin.write(data)
+
+    def add_pcm(self, pcm: Buffer, spec: tuple[int, int, int] = PCM_SPEC) -> None:
+        self._ensure(spec, "pcm")
+        assert self._proc is not None and self._proc.stdin is not None
+        self._proc.stdin.write(pcm)
+
+    def close(self) -> None:
+        if self._proc is None:
+            raise ValueError("No audio was encoded")
+        try:
+            self._proc.stdin.close()
+            rc = self._proc.wait()
+            if rc != 0:
+                self._stderr.seek(0)
+                err = self._stderr.read().decode("utf-8", errors="ignore")
+                raise RuntimeError(f"ffmpeg failed: {err[-600:]}")
+        finally:
+            self._cleanup()
+
+    def abort(self) -> None:
+        if self._proc is not None:
+            try:
+                self._proc.kill()
+                self._proc.wait()
+            except Exception:
+                pass
+        self._cleanup()
+        self.out_mp3.unlink(missing_ok=True)
+
+    def _cleanup(self) -> None:
+        if self._stderr is not None:
+            self._stderr.close()
+            self._stderr = None
+        self._proc = None
+
+
+# ----------------------------
+# Parallel MP3 encode (frame-level concatenation)
+# ----------------------------
+# Each slice is encoded by its own ffmpeg process with the bit reservoir off, so every
+# MP3 frame is self-contained. A slice starts MP3_WARMUP_FRAMES early (dropped after
+# encoding) so the encoder state at the boundary matches a single-pass encode, and
+# runs MP3_LOOKAHEAD_FRAMES late for the encoder's lookahead. The kept frames are then
+# byte-identical to one ffmpeg run over the whole item.
+MP3_WARMUP_FRAMES = 4
+MP3_LOOKAHEAD_FRAMES = 2
+MP3_MIN_SLICE_FRAMES = 400
+# LAME's encoder delay (samples; decoders add their own 529 on top) and the tag's
+# encoder string, used when the installed encoder's own Info frame can't be read
+LAME_ENCODER_DELAY = 576
+LAME_ENCODER_NAME = b"LAME3.100"
+
+_MP3_BITRATES_KBPS = {
+    "mpeg1": (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    "mpeg2": (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# version bits -> sample rates by index
+_MP3_SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+
+def mp3_samples_per_frame(sample_rate: int) -> int:
+    # MPEG-1 Layer III: 1152; MPEG-2/2.5 (the <= 24 kHz rates): 576
+    return 1152 if sample_rate >= 32000 else 576
+
+
+def _mp3_frame_info(h: int) -> Optional[tuple[int, int, int]]:
+    """
+    (frame_length_bytes, sample_rate, channels) for a Layer III frame header, else None.
+    """
+    if (h >> 21) != 0x7FF or ((h >> 17) & 3) != 1:
+        return None
+    ver = (h >> 19) & 3
+    br_i = (h >> 12) & 15
+    sr_i = (h >> 10) & 3
+    if ver == 1 or br_i in (0, 15) or sr_i == 3:
+        return None
+    sr = _MP3_SAMPLE_RATES[ver][sr_i]
+    kbps = _MP3_BITRATES_KBPS["mpeg1" if ver == 3 else "mpeg2"][br_i]
+    pad = (h >> 9) & 1
+    coeff = 144 if ver == 3 else 72
+    channels = 1 if ((h >> 6) & 3) == 3 else 2
+    return coeff * kbps * 1000 // sr + pad, sr, channels
+
+
+def split_mp3_frames(data: bytes) -> list[memoryview]:
+    """
+    Layer III frames of an MP3 byte string (leading ID3v2 tag skipped, trailing junk ignored).
+    """
+    view = memoryview(data)
+    i = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        i = 10 + size
+
+    frames: list[memoryview] = []
+    while i + 4 <= len(data):
+        info = _mp3_frame_info(int.from_bytes(data[i : i + 4], "big"))
+        if info is None or i + info[0] > len(data):
+            break
+        frames.append(view[i : i + info[0]])
+        i += info[0]
+    return frames
+
+
+def _crc16(data: Buffer) -> int:
+    # CRC-16/ARC, as used by the LAME tag
+    c = 0
+    for byte in bytes(data):
+        c ^= byte
+        for _ in range(8):
+            c = (c >> 1) ^ 0xA001 if c & 1 else c >> 1
+    return c
+
+
+def _xing_offset(h: int, channels: int) -> int:
+    # the Xing/Info tag sits right after the side info
+    ver = (h >> 19) & 3
+    return 4 + ((17 if channels == 1 else 32) if ver == 3 else (9 if channels == 1 else 17))
+
+
+def parse_mp3_info_frame(frame: Buffer) -> Optional[dict]:
+    """
+    Fields of a Xing/Info frame with a LAME extension, or None if `frame` isn't one:
+    frames and bytes (as stored), encoder (9-byte name), delay and padding (samples),
+    crc_ok (whether the tag CRC matches LAME's definition; not every encoder's does).
+    """
+    data = bytes(frame)
+    if len(data) < 4:
+        return None
+    h = int.from_bytes(data[:4], "big")
+    info = _mp3_frame_info(h)
+    if info is None:
+        return None
+    p = _xing_offset(h, info[2])
+    if data[p : p + 4] not in (b"Info", b"Xing") or len(data) < max(p + 156, 192):
+        return None
+    flags = int.from_bytes(data[p + 4 : p + 8], "big")
+    if flags & 0x0F != 0x0F:
+        return None  # not the frames + bytes + TOC + quality layout written here
+    lame = p + 120
+    dp = int.from_bytes(data[lame + 21 : lame + 24], "big")
+    return {
+        "frames": int.from_bytes(data[p + 8 : p + 12], "big"),
+        "bytes": int.from_bytes(data[p + 12 : p + 16], "big"),
+        "encoder": data[lame : lame + 9],
+        "delay": dp >> 12,
+        "padding": dp & 0xFFF,
+        "crc_ok": int.from_bytes(data[lame + 34 : lame + 36], "big") == _crc16(data[: lame + 34]),
+    }
+
+
+@lru_cache(maxsize=None)
+def mp3_encoder_tag(spec: tuple[int, int, int] = PCM_SPEC) -> tuple[bytes, int]:
+    """
+    (encoder name, encoder delay) from the Info frame the installed ffmpeg writes for
+    `spec`, so rebuilt Info frames describe the encoder that made the audio frames.
+    Falls back to LAME_ENCODER_NAME / LAME_ENCODER_DELAY if that can't be read.
+    """
+    ch, sw, fr = spec
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        return LAME_ENCODER_NAME, LAME_ENCODER_DELAY
+    with tempfile.TemporaryDirectory() as td:
+        out = Path(td) / "probe.mp3"
+        cmd = [
+            ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-f", _PCM_FORMATS[sw], "-ar", str(fr), "-ac", str(ch), "-i", "pipe:0",
+            "-c:a", "libmp3lame", "-id3v2_version", "0", str(out),
+        ]
+        # a tenth of a second of silence; the Info frame needs a seekable output
+        p = subprocess.run(cmd, input=bytes(ch * sw * (fr // 10)), capture_output=True)
+        frames = split_mp3_frames(out.read_bytes()) if p.returncode == 0 and out.exists() else []
+        tag = parse_mp3_info_frame(frames[0]) if frames else None
+    if tag is None:
+        return LAME_ENCODER_NAME, LAME_ENCODER_DELAY
+    return tag["encoder"], tag["delay"]
+
+
+def mp3_info_frame(
+    first_frame: Buffer,
+    n_frames: int,
+    audio_bytes: int,
+    delay: int,
+    padding: int,
+    encoder: bytes = LAME_ENCODER_NAME,
+) -> bytes:
+    """
+    Xing "Info" (CBR) frame with a LAME extension carrying encoder delay/padding, so
+    players can seek and trim for gapless playback. Written like ffmpeg's own (TOC,
+    music length) with LAME's tag CRC (over the frame up to the CRC field); music CRC is left at 0.
+    """
+    h = int.from_bytes(bytes(first_frame[:4]), "big")
+    info = _mp3_frame_info(h)
+    if info is None:
+        raise ValueError("Not an MP3 frame")
+    _, sr, channels = info
+
+    ver = (h >> 19) & 3
+    xing = _xing_offset(h, channels)
+    need = max(xing + 156, 192)
+
+    # smallest bitrate whose frame fits the tag (no padding bit)
+    h &= ~((15 << 12) | (1 << 9))
+    table = _MP3_BITRATES_KBPS["mpeg1" if ver == 3 else "mpeg2"]
+    for br_i in range(1, 15):
+        size = (144 if ver == 3 else 72) * table[br_i] * 1000 // sr
+        if size >= need:
+            break
+    h |= br_i << 12
+
+    frame = bytearray(size)
+    frame[0:4] = h.to_bytes(4, "big")
+    total = size + audio_bytes
+
+    p = xing
+    frame[p : p + 4] = b"Info"
+    frame[p + 4 : p + 8] = (0x0F).to_bytes(4, "big")  # frames, bytes, TOC, quality
+    frame[p + 8 : p + 12] = int(n_frames).to_bytes(4, "big")
+    frame[p + 12 : p + 16] = int(total).to_bytes(4, "big")
+    frame_bytes = audio_bytes / float(max(1, n_frames))
+    for k in range(100):
+        offset = size + int(k * n_frames / 100.0) * frame_bytes
+        frame[p + 16 + k] = min(255, int(256.0 * offset / total))
+    # quality (4 bytes) stays 0
+
+    lame = p + 120
+    frame[lame : lame + 9] = bytes(encoder[:9]).ljust(9, b" ")
+    frame[lame + 21 : lame + 24] = ((max(0, min(delay, 4095)) << 12) | max(0, min(padding, 4095))).to_bytes(3, "big")
+    frame[lame + 28 : lame + 32] = int(total).to_bytes(4, "big")
+    frame[lame + 34 : lame + 36] = _crc16(frame[: lame + 34]).to_bytes(2, "big")
+    return bytes(frame)
+
+
+def mp3_audio_frames(data: bytes) -> list[memoryview]:
+    """
+    The audio frames of a whole MP3 file: split_mp3_frames without the leading
+    Xing/Info frame (metadata, which segments must not repeat).
+    """
+    frames = split_mp3_frames(data)
+    if frames:
+        h = int.from_bytes(frames[0][:4], "big")
+        p = _xing_offset(h, _mp3_frame_info(h)[2])
+        if bytes(frames[0][p : p + 4]) in (b"Info", b"Xing"):
+            return frames[1:]
+    return frames
+
+
+def _pcm_range(parts: list[Buffer], start: int, end: int) -> list[memoryview]:
+    """
+    Views covering bytes [start, end) of the concatenation of `parts` (no copies).
+    """
+    out: list[memoryview] = []
+    pos = 0
+    for p in parts:
+        n = len(p)
+        a, b = max(start, pos), min(end, pos + n)
+        if a < b:
+            out.append(memoryview(p)[a - pos : b - pos])
+        pos += n
+        if pos >= end:
+            break
+    return out
+
+
+def _encode_pcm_slice(views: list[memoryview], spec: tuple[int, int, int], bitrate_kbps: int) -> bytes:
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found")
+    ch, sw, fr = spec
+    cmd = [
+        ffmpeg,
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        _PCM_FORMATS[sw],
+        "-ar",
+        str(fr),
+        "-ac",
+        str(ch),
+        "-i",
+        "pipe:0",
+        "-c:a",
+        "libmp3lame",
+        "-b:a",
+        f"{bitrate_kbps}k",
+        "-reservoir",
+        "0",
+        "-write_xing",
+        "0",
+        "-id3v2_version",
+        "0",
+        "-f",
+        "mp3",
+        "pipe:1",
+    ]
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=err)
+
+        def feed() -> None:
+            try:
+                for v in views:
+                    proc.stdin.write(v)
+            except BrokenPipeError:
+                pass
+            finally:
+                proc.stdin.close()
+
+        writer = threading.Thread(target=feed, daemon=True)
+        writer.start()
+        out = proc.stdout.read()
+        writer.join()
+        if proc.wait() != 0:
+            err.seek(0)
+            raise RuntimeError(f"ffmpeg failed: {err.read().decode('utf-8', errors='ignore')[-600:]}")
+    return out
+
+
+def encode_mp3_frames(
+    parts: list[Buffer],
+    spec: tuple[int, int, int] = PCM_SPEC,
+    bitrate_kbps: int = 64,
+    workers: Optional[int] = None,
+) -> tuple[list[memoryview], int]:
+    """
+    Encodes the concatenation of PCM `parts` to self-contained CBR MP3 frames (no bit
+    reservoir) using `workers` ffmpeg processes at once, one per slice.
+    Returns (frames, number of PCM samples encoded); the frames match a single-process encode.
+    """
+    ch, sw, fr = spec
+    bpf = ch * sw
+    total = sum(len(p) for p in parts)
+    n_samples = total // bpf
+    if n_samples == 0:
+        raise ValueError("No audio to encode")
+
+    spf = mp3_samples_per_frame(fr)
+    n_frames = -(-n_samples // spf)
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    slices = max(1, min(workers, n_frames // MP3_MIN_SLICE_FRAMES))
+    bounds = [round(k * n_frames / slices) for k in range(slices + 1)]
+
+    def encode(k: int) -> list[memoryview]:
+        first, last = bounds[k], bounds[k + 1]
+        start_frame = max(0, first - MP3_WARMUP_FRAMES)
+        a = start_frame * spf * bpf
+        b = min(total, (last + MP3_LOOKAHEAD_FRAMES) * spf * bpf) if k + 1 < slices else total
+        frames = split_mp3_frames(_encode_pcm_slice(_pcm_range(parts, a, b), spec, bitrate_kbps))
+        skip = first - start_frame
+        if k + 1 < slices:
+            # the rest (flush frames) is covered by the next slice
+            if len(frames) < skip + (last - first):
+                raise RuntimeError(f"MP3 slice {k} came out short ({len(frames)} frames)")
+            return frames[skip : skip + (last - first)]
+        return frames[skip:]
+
+    with ThreadPoolExecutor(max_workers=slices, thread_name_prefix="peachy-mp3") as pool:
+        encoded = list(pool.map(encode, range(slices)))
+
+    return [f for part in encoded for f in part], n_samples
+
+
+def write_mp3_frames(frames: list[memoryview], n_samples: int, out_mp3: Path, spec: tuple[int, int, int] = PCM_SPEC) -> None:
+    """
+    Joins frames from encode_mp3_frames into one gapless, seekable MP3 (rebuilt Info/LAME frame first).
+    """
+    spf = mp3_samples_per_frame(spec[2])
+    audio_bytes = sum(len(f) for f in frames)
+    encoder, delay = mp3_encoder_tag(tuple(spec))
+    padding = len(frames) * spf - delay - n_samples
+    info = mp3_info_frame(frames[0], len(frames), audio_bytes, delay, padding, encoder)
+
+    out_mp3 = Path(out_mp3)
+    out_mp3.parent.mkdir(parents=True, exist_ok=True)
+    with open(out_mp3, "wb") as f:
+        f.write(info)
+        for frame in frames:
+            f.write(frame)
+
+
+def encode_mp3_parallel(
+    parts: list[Buffer],
+    out_mp3: Path,
+    spec: tuple[int, int, int] = PCM_SPEC,
+    bitrate_kbps: int = 64,
+    workers: Optional[int] = None,
+) -> None:
+    """
+    Encodes the concatenation of PCM `parts` to one CBR MP3 using `workers` ffmpeg
+    processes at once (one per slice), then joins the slices at MP3 frame boundaries
+    and prepends a rebuilt Info/LAME frame. Gapless and seekable; the audio frames
+    match a single-process encode.
+    """
+    frames, n_samples = encode_mp3_frames(parts, spec, bitrate_kbps, workers)
+    write_mp3_frames(frames, n_samples, out_mp3, spec)
+
+
+# ----------------------------
+# Segmented output (HLS packed audio)
+# ----------------------------
+HLS_PLAYLIST_NAME = "index.m3u8"
+
+
+def write_mp3_segments(
+    frames: list[memoryview],
+    out_dir: Path,
+    segment_seconds: float,
+    spec: tuple[int, int, int] = PCM_SPEC,
+) -> list[tuple[str, float]]:
+    """
+    Groups frames from encode_mp3_frames into ~segment_seconds MP3 files (seg_00000.mp3, ...).
+    The frames carry no bit reservoir, so each segment decodes on its own and the
+    segments played back to back are the whole item. Returns [(file name, duration seconds)].
+    """
+    fr = spec[2]
+    spf = mp3_samples_per_frame(fr)
+    per_seg = max(1, round(float(segment_seconds) * fr / spf))
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out: list[tuple[str, float]] = []
+    for k, i in enumerate(range(0, len(frames), per_seg)):
+        group = frames[i : i + per_seg]
+        name = f"seg_{k:05d}.mp3"
+        with open(out_dir / name, "wb") as f:
+            for frame in group:
+                f.write(frame)
+        out.append((name, len(group) * spf / fr))
+    return out
+
+
+def hls_playlist(segments: list[tuple[str, float]]) -> str:
+    """
+    VOD media playlist (m3u8) for [(segment uri, duration seconds)].
+    """
+    target = max(1, math.ceil(max(d for _, d in segments)))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+    ]
+    for uri, d in segments:
+        lines += [f"#EXTINF:{d:.5f},", uri]
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+
+def parse_hls_playlist(text: str) -> list[tuple[str, float]]:
+    """
+    [(segment uri, duration seconds)] of a media playlist (inverse of hls_playlist).
+    """
+    out: list[tuple[str, float]] = []
+    dur: Optional[float] = None
+    for raw in (text or "").splitlines():
+        line = raw.strip()
+        if line.startswith("#EXTINF:"):
+            try:
+                dur = float(line[len("#EXTINF:"):].split(",", 1)[0])
+            except ValueError:
+                dur = None
+        elif line and not line.startswith("#") and dur is not None:
+            out.append((line, dur))
+            dur = None
+    return out
+
+
+# ----------------------------
+# Extra renditions (Opus / AAC)
+# ----------------------------
+# format -> (file extension, MIME type for <source type=...>, ffmpeg codec args)
+RENDITION_CODECS = {
+    "opus": ("opus", "audio/ogg; codecs=opus", ["-c:a", "libopus", "-application", "voip", "-f", "ogg"]),
+    "aac": ("m4a", "audio/mp4; codecs=mp4a.40.2", ["-c:a", "aac", "-movflags", "+faststart", "-f", "mp4"]),
+}
+
+
+def encode_pcm_rendition(
+    parts: list[Buffer],
+    out_path: Path,
+    fmt: str,
+    bitrate_kbps: int,
+    spec: tuple[int, int, int] = PCM_SPEC,
+) -> None:
+    """
+    Encodes the concatenation of PCM `parts` to `fmt` (a RENDITION_CODECS key) in one ffmpeg run.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if not ffmpeg:
+        raise RuntimeError("ffmpeg not found")
+    if fmt not in RENDITION_CODECS:
+        raise ValueError(f"Unknown audio rendition: {fmt}")
+
+    ch, sw, fr = spec
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        ffmpeg,
+        "-y",
+        "-hide_banner",
+        "-loglevel",
+        "error",
+        "-f",
+        _PCM_FORMATS[sw],
+        "-ar",
+        str(fr),
+        "-ac",
+        str(ch),
+        "-i",
+        "pipe:0",
+        "-vn",
+        "-b:a",
+        f"{bitrate_kbps}k",
+        *RENDITION_CODECS[fmt][2],
+        str(out_path),
+    ]
+    with tempfile.TemporaryFile() as err:
+        proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=err)
+        try:
+            for p in parts:
+                proc.stdin.write(p)
+        except BrokenPipeError:
+            pass
+        finally:
+            proc.stdin.close()
+        if proc.wait() != 0:
+            err.seek(0)
+            raise RuntimeError(f"ffmpeg failed: {err.read().decode('utf-8', errors='ignore')[-600:]}")
@@ -0,0 +1,149 @@
+# core/batch.py
+"""
+Headless batch generation (no Streamlit runtime needed).
+
+  python -m core.batch docs/                       # every .txt/.pdf/.docx in docs/
+  python -m core.batch a.pdf b.docx --voice nova --speed 1.1 --jobs 4
+
+Config comes from env vars (OPENAI_KEY, STORAGE_BACKEND, B2_*) or .streamlit/secrets.toml.
+Items + history are written exactly like the app does.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+from core.extract_text import extract_text
+from core.generate import generate_item, configure_caches
+from core.history import history_store
+from core.pipeline import TIMING_MODES, TIMING_WHISPER
+from core.ratelimit import configure_rate_limits, rate_limit_db_path
+from core.storage import get_storage, DEFAULT_DATA_DIR
+
+SUPPORTED_SUFFIXES = {".txt", ".pdf", ".docx"}
+
+
+def collect_inputs(paths: list[str]) -> list[Path]:
+    out: list[Path] = []
+    for raw in paths:
+        p = Path(raw)
+        if p.is_dir():
+            out.extend(sorted(x for x in p.iterdir() if x.is_file() and x.suffix.lower() in SUPPORTED_SUFFIXES))
+        elif p.is_file() and p.suffix.lower() in SUPPORTED_SUFFIXES:
+            out.append(p)
+        else:
+            print(f"skip: {p} (not a .txt/.pdf/.docx file or directory)", file=sys.stderr)
+    return out
+
+
+def _render_one(
+    path: str,
+    voice: str,
+    speed: float,
+    data_dir: Optional[str],
+    api_concurrency: int,
+    reuse_from: Optional[str] = None,
+    timing: str = TIMING_WHISPER,
+) -> dict:
+    """
+    Runs in a worker process: builds its own storage + API clients (neither pickles).
+    With the fork start method the child inherits the parent's cached clients; those
+    caches are cleared at fork (see core.storage._s3_client, openai_client.get_client),
+    so the clients here are new ones with their own connections.
+    """
+    p = Path(path)
+    storage = get_storage(Path(data_dir) if data_dir else None)
+    configure_caches(storage)
+    # all worker processes share one budget per API
+    configure_rate_limits(rate_limit_db_path(Path(data_dir) if data_dir else DEFAULT_DATA_DIR))
+    text = extract_text(p.name, p.read_bytes())
+    return generate_item(
+        storage,
+        title=p.name,
+        full_text=text,
+        voice=voice,
+        speed=speed,
+        api_concurrency=api_concurrency,
+        reuse_from=reuse_from,
+        timing=timing,
+    )
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.batch", description="Generate Peachy items for many documents.")
+    ap.add_argument("inputs", nargs="+", help="files and/or directories of .txt/.pdf/.docx")
+    ap.add_argument("--voice", default="cedar")
+    ap.add_argument("--speed", type=float, default=1.0)
+    ap.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="documents rendered in parallel (processes)")
+    ap.add_argument("--concurrency", type=int, default=16, help="max concurrent API calls per document")
+    ap.add_argument("--data-dir", default=None, help="LocalStorage root (default: ./data)")
+    ap.add_argument(
+        "--timing",
+        choices=TIMING_MODES,
+        default=TIMING_WHISPER,
+        help="whisper: STT + alignment; sentence: per-sentence TTS, no STT; pause: local pause detection, Whisper fallback",
+    )
+    ap.add_argument(
+        "--incremental",
+        action="store_true",
+        help="re-generate from the latest item with the same title, re-synthesizing only changed chunks",
+    )
+    args = ap.parse_args(argv)
+
+    files = collect_inputs(args.inputs)
+    if not files:
+        print("No input documents found.", file=sys.stderr)
+        return 2
+
+    # history is only written from this (parent) process, so workers never race on it
+    storage = get_storage(Path(args.data_dir) if args.data_dir else None)
+
+    history = history_store(storage)
+
+    latest_by_title: dict[str, str] = {}
+    if args.incremental:
+        for f in files:
+            it = history.latest_by_title(f.name)
+            if it is not None:
+                latest_by_title[f.name] = it.get("item_dir") or f"items/{it['id']}"
+
+    failed = 0
+    jobs = max(1, min(int(args.jobs), len(files)))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {
+            pool.submit(
+                _render_one,
+                str(f),
+                args.voice,
+                float(args.speed),
+                args.data_dir,
+                int(args.concurrency),
+                latest_by_title.get(f.name),
+                args.timing,
+            ): f
+            for f in files
+        }
+        for fut in as_completed(futures):
+            f = futures[fut]
+            try:
+                record = fut.result()
+            except Exception:
+                failed += 1
+                print(f"FAILED {f}", file=sys.stderr)
+                traceback.print_exc()
+                continue
+
+            history.append(record)
+            print(f"done   {f} -> {record['item_dir']}")
+
+    print(f"{len(files) - failed}/{len(files)} documents generated.")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,215 @@
+# core/cache.py
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Hashable, Optional
+
+from core.config import get_secret
+from core.storage import Storage
+
+
+def tts_cache_key(
+    text: str,
+    voice: str,
+    speed: float,
+    model: str,
+    instructions: str,
+    response_format: str,
+) -> str:
+    """
+    Content address of one TTS render: identical inputs -> identical audio.
+    """
+    payload = json.dumps(
+        [text or "", voice, round(float(speed), 3), model, instructions or "", response_format],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def stt_cache_key(audio: bytes, model: str, timestamp_granularities: list[str]) -> str:
+    """
+    Same audio bytes + same transcription settings -> same transcript.
+    """
+    h = hashlib.sha256()
+    h.update(audio)
+    h.update(f"\x00{model}\x00{','.join(sorted(timestamp_granularities))}".encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class BlobCache:
+    """
+    Content-addressed blobs in Storage under `prefix`, evicted by age and total size,
+    least recently used first: a hit bumps the entry's mtime (at most once per
+    `touch_interval_seconds`, as that's a write on object storage). Eviction lists the
+    prefix, so it runs at most every `evict_interval_seconds` per process rather than on every put.
+    """
+
+    storage: Storage
+    prefix: str
+    ext: str
+    content_type: str
+    max_bytes: int = 2 * 1024 * 1024 * 1024
+    max_age_seconds: float = 30 * 24 * 3600.0
+    evict_interval_seconds: float = 600.0
+    touch_interval_seconds: float = 24 * 3600.0
+
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+    _last_evict: float = field(default=0.0, init=False, repr=False)
+
+    def key_for(self, digest: str) -> str:
+        # fan out by first 2 hex chars to keep directories small
+        return f"{self.prefix}/{digest[:2]}/{digest}.{self.ext}"
+
+    def get_bytes(self, digest: str) -> Optional[bytes]:
+        k = self.key_for(digest)
+        try:
+            info = self.storage.stat(k)
+            if info is None:
+                return None
+            data = self.storage.read_bytes(k)
+        except Exception:
+            # a cache must never fail the request it's trying to speed up
+            return None
+        if time.time() - info.mtime > self.touch_interval_seconds:
+            try:
+                self.storage.touch(k)
+            except Exception:
+                pass
+        return data
+
+    def put_bytes(self, digest: str, data: bytes) -> None:
+        try:
+            self.storage.write_bytes(self.key_for(digest), data, content_type=self.content_type)
+        except Exception:
+            return
+        self.maybe_evict()
+
+    def get_json(self, digest: str) -> Optional[dict]:
+        data = self.get_bytes(digest)
+        if data is None:
+            return None
+        try:
+            return json.loads(data.decode("utf-8"))
+        except ValueError:
+            return None
+
+    def put_json(self, digest: str, obj: dict) -> None:
+        self.put_bytes(digest, json.dumps(obj).encode("utf-8"))
+
+    def get_file(self, digest: str, out_path: Path) -> bool:
+        data = self.get_bytes(digest)
+        if data is None:
+            return False
+        out = Path(out_path)
+        out.parent.mkdir(parents=True, exist_ok=True)
+        out.write_bytes(data)
+        return True
+
+    def put_file(self, digest: str, src_path: Path) -> None:
+        self.put_bytes(digest, Path(src_path).read_bytes())
+
+    def maybe_evict(self) -> None:
+        now = time.time()
+        with self._lock:
+            if now - self._last_evict < self.evict_interval_seconds:
+                return
+            self._last_evict = now
+        try:
+            self.evict(now)
+        except Exception:
+            pass
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """
+        Drop entries unused for max_age_seconds, then least recently used first until
+        the prefix is under max_bytes. Returns the number of entries removed.
+        """
+        now = time.time() if now is None else now
+        entries = sorted(self.storage.list_objects(self.prefix), key=lambda o: o.mtime)
+
+        removed = 0
+        total = sum(o.size for o in entries)
+        for o in entries:
+            too_old = (now - o.mtime) > self.max_age_seconds
+            too_big = total > self.max_bytes
+            if not (too_old or too_big):
+                # sorted by last use: nothing after this one is staler
+                break
+            self.storage.delete(o.key)
+            total -= o.size
+            removed += 1
+        return removed
+
+
+class MemoryLru:
+    """
+    In-process LRU bounded by the total size (bytes, as given to put) of its values.
+    Thread-safe; values are shared, not copied, so callers must not mutate them.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = int(max_bytes)
+        self._lock = threading.Lock()
+        self._items: OrderedDict[Hashable, tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            hit = self._items.get(key)
+            if hit is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return hit[0]
+
+    def put(self, key: Hashable, value: Any, size: int) -> None:
+        size = max(0, int(size))
+        if size > self.max_bytes:
+            # would evict everything else and still not fit
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._items[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, n) = self._items.popitem(last=False)
+                self._bytes -= n
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+
+def tts_cache_from_config(storage: Storage) -> BlobCache:
+    return BlobCache(
+        storage=storage,
+        prefix="cache/tts",
+        ext="bin",
+        content_type="application/octet-stream",
+        max_bytes=int(float(get_secret("TTS_CACHE_MAX_MB", 2048)) * 1024 * 1024),
+        max_age_seconds=float(get_secret("TTS_CACHE_MAX_AGE_DAYS", 30)) * 24 * 3600.0,
+    )
+
+
+def stt_cache_from_config(storage: Storage) -> BlobCache:
+    return BlobCache(
+        storage=storage,
+        prefix="cache/stt",
+        ext="json",
+        content_type="application/json; charset=utf-8",
+        max_bytes=int(float(get_secret("STT_CACHE_MAX_MB", 256)) * 1024 * 1024),
+        max_age_seconds=float(get_secret("STT_CACHE_MAX_AGE_DAYS", 90)) * 24 * 3600.0,
+    )
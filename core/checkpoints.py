@@ -0,0 +1,298 @@
+# core/checkpoints.py
+from __future__ import annotations
+
+import hashlib
+import tempfile
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+from core.audio_utils import PCM_SPEC, convert_wav_to_mp3, decode_audio_range, pcm_to_wav_bytes, wav_bytes_to_pcm
+from core.storage import Storage
+
+LIVE_KEY = "live.json"
+
+# What stays under items/<id>/chunks/ once the item is finished (manifest.json written):
+#   "audio":   the <i>-<fp>.json results and the chunk WAVs, so a later version reuses a
+#              chunk losslessly by copying its WAV (adopt)
+#   "results": only the .json results; a reused chunk is re-cut from the item's (lossy)
+#              master audio, so its audio goes through one more encode per version
+#   "all":     everything (chunk WAVs, preview MP3s, Whisper output)
+RETAIN_AUDIO = "audio"
+RETAIN_RESULTS = "results"
+RETAIN_ALL = "all"
+# chunk checkpoint suffixes dropped under each retention
+_PRUNED_SUFFIXES = {
+    RETAIN_AUDIO: (".mp3", ".stt.json"),
+    RETAIN_RESULTS: (".wav", ".mp3", ".stt.json"),
+    RETAIN_ALL: (),
+}
+
+
+def chunk_fingerprint(chunk_text: str, voice: str, speed: float, timing: str = "whisper") -> str:
+    """
+    Identifies a chunk render. Part of every checkpoint key, so a checkpoint can
+    never be reused for different text/voice/speed/timing mode.
+    """
+    h = hashlib.sha256()
+    h.update(f"{voice}\x00{float(speed):.3f}\x00".encode("utf-8"))
+    if timing != "whisper":
+        # whisper-mode keys predate timing modes; keep them stable
+        h.update(f"{timing}\x00".encode("utf-8"))
+    h.update((chunk_text or "").encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+@dataclass
+class ChunkCheckpoints:
+    """
+    Per-chunk checkpoints under items/<id>/chunks/:
+      <i>-<fp>.wav       TTS output
+      <i>-<fp>.mp3       same audio for progressive playback (only with preview_kbps)
+      <i>-<fp>.stt.json  Whisper verbose_json
+      <i>-<fp>.json      final chunk-local result (duration + aligned segments)
+
+    Written as each stage finishes; a re-run with the same item id skips
+    whatever is already there. Once the item is finished, prune_media() drops what
+    the retention doesn't keep (see RETAIN_*).
+    """
+
+    storage: Storage
+    item_prefix: str
+    preview_kbps: Optional[int] = None
+    # (chunk index -> manifest chunk, master audio as PCM_SPEC frames), read on first use
+    _master: Optional[tuple[dict[int, dict], Optional[bytes]]] = field(default=None, init=False, repr=False)
+
+    def key(self, index: int, fp: str, ext: str) -> str:
+        return f"{self.item_prefix}/chunks/{index:04d}-{fp}.{ext}"
+
+    # --- TTS audio
+    def save_wav(self, index: int, fp: str, wav_path: Path) -> None:
+        self.save_wav_bytes(index, fp, Path(wav_path).read_bytes())
+
+    def save_wav_bytes(self, index: int, fp: str, data: bytes) -> None:
+        if self.preview_kbps:
+            # before the WAV, so a live player never sees the WAV without its MP3
+            self.save_preview(index, fp, data)
+        self.storage.write_bytes(self.key(index, fp, "wav"), data, content_type="audio/wav")
+
+    def save_preview(self, index: int, fp: str, wav_data: bytes) -> None:
+        """
+        Small MP3 of a finished chunk so it can be played before the item is done.
+        Best effort: without ffmpeg, live playback falls back to the WAV.
+        """
+        with tempfile.TemporaryDirectory() as td:
+            wav = Path(td) / "chunk.wav"
+            mp3 = Path(td) / "chunk.mp3"
+            wav.write_bytes(wav_data)
+            try:
+                convert_wav_to_mp3(wav, mp3, bitrate_kbps=int(self.preview_kbps or 64))
+            except Exception:
+                return
+            self.storage.write_bytes(self.key(index, fp, "mp3"), mp3.read_bytes(), content_type="audio/mpeg")
+
+    def restore_wav(self, index: int, fp: str, wav_path: Path) -> bool:
+        k = self.key(index, fp, "wav")
+        if not self.storage.exists(k):
+            return False
+        wav_path = Path(wav_path)
+        wav_path.parent.mkdir(parents=True, exist_ok=True)
+        wav_path.write_bytes(self.storage.read_bytes(k))
+        return True
+
+    def load_wav_bytes(self, index: int, fp: str) -> Optional[bytes]:
+        k = self.key(index, fp, "wav")
+        if not self.storage.exists(k):
+            return None
+        return self.storage.read_bytes(k)
+
+    # --- STT
+    def save_stt(self, index: int, fp: str, stt_verbose: dict) -> None:
+        self.storage.write_json(self.key(index, fp, "stt.json"), stt_verbose)
+
+    def load_stt(self, index: int, fp: str) -> Optional[dict]:
+        return self.storage.read_json(self.key(index, fp, "stt.json"), None)
+
+    # --- final (aligned) result
+    def save_result(
+        self,
+        index: int,
+        fp: str,
+        duration: float,
+        segments: list[dict],
+        meta: Optional[dict] = None,
+    ) -> None:
+        self.storage.write_json(
+            self.key(index, fp, "json"),
+            {
+                "index": index,
+                "fingerprint": fp,
+                "duration_seconds": float(duration),
+                "segments": segments,
+                "meta": meta or {},
+            },
+        )
+
+    def load_result(self, index: int, fp: str) -> Optional[dict]:
+        return self.storage.read_json(self.key(index, fp, "json"), None)
+
+    # --- reuse from another item (incremental re-generation)
+    def adopt(self, prior: "ChunkCheckpoints", prior_index: int, index: int, fp: str) -> bool:
+        """
+        Copy a finished chunk (audio + aligned result) from a prior item's checkpoints.
+        Returns False if the prior item doesn't have it.
+        """
+        src_json = prior.key(prior_index, fp, "json")
+        src_wav = prior.key(prior_index, fp, "wav")
+        result = self.storage.read_json(src_json, None)
+        if not result:
+            return False
+        if self.storage.exists(src_wav):
+            self.storage.copy(src_wav, self.key(index, fp, "wav"), content_type="audio/wav")
+        else:
+            # chunk audio pruned once the prior item finished: cut it from its master audio
+            try:
+                pcm = prior.master_chunk_pcm(prior_index)
+            except Exception:
+                pcm = None
+            if pcm is None:
+                return False
+            self.storage.write_bytes(self.key(index, fp, "wav"), pcm_to_wav_bytes(pcm), content_type="audio/wav")
+        result["index"] = index
+        self.storage.write_json(self.key(index, fp, "json"), result)
+        return True
+
+    def master_chunk_pcm(self, index: int) -> Optional[bytes]:
+        """
+        Chunk `index` of this (finished) item as PCM_SPEC frames, cut sample-exactly from the
+        master audio using the manifest's chunk offsets. None if the item has no such chunk.
+        The master is read and decoded once per ChunkCheckpoints object, then sliced, so
+        adopting N chunks costs one decode, not N.
+        """
+        if self._master is None:
+            self._master = self._decode_master()
+        chunks, pcm = self._master
+        chunk = chunks.get(int(index))
+        if chunk is None or pcm is None:
+            return None
+        ch, sw, fr = PCM_SPEC
+        start = round(float(chunk["audio_offset_seconds"]) * fr)
+        end = start + round(float(chunk["duration_seconds"]) * fr)
+        return pcm[start * ch * sw : end * ch * sw]
+
+    def _decode_master(self) -> tuple[dict[int, dict], Optional[bytes]]:
+        manifest = self.storage.read_json(f"{self.item_prefix}/manifest.json", {})
+        audio = manifest.get("audio") or {}
+        chunks = {int(c["index"]): c for c in manifest.get("chunks") or []}
+        if not chunks or not audio.get("key") or not self.storage.exists(audio["key"]):
+            return chunks, None
+        data = self.storage.read_bytes(audio["key"])
+        if audio.get("format") == "wav":
+            frames, spec = wav_bytes_to_pcm(data)
+            return chunks, (frames if spec == PCM_SPEC else None)
+        return chunks, decode_audio_range(data, 0, None, PCM_SPEC)
+
+    def prune_media(self, retention: str = RETAIN_RESULTS) -> int:
+        """
+        Deletes the chunk checkpoints of a finished item that `retention` doesn't keep
+        (always keeping the .json results). Returns how many objects were deleted.
+        """
+        suffixes = _PRUNED_SUFFIXES[retention]
+        if not suffixes:
+            return 0
+        n = 0
+        for o in self.storage.list_objects(f"{self.item_prefix}/chunks/"):
+            if o.key.endswith(suffixes):
+                self.storage.delete(o.key)
+                n += 1
+        return n
+
+
+def prior_chunk_texts(storage: Storage, item_prefix: str) -> list[str]:
+    """
+    Chunk texts of an existing item, in order (from manifest chunk spans over full.txt).
+    """
+    manifest = storage.read_json(f"{item_prefix}/manifest.json", {})
+    full_key = f"{item_prefix}/full.txt"
+    if not manifest.get("chunks") or not storage.exists(full_key):
+        return []
+    full_text = storage.read_text(full_key)
+    return [
+        full_text[int(c["orig_char_start"]) : int(c["orig_char_end"])]
+        for c in sorted(manifest["chunks"], key=lambda c: int(c["index"]))
+    ]
+
+
+# ----------------------------
+# Progressive playback
+# ----------------------------
+def write_live_plan(storage: Storage, item_prefix: str, chunks: list[dict], fingerprints: list[str], timing: str) -> None:
+    """
+    items/<id>/live.json: the chunk plan of an item being generated, so a player can
+    pick up chunk checkpoints as they land.
+    """
+    storage.write_json(
+        f"{item_prefix}/{LIVE_KEY}",
+        {
+            "timing": timing,
+            "chunks": [
+                {
+                    "index": i,
+                    "fingerprint": fp,
+                    "orig_char_start": int(ch["orig_start"]),
+                    "orig_char_end": int(ch["orig_end"]),
+                }
+                for i, (ch, fp) in enumerate(zip(chunks, fingerprints))
+            ],
+        },
+    )
+
+
+def live_chunks(storage: Storage, item_prefix: str) -> list[dict]:
+    """
+    Current state of every planned chunk of an item (empty if there is no live plan):
+      {"index", "orig_char_start", "orig_char_end",
+       "audio_key", "mime"       -> None until the chunk's audio exists,
+       "duration_seconds", "segments" -> None until it is aligned (chunk-local times,
+                                          global orig_char_* spans)}
+    One listing of the chunks/ prefix per call, not one request per chunk.
+    """
+    plan = storage.read_json(f"{item_prefix}/{LIVE_KEY}", {})
+    if not plan.get("chunks"):
+        return []
+
+    ckpt = ChunkCheckpoints(storage, item_prefix)
+    present = {o.key for o in storage.list_objects(f"{item_prefix}/chunks/")}
+
+    out: list[dict] = []
+    for c in plan["chunks"]:
+        i, fp = int(c["index"]), str(c["fingerprint"])
+        a = int(c["orig_char_start"])
+        state = {
+            "index": i,
+            "orig_char_start": a,
+            "orig_char_end": int(c["orig_char_end"]),
+            "audio_key": None,
+            "mime": None,
+            "duration_seconds": None,
+            "segments": None,
+        }
+        for ext, mime in (("mp3", "audio/mpeg"), ("wav", "audio/wav")):
+            if ckpt.key(i, fp, ext) in present:
+                state["audio_key"], state["mime"] = ckpt.key(i, fp, ext), mime
+                break
+        if ckpt.key(i, fp, "json") in present:
+            done = ckpt.load_result(i, fp) or {}
+            state["duration_seconds"] = float(done.get("duration_seconds", 0.0))
+            state["segments"] = [
+                {
+                    "start": float(s.get("start", 0.0)),
+                    "end": float(s.get("end", 0.0)),
+                    "orig_char_start": a + int(s["orig_char_start_local"]),
+                    "orig_char_end": a + int(s["orig_char_end_local"]),
+                }
+                for s in done.get("segments") or []
+                if "orig_char_start_local" in s and "orig_char_end_local" in s
+            ]
+        out.append(state)
+    return out
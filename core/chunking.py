@@ -0,0 +1,159 @@
+# core/chunking.py
+from __future__ import annotations
+
+import re
+
+
+def split_text_into_chunks_with_offsets(text: str, max_chars: int) -> list[dict]:
+    """
+    Returns list of:
+      { "text": <exact substring>, "orig_start": int, "orig_end": int }
+    Splits on paragraph boundaries when possible, else splits inside long paragraphs.
+    """
+    if not text:
+        return []
+
+    # paragraph separators: 2+ newlines
+    sep_pat = re.compile(r"\n{2,}")
+    spans: list[tuple[int, int]] = []
+
+    start = 0
+    for m in sep_pat.finditer(text):
+        end = m.end()  # include separator in span
+        spans.append((start, end))
+        start = end
+    if start < len(text):
+        spans.append((start, len(text)))
+
+    chunks: list[dict] = []
+    cur_start = None
+    cur_end = None
+
+    def flush():
+        nonlocal cur_start, cur_end
+        if cur_start is None or cur_end is None or cur_end <= cur_start:
+            cur_start, cur_end = None, None
+            return
+        chunk_text = text[cur_start:cur_end]
+        chunks.append({"text": chunk_text, "orig_start": cur_start, "orig_end": cur_end})
+        cur_start, cur_end = None, None
+
+    for (p_start, p_end) in spans:
+        p_len = p_end - p_start
+
+        # If paragraph span itself is huge, split inside it
+        if p_len > max_chars:
+            flush()
+            i = p_start
+            while i < p_end:
+                j = min(p_end, i + max_chars)
+
+                # try to cut at sentence boundary
+                slice_ = text[i:j]
+                cut = slice_.rfind(". ")
+                if cut < int(max_chars * 0.55):
+                    cut = slice_.rfind(" ")
+                if cut <= 0:
+                    cut = len(slice_)
+
+                piece_end = i + cut
+                if piece_end <= i:
+                    piece_end = j
+
+                chunks.append({"text": text[i:piece_end], "orig_start": i, "orig_end": piece_end})
+                i = piece_end
+            continue
+
+        # Normal paragraph: try to add into current chunk
+        if cur_start is None:
+            cur_start, cur_end = p_start, p_end
+        else:
+            if (p_end - cur_start) <= max_chars:
+                cur_end = p_end
+            else:
+                flush()
+                cur_start, cur_end = p_start, p_end
+
+    flush()
+    # filter empty-ish
+    return [c for c in chunks if (c["text"] or "").strip()]
+
+
+def plan_chunks_reusing(text: str, prior_chunks: list[str], max_chars: int) -> list[dict]:
+    """
+    Chunk `text` so that every prior chunk text that still appears verbatim (in order)
+    becomes a chunk of its own, with identical text. Only the edited gaps between
+    them are re-split with split_text_into_chunks_with_offsets.
+    Same output shape as split_text_into_chunks_with_offsets.
+    """
+    if not text:
+        return []
+
+    out: list[dict] = []
+    pos = 0
+
+    def add_gap(a: int, b: int) -> None:
+        if b <= a:
+            return
+        for c in split_text_into_chunks_with_offsets(text[a:b], max_chars=max_chars):
+            out.append({"text": c["text"], "orig_start": a + c["orig_start"], "orig_end": a + c["orig_end"]})
+
+    for pc in prior_chunks:
+        if not (pc or "").strip():
+            continue
+        idx = text.find(pc, pos)
+        if idx < 0:
+            continue
+        add_gap(pos, idx)
+        out.append({"text": pc, "orig_start": idx, "orig_end": idx + len(pc)})
+        pos = idx + len(pc)
+
+    add_gap(pos, len(text))
+    return [c for c in out if (c["text"] or "").strip()]
+
+
+# sentence end: terminal punctuation (+ closing quotes/brackets) before whitespace, or a paragraph break
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s)|\n{2,}")
+
+
+def split_sentences_with_offsets(text: str, min_chars: int = 40, max_chars: int = 600) -> list[dict]:
+    """
+    Returns list of:
+      { "text": <exact substring>, "start": int, "end": int }
+    Whitespace-trimmed sentences; ones shorter than min_chars are merged into the
+    next in the same paragraph (as long as the result stays <= max_chars) so TTS
+    gets natural phrases.
+    """
+    if not text:
+        return []
+
+    spans: list[tuple[int, int]] = []
+    start = 0
+    for m in _SENTENCE_END.finditer(text):
+        spans.append((start, m.end()))
+        start = m.end()
+    if start < len(text):
+        spans.append((start, len(text)))
+
+    trimmed: list[tuple[int, int]] = []
+    for a, b in spans:
+        while a < b and text[a].isspace():
+            a += 1
+        while b > a and text[b - 1].isspace():
+            b -= 1
+        if b > a:
+            trimmed.append((a, b))
+
+    merged: list[tuple[int, int]] = []
+    for a, b in trimmed:
+        if (
+            merged
+            and (merged[-1][1] - merged[-1][0]) < min_chars
+            and (b - merged[-1][0]) <= max_chars
+            and "\n\n" not in text[merged[-1][1] : a]  # never merge across paragraphs
+        ):
+            merged[-1] = (merged[-1][0], b)
+        else:
+            merged.append((a, b))
+
+    return [{"text": text[a:b], "start": a, "end": b} for a, b in merged]
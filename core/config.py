@@ -0,0 +1,54 @@
+# core/config.py
+from __future__ import annotations
+
+import os
+import warnings
+from typing import Any, Callable
+
+_MISSING = object()
+
+
+def _streamlit_secrets():
+    # imported lazily so headless workers / CLIs never need a Streamlit runtime
+    try:
+        import streamlit as st
+
+        return st.secrets
+    except Exception:
+        return None
+
+
+def get_secret(name: str, default: Any = _MISSING) -> Any:
+    """
+    Environment variable first, then Streamlit secrets (.streamlit/secrets.toml).
+    Raises KeyError when missing and no default is given.
+    """
+    v = os.environ.get(name)
+    if v is not None:
+        return v
+
+    secrets = _streamlit_secrets()
+    if secrets is not None:
+        try:
+            return secrets[name]
+        except Exception:
+            pass
+
+    if default is _MISSING:
+        raise KeyError(f"Missing config value: {name} (set it as an env var or in .streamlit/secrets.toml)")
+    return default
+
+
+def get_number(name: str, default: float, cast: Callable[[Any], float] = float) -> float:
+    """
+    Numeric get_secret: a blank or malformed value falls back to `default` with a warning,
+    so a typo in the config can't fail a job halfway through.
+    """
+    v = get_secret(name, default)
+    if isinstance(v, str) and not v.strip():
+        return default
+    try:
+        return cast(v)
+    except (TypeError, ValueError):
+        warnings.warn(f"{name}={v!r} is not a number; using {default}", stacklevel=2)
+        return default
@@ -0,0 +1,483 @@
+# core/generate.py
+from __future__ import annotations
+
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Callable, Optional
+
+from core.alignment import AlignConfig
+from core.audio_utils import (
+    PCM_SPEC,
+    RENDITION_CODECS,
+    encode_pcm_rendition,
+    HLS_PLAYLIST_NAME,
+    StreamingMp3Encoder,
+    encode_mp3_frames,
+    hls_playlist,
+    ffmpeg_available,
+    mp3_audio_frames,
+    read_wav_frames,
+    stitch_wavs,
+    write_mp3_frames,
+    write_mp3_segments,
+    write_wav_from_pcm,
+)
+from core.cache import tts_cache_from_config, stt_cache_from_config
+from core.checkpoints import (
+    RETAIN_ALL,
+    RETAIN_AUDIO,
+    RETAIN_RESULTS,
+    ChunkCheckpoints,
+    chunk_fingerprint,
+    prior_chunk_texts,
+    write_live_plan,
+)
+from core.chunking import split_text_into_chunks_with_offsets, plan_chunks_reusing
+from core.config import get_number, get_secret
+from core.history import now_pt_string
+from core.pipeline import (
+    AUDIO_PCM,
+    AUDIO_WAV,
+    ChunkResult,
+    PipelineConfig,
+    PipelineResult,
+    render_chunks,
+    run_render_chunks_async,
+    TIMING_WHISPER,
+)
+from core.storage import Storage
+from core.stt import set_stt_cache
+from core.tts import set_tts_cache
+
+# TTS: stay below the per-request limit with buffer
+TTS_CHUNK_MAX_CHARS = 3600
+
+# Chunks in flight at once (chunk i+1 TTS overlaps chunk i STT/align)
+PIPELINE_MAX_IN_FLIGHT = 4
+
+# Merge for a nicer UI + better alignment anchors
+DISPLAY_SEG_MAX_SECONDS = 10.0
+DISPLAY_SEG_MAX_CHARS = 520
+
+MP3_BITRATE_KBPS = 64
+
+# How audio.mp3 is encoded:
+#   "stream":   one ffmpeg fed chunk by chunk while rendering (done right after the last chunk)
+#   "parallel": after rendering, slices encoded by MP3_ENCODE_WORKERS ffmpeg processes at once
+#               and joined at frame level (for many-core boxes, or resumes where most chunks
+#               come back from checkpoints at once)
+MP3_ENCODE_STREAM = "stream"
+MP3_ENCODE_PARALLEL = "parallel"
+
+# Smaller renditions stored next to audio.mp3, as "format:kbps" pairs (see audio_utils.RENDITION_CODECS).
+# AUDIO_RENDITIONS="opus:24,aac:48" sets the ladder, "" stores MP3 only. The playback view
+# picks the smallest one the browser can play; audio.mp3 stays as the fallback for the rest.
+DEFAULT_AUDIO_RENDITIONS = "opus:24"
+
+# Segmented copy of the MP3 under items/<id>/hls/ (index.m3u8 + seg_NNNNN.mp3), so players
+# can fetch only the part around the playback position. The segments are audio.mp3's own
+# frames (encoded without bit reservoir, so each segment decodes on its own), in either
+# encode mode. HLS_SEGMENT_SECONDS=0 turns it off.
+DEFAULT_HLS_SEGMENT_SECONDS = 10.0
+
+
+class NoTextError(ValueError):
+    pass
+
+
+def _noop(msg: str) -> None:
+    pass
+
+
+def _enabled(name: str, default: str = "1") -> bool:
+    return str(get_secret(name, default)).strip().lower() not in {"0", "false", "no", "off", ""}
+
+
+def _audio_format() -> str:
+    """
+    TTS_AUDIO_FORMAT: "wav" (default) writes a file per chunk, "pcm" keeps chunk audio in memory.
+    """
+    v = str(get_secret("TTS_AUDIO_FORMAT", AUDIO_WAV)).strip().lower()
+    return v if v in (AUDIO_PCM, AUDIO_WAV) else AUDIO_WAV
+
+
+def _checkpoint_retention() -> str:
+    """
+    CHECKPOINT_RETENTION: what stays of the chunk checkpoints once an item is finished
+    ("audio" by default: results + chunk WAVs, so edits reuse chunks losslessly; "results"
+    to keep only the results, "all" to keep everything; see checkpoints.RETAIN_*).
+    """
+    v = str(get_secret("CHECKPOINT_RETENTION", RETAIN_AUDIO)).strip().lower()
+    return v if v in (RETAIN_AUDIO, RETAIN_RESULTS, RETAIN_ALL) else RETAIN_AUDIO
+
+
+def _hls_segment_seconds() -> float:
+    return get_number("HLS_SEGMENT_SECONDS", DEFAULT_HLS_SEGMENT_SECONDS)
+
+
+def _mp3_encode_workers() -> Optional[int]:
+    """
+    MP3_ENCODE_WORKERS: processes for the parallel encode (0/unset: one per CPU).
+    """
+    return max(0, get_number("MP3_ENCODE_WORKERS", 0, int)) or None
+
+
+def _mp3_encode_mode() -> str:
+    v = str(get_secret("MP3_ENCODE", MP3_ENCODE_STREAM)).strip().lower()
+    return v if v in (MP3_ENCODE_STREAM, MP3_ENCODE_PARALLEL) else MP3_ENCODE_STREAM
+
+
+def _audio_renditions() -> list[tuple[str, int]]:
+    out: list[tuple[str, int]] = []
+    for part in str(get_secret("AUDIO_RENDITIONS", DEFAULT_AUDIO_RENDITIONS)).split(","):
+        fmt, _, kbps = part.strip().lower().partition(":")
+        if fmt not in RENDITION_CODECS:
+            continue
+        try:
+            r = (fmt, int(kbps or 32))
+        except ValueError:
+            continue
+        if r not in out:
+            out.append(r)
+    return out
+
+
+def _pcm_source(result: PipelineResult, n_chunks: int) -> tuple[list, tuple[int, int, int]]:
+    """
+    The item's audio as PCM parts: in memory from the pcm path, read back from the chunk WAVs otherwise.
+    """
+    if result.pcm and len(result.pcm) == n_chunks:
+        return result.pcm, PCM_SPEC
+    return read_wav_frames(result.wav_paths)
+
+
+def _encode_renditions(
+    storage: Storage,
+    item_prefix: str,
+    parts: list,
+    spec: tuple[int, int, int],
+    ladder: list[tuple[str, int]],
+    td: Path,
+) -> list[dict]:
+    """
+    Encodes + stores each (format, kbps) of the ladder (in parallel, one ffmpeg each).
+    Best effort: a rendition that fails to encode is left out.
+    """
+
+    def one(fmt: str, kbps: int) -> Optional[dict]:
+        ext, mime, _ = RENDITION_CODECS[fmt]
+        name = f"audio_{kbps}k.{ext}"
+        out = td / name
+        try:
+            encode_pcm_rendition(parts, out, fmt, kbps, spec=spec)
+        except Exception:
+            return None
+        key = f"{item_prefix}/{name}"
+        data = out.read_bytes()
+        storage.write_bytes(key, data, content_type=mime.split(";")[0])
+        return {"format": fmt, "key": key, "mime": mime, "bitrate_kbps": kbps, "bytes": len(data)}
+
+    with ThreadPoolExecutor(max_workers=len(ladder), thread_name_prefix="peachy-rendition") as pool:
+        done = list(pool.map(lambda r: one(*r), ladder))
+    return [r for r in done if r is not None]
+
+
+def _store_hls(
+    storage: Storage,
+    item_prefix: str,
+    frames: list,
+    segment_seconds: float,
+    td: Path,
+    spec: tuple[int, int, int],
+) -> dict:
+    seg_dir = td / "hls"
+    segs = write_mp3_segments(frames, seg_dir, segment_seconds, spec)
+    for name, _ in segs:
+        storage.write_bytes(f"{item_prefix}/hls/{name}", (seg_dir / name).read_bytes(), content_type="audio/mpeg")
+    # written last: a playlist only ever lists segments that exist
+    playlist_key = f"{item_prefix}/hls/{HLS_PLAYLIST_NAME}"
+    storage.write_bytes(playlist_key, hls_playlist(segs).encode("utf-8"), content_type="application/vnd.apple.mpegurl")
+    return {
+        "playlist": playlist_key,
+        "segment_seconds": float(segment_seconds),
+        "segments": len(segs),
+        "mime": "audio/mpeg",
+    }
+
+
+def configure_caches(storage: Storage) -> None:
+    """
+    Process-wide API caches backed by `storage`. Call once per process, before generating.
+    TTS_CACHE=0 / STT_CACHE=0 disable either one.
+    """
+    set_tts_cache(tts_cache_from_config(storage) if _enabled("TTS_CACHE") else None)
+    set_stt_cache(stt_cache_from_config(storage) if _enabled("STT_CACHE") else None)
+
+
+def _adopt_unchanged_chunks(
+    ckpt: ChunkCheckpoints,
+    prior: ChunkCheckpoints,
+    chunks: list[dict],
+    prior_texts: list[str],
+    voice: str,
+    speed: float,
+    timing: str,
+) -> int:
+    prior_index = {chunk_fingerprint(t, voice, speed, timing): j for j, t in enumerate(prior_texts)}
+
+    reused = 0
+    for i, ch in enumerate(chunks):
+        fp = chunk_fingerprint(ch["text"], voice, speed, timing)
+        j = prior_index.get(fp)
+        if j is None:
+            continue
+        if ckpt.storage.exists(ckpt.key(i, fp, "json")) or ckpt.adopt(prior, j, i, fp):
+            reused += 1
+    return reused
+
+
+def generate_item(
+    storage: Storage,
+    title: str,
+    full_text: str,
+    voice: str,
+    speed: float,
+    item_id: Optional[str] = None,
+    created_at: Optional[str] = None,
+    created_ts: Optional[float] = None,
+    api_concurrency: Optional[int] = None,
+    reuse_from: Optional[str] = None,
+    timing: str = TIMING_WHISPER,
+    progressive: bool = False,
+    on_status: Optional[Callable[[str], None]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    Full pipeline for one document:
+      chunk -> TTS -> STT -> align -> encode (streamed, in chunk order) -> store (items/<id>/...)
+
+    Returns the history record; the caller appends it to history.
+    Chunks are checkpointed under items/<id>/chunks/, so calling this again with the
+    same item_id after a failure only re-renders the chunks that didn't finish.
+
+    reuse_from="items/<prior id>" re-generates an edited document: chunks whose text
+    is unchanged keep their prior audio + aligned segments; only edited chunks hit TTS/STT.
+
+    timing="sentence" skips STT: one TTS request per sentence, timings from WAV durations.
+    progressive=True publishes each chunk (MP3 + aligned segments) as it finishes and
+    writes items/<id>/live.json up front, so playback can start before the item is done.
+    api_concurrency=None uses the threaded pipeline, an int uses the async driver.
+    on_progress(done, total) is called as chunks finish (threaded pipeline).
+    Raises NoTextError if there is no text to synthesize.
+    """
+    say = on_status or _noop
+
+    item_id = item_id or uuid.uuid4().hex
+    created_at = created_at or now_pt_string()
+    created_ts = float(created_ts) if created_ts is not None else time.time()
+    full_text = full_text or ""
+
+    prior_texts = prior_chunk_texts(storage, reuse_from) if reuse_from else []
+    if prior_texts:
+        chunks = plan_chunks_reusing(full_text, prior_texts, max_chars=TTS_CHUNK_MAX_CHARS)
+    else:
+        chunks = split_text_into_chunks_with_offsets(full_text, max_chars=TTS_CHUNK_MAX_CHARS)
+    if not chunks:
+        raise NoTextError("No text extracted from this file.")
+
+    item_prefix = f"items/{item_id}"
+    full_text_key = f"{item_prefix}/full.txt"
+    segments_key = f"{item_prefix}/segments.json"
+    manifest_key = f"{item_prefix}/manifest.json"
+
+    audio_mp3_key = f"{item_prefix}/audio.mp3"
+    audio_wav_key = f"{item_prefix}/audio.wav"
+
+    if timing == TIMING_WHISPER:
+        say(f"Step 1/2: Generating {len(chunks)} audio chunks (WAV) + STT…")
+    else:
+        say(f"Step 1/2: Generating {len(chunks)} audio chunks (WAV, {timing} timing)…")
+
+    manifest = {
+        "id": item_id,
+        "title": title,
+        "created_at": created_at,
+        "voice": voice,
+        "speed": float(speed),
+        "tts_chunk_max_chars": TTS_CHUNK_MAX_CHARS,
+        "timing": timing,
+        "chunks": [],
+    }
+
+    pipe_cfg = PipelineConfig(
+        voice=voice,
+        speed=float(speed),
+        max_in_flight=PIPELINE_MAX_IN_FLIGHT,
+        seg_max_seconds=DISPLAY_SEG_MAX_SECONDS,
+        seg_max_chars=DISPLAY_SEG_MAX_CHARS,
+        align=AlignConfig(lookback=250, ahead=9000, threshold=78, min_query_len=10),
+        timing=timing,
+        audio_format=_audio_format(),
+    )
+
+    ckpt = ChunkCheckpoints(storage, item_prefix, preview_kbps=MP3_BITRATE_KBPS if progressive else None)
+
+    if prior_texts:
+        reused = _adopt_unchanged_chunks(
+            ckpt, ChunkCheckpoints(storage, reuse_from), chunks, prior_texts, voice, speed, timing
+        )
+        manifest["reused_from"] = reuse_from
+        manifest["reused_chunks"] = reused
+        say(f"Reusing {reused}/{len(chunks)} unchanged chunks from the previous version")
+
+    if progressive:
+        storage.write_text(full_text_key, full_text)
+        fps = [chunk_fingerprint(ch["text"], voice, speed, timing) for ch in chunks]
+        write_live_plan(storage, item_prefix, chunks, fps, timing)
+
+    with tempfile.TemporaryDirectory() as td, ExitStack() as cleanup:
+        td = Path(td)
+
+        # stream mode: chunks are fed to one ffmpeg process in order as they finish (no master.wav)
+        master_mp3 = td / "audio.mp3"
+        encode_mode = _mp3_encode_mode() if ffmpeg_available() else None
+        hls_seconds = _hls_segment_seconds()
+        mp3_workers = _mp3_encode_workers()
+        encoder = (
+            StreamingMp3Encoder(master_mp3, bitrate_kbps=MP3_BITRATE_KBPS, reservoir=hls_seconds <= 0)
+            if encode_mode == MP3_ENCODE_STREAM
+            else None
+        )
+
+        def encode_chunk(res: ChunkResult) -> None:
+            nonlocal encoder
+            if encoder is None:
+                return
+            try:
+                if res.pcm is not None:
+                    encoder.add_pcm(res.pcm)
+                else:
+                    encoder.add_wav(res.wav_path)
+            except Exception as e:
+                # keep rendering; the WAV fallback below still has every chunk
+                say(f"MP3 encoder failed ({type(e).__name__}: {e}); audio will be stored as WAV")
+                encoder.abort()
+                encoder = None
+
+        try:
+            if api_concurrency is None:
+                def chunk_done(done: int, total: int) -> None:
+                    say(f"Chunk {done}/{total} done")
+                    if on_progress is not None:
+                        on_progress(done, total)
+
+                result = render_chunks(chunks, td, pipe_cfg, on_progress=chunk_done, ckpt=ckpt, on_chunk=encode_chunk)
+            else:
+                pipe_cfg.api_concurrency = int(api_concurrency)
+                result = run_render_chunks_async(chunks, td, pipe_cfg, ckpt=ckpt, on_chunk=encode_chunk)
+        except BaseException:
+            if encoder is not None:
+                encoder.abort()
+            raise
+
+        if result.arena is not None:
+            # unmapped once everything below has read the PCM (before the temp dir goes)
+            cleanup.callback(result.arena.close)
+
+        manifest["chunks"] = result.chunks
+
+        # store full original extracted text (for reading view)
+        storage.write_text(full_text_key, full_text)
+
+        encoded = False
+        # reservoir-free audio frames of audio.mp3, reused for the HLS segments
+        frames: Optional[list] = None
+        mp3_spec = PCM_SPEC
+        if encoder is not None:
+            say("Step 2/2: Finishing audio.mp3 (encoded while chunks were generated)")
+            try:
+                mp3_spec = encoder.spec or PCM_SPEC
+                encoder.close()
+                encoded = True
+            except Exception as e:
+                say(f"MP3 encode failed ({type(e).__name__}: {e})")
+        elif encode_mode == MP3_ENCODE_PARALLEL:
+            say("Step 2/2: Encoding audio.mp3 (parallel)")
+            try:
+                parts, mp3_spec = _pcm_source(result, len(chunks))
+                frames, n_samples = encode_mp3_frames(parts, mp3_spec, MP3_BITRATE_KBPS, mp3_workers)
+                write_mp3_frames(frames, n_samples, master_mp3, mp3_spec)
+                encoded = True
+            except Exception as e:
+                frames = None
+                say(f"Parallel MP3 encode failed ({type(e).__name__}: {e})")
+
+        if encoded:
+            mp3_bytes = master_mp3.read_bytes()
+            storage.write_bytes(audio_mp3_key, mp3_bytes, content_type="audio/mpeg")
+            manifest["audio"] = {
+                "format": "mp3",
+                "key": audio_mp3_key,
+                "mime": "audio/mpeg",
+                "bitrate_kbps": MP3_BITRATE_KBPS,
+                "bytes": len(mp3_bytes),
+            }
+            if frames is None and hls_seconds > 0:
+                # stream mode: the finished file's frames, minus its Info frame
+                frames = mp3_audio_frames(mp3_bytes)
+        else:
+            # fallback: store wav if ffmpeg not present (or the encode failed)
+            say("Stitching WAV chunks → audio.wav (no MP3 encoder)")
+            master_wav = td / "master.wav"
+            if result.pcm and len(result.pcm) == len(chunks):
+                write_wav_from_pcm(result.pcm, master_wav)
+            else:
+                stitch_wavs(result.wav_paths, master_wav)
+            wav_bytes = master_wav.read_bytes()
+            storage.write_bytes(audio_wav_key, wav_bytes, content_type="audio/wav")
+            manifest["audio"] = {"format": "wav", "key": audio_wav_key, "mime": "audio/wav", "bytes": len(wav_bytes)}
+
+        ladder = _audio_renditions() if ffmpeg_available() else []
+        if ladder:
+            say("Encoding " + ", ".join(f"{fmt} {kbps} kbps" for fmt, kbps in ladder))
+            try:
+                parts, spec = _pcm_source(result, len(chunks))
+                extra = _encode_renditions(storage, item_prefix, parts, spec, ladder, td)
+            except Exception:
+                extra = []
+            # smallest first; the primary (MP3/WAV) is always last-resort playable
+            primary = {k: v for k, v in manifest["audio"].items() if k != "renditions"}
+            manifest["audio"]["renditions"] = sorted(extra, key=lambda r: r["bytes"]) + [primary]
+
+        if hls_seconds > 0 and frames:
+            say("Writing HLS segments")
+            try:
+                manifest["hls"] = _store_hls(storage, item_prefix, frames, hls_seconds, td, mp3_spec)
+            except Exception as e:
+                say(f"Couldn't write HLS segments ({type(e).__name__}: {e})")
+
+    # persist aligned segments + manifest
+    storage.write_json(segments_key, result.segments)
+    storage.write_json(manifest_key, manifest)
+
+    retention = _checkpoint_retention()
+    if retention != RETAIN_ALL:
+        # the item is complete: previews and Whisper output aren't needed again (see ChunkCheckpoints.adopt)
+        try:
+            ckpt.prune_media(retention)
+        except Exception as e:
+            say(f"Couldn't prune chunk checkpoints ({type(e).__name__}: {e})")
+
+    return {
+        "id": item_id,
+        "created_at": created_at,
+        "created_ts": created_ts,
+        "title": title,
+        "voice": voice,
+        "speed": float(speed),
+        "item_dir": item_prefix,
+    }
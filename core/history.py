@@ -0,0 +1,553 @@
+# core/history.py
+"""
+Item history (one record per generated item: id, title, voice, speed, created_at, item_dir).
+
+  LocalStorage -> SqliteHistoryStore: <data dir>/history.db, indexed by id and created_ts
+  B2Storage    -> LogHistoryStore:    one object per append under history/log/, folded into
+                                      history/snapshot.json every LOG_COMPACT_AFTER appends
+                                      (by conditional write, or under a lease where the
+                                      bucket has none)
+
+Both append in O(1) without rewriting anything, so concurrent generations can't drop each
+other's records, and both page newest-first by created_ts. The old single history.json
+is imported on first use.
+"""
+from __future__ import annotations
+
+import bisect
+import json
+import re
+import sqlite3
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, Optional
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+from core.storage import LocalStorage, Storage, update_json
+
+HISTORY_KEY = "history.json"  # legacy: whole history in one JSON list
+
+TZ = ZoneInfo("America/Los_Angeles")
+CREATED_AT_FORMAT = "%Y-%m-%d %I:%M %p"
+
+_WORD_RE = re.compile(r"\w+")
+# a query term like 2025-03 or 2025-03-14: a created_ts range, not the words "2025" and "03"
+_DATE_TERM_RE = re.compile(r"(\d{4})-(\d{1,2})(?:-(\d{1,2}))?")
+
+# (created_ts, id) of the last record on a page; pass it back to get the next (older) page
+Cursor = tuple[float, str]
+
+
+def now_pt_string() -> str:
+    dt = datetime.now(TZ)
+    return dt.strftime(CREATED_AT_FORMAT)
+
+
+def record_ts(record: dict) -> float:
+    """
+    Sort key of a record: created_ts, or parsed from created_at for records written before it existed.
+    """
+    ts = record.get("created_ts")
+    if ts is not None:
+        return float(ts)
+    try:
+        return datetime.strptime(str(record.get("created_at", "")), CREATED_AT_FORMAT).replace(tzinfo=TZ).timestamp()
+    except ValueError:
+        return 0.0
+
+
+class HistoryStore:
+    def append(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def get(self, item_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def page(self, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        """
+        Up to `limit` records, newest first, strictly older than `before`.
+        """
+        raise NotImplementedError
+
+    def count(self) -> int:
+        raise NotImplementedError
+
+    def latest_by_title(self, title: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def search(self, query: str, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        """
+        Like page(), restricted to records whose title/date contain every word of `query`
+        as a word prefix, and created in the month/day of any YYYY-MM[-DD] term
+        ("interv 2025-03" matches "Interview prep", created March 2025).
+        """
+        raise NotImplementedError
+
+    def all(self) -> list[dict]:
+        out: list[dict] = []
+        cursor: Optional[Cursor] = None
+        while True:
+            batch = self.page(500, cursor)
+            out.extend(batch)
+            if len(batch) < 500:
+                return out
+            cursor = (record_ts(batch[-1]), batch[-1]["id"])
+
+
+def query_tokens(text: str) -> list[str]:
+    return _WORD_RE.findall((text or "").lower())
+
+
+def _date_range(m: re.Match) -> Optional[tuple[float, float]]:
+    year, month, day = int(m.group(1)), int(m.group(2)), m.group(3)
+    try:
+        if day is None:
+            start = datetime(year, month, 1, tzinfo=TZ)
+            end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=TZ)
+        else:
+            start = datetime(year, month, int(day), tzinfo=TZ)
+            end = datetime.fromordinal(start.toordinal() + 1).replace(tzinfo=TZ)
+    except ValueError:
+        return None
+    return start.timestamp(), end.timestamp()
+
+
+def parse_query(text: str) -> tuple[list[str], Optional[tuple[float, float]]]:
+    """
+    (words, created_ts range [start, end)) of a search query. Date terms become the range
+    (intersected if there are several); everything else, including a malformed date, is words.
+    """
+    words: list[str] = []
+    span: Optional[tuple[float, float]] = None
+    for term in (text or "").split():
+        m = _DATE_TERM_RE.fullmatch(term)
+        r = _date_range(m) if m else None
+        if r is None:
+            words.extend(query_tokens(term))
+        else:
+            span = r if span is None else (max(span[0], r[0]), min(span[1], r[1]))
+    return words, span
+
+
+def record_day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, TZ).strftime("%Y-%m-%d") if ts else ""
+
+
+def search_text(record: dict) -> str:
+    """
+    What search words match against: the title and the ISO date (not the display time,
+    whose hour/minute would match "03" in any month).
+    """
+    return " ".join([str(record.get("title") or ""), record_day(record_ts(record))])
+
+
+def _legacy_records(storage: Storage) -> list[dict]:
+    try:
+        items = storage.read_json(HISTORY_KEY, [])
+    except ValueError:
+        return []
+    return [x for x in items if isinstance(x, dict) and x.get("id")]
+
+
+# ----------------------------
+# SQLite (LocalStorage)
+# ----------------------------
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id         TEXT PRIMARY KEY,
+    created_ts REAL NOT NULL,
+    title      TEXT NOT NULL DEFAULT '',
+    record     TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS history_created ON history (created_ts DESC, id);
+CREATE INDEX IF NOT EXISTS history_title ON history (title, created_ts DESC);
+CREATE TABLE IF NOT EXISTS history_meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+# full-text index over search_text(record), kept in step with `history` by append()
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS history_fts USING fts5(id UNINDEXED, body, tokenize = 'unicode61');
+"""
+# history_meta key marking the index as built; renamed whenever search_text() changes, to rebuild it
+_FTS_BUILT = "fts_built_v2"
+
+
+class SqliteHistoryStore(HistoryStore):
+    def __init__(self, storage: LocalStorage) -> None:
+        self.db_path = storage.root / "history.db"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(_SCHEMA)
+            try:
+                c.executescript(_FTS_SCHEMA)
+                self.fts = True
+            except sqlite3.OperationalError:
+                # SQLite built without FTS5: search() falls back to scanning titles
+                self.fts = False
+            c.execute("BEGIN IMMEDIATE")
+            done = c.execute("SELECT 1 FROM history_meta WHERE key = 'legacy_imported'").fetchone()
+            if done is None:
+                for r in _legacy_records(storage):
+                    self._insert(c, r, replace=False)
+                c.execute("INSERT INTO history_meta (key, value) VALUES ('legacy_imported', ?)", (str(time.time()),))
+            if self.fts and c.execute("SELECT 1 FROM history_meta WHERE key = ?", (_FTS_BUILT,)).fetchone() is None:
+                # history.db from before the search index (or before its current search_text)
+                c.execute("DELETE FROM history_fts")
+                c.executemany(
+                    "INSERT INTO history_fts (id, body) VALUES (?, ?)",
+                    [(r["id"], search_text(json.loads(r["record"]))) for r in c.execute("SELECT id, record FROM history")],
+                )
+                c.execute("INSERT INTO history_meta (key, value) VALUES (?, ?)", (_FTS_BUILT, str(time.time())))
+            c.execute("COMMIT")
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        c = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        c.row_factory = sqlite3.Row
+        try:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            yield c
+        finally:
+            c.close()
+
+    @staticmethod
+    def _row(record: dict) -> tuple[str, float, str, str]:  # (id, created_ts, title, record)
+        return (str(record["id"]), record_ts(record), str(record.get("title") or ""), json.dumps(record))
+
+    def _insert(self, c: sqlite3.Connection, record: dict, replace: bool = True) -> None:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        cur = c.execute(f"{verb} INTO history (id, created_ts, title, record) VALUES (?, ?, ?, ?)", self._row(record))
+        if self.fts and cur.rowcount:
+            c.execute("DELETE FROM history_fts WHERE id = ?", (str(record["id"]),))
+            c.execute("INSERT INTO history_fts (id, body) VALUES (?, ?)", (str(record["id"]), search_text(record)))
+
+    def append(self, record: dict) -> None:
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            self._insert(c, record)
+            c.execute("COMMIT")
+
+    def get(self, item_id: str) -> Optional[dict]:
+        with self._conn() as c:
+            r = c.execute("SELECT record FROM history WHERE id = ?", (item_id,)).fetchone()
+        return json.loads(r["record"]) if r else None
+
+    def page(self, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        with self._conn() as c:
+            if before is None:
+                rows = c.execute(
+                    "SELECT record FROM history ORDER BY created_ts DESC, id LIMIT ?", (int(limit),)
+                ).fetchall()
+            else:
+                ts, item_id = float(before[0]), str(before[1])
+                rows = c.execute(
+                    "SELECT record FROM history WHERE created_ts < ? OR (created_ts = ? AND id > ?) "
+                    "ORDER BY created_ts DESC, id LIMIT ?",
+                    (ts, ts, item_id, int(limit)),
+                ).fetchall()
+        return [json.loads(r["record"]) for r in rows]
+
+    def count(self) -> int:
+        with self._conn() as c:
+            return int(c.execute("SELECT COUNT(*) FROM history").fetchone()[0])
+
+    def latest_by_title(self, title: str) -> Optional[dict]:
+        with self._conn() as c:
+            r = c.execute(
+                "SELECT record FROM history WHERE title = ? ORDER BY created_ts DESC LIMIT 1", (title,)
+            ).fetchone()
+        return json.loads(r["record"]) if r else None
+
+    def search(self, query: str, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        words, span = parse_query(query)
+        if not words and span is None:
+            return self.page(limit, before)
+        ts, item_id = (float(before[0]), str(before[1])) if before is not None else (float("inf"), "")
+        where = ["(h.created_ts < ? OR (h.created_ts = ? AND h.id > ?))"]
+        args: list = [ts, ts, item_id]
+        if span is not None:
+            where.append("h.created_ts >= ? AND h.created_ts < ?")
+            args += [span[0], span[1]]
+        source = "history h"
+        if words and self.fts:
+            source = "history_fts f JOIN history h ON h.id = f.id"
+            where.append("history_fts MATCH ?")
+            args.append(" ".join(f'"{w}"*' for w in words))
+        elif words:
+            # same text the index would hold: title + ISO date (not voice, item_dir, ...)
+            for w in words:
+                where.append("(lower(h.title) || ' ' || history_day(h.created_ts)) LIKE ?")
+                args.append(f"%{w}%")
+        sql = f"SELECT h.record FROM {source} WHERE {' AND '.join(where)} ORDER BY h.created_ts DESC, h.id LIMIT ?"
+        with self._conn() as c:
+            c.create_function("history_day", 1, record_day, deterministic=True)
+            rows = c.execute(sql, (*args, int(limit))).fetchall()
+        return [json.loads(r["record"]) for r in rows]
+
+
+# ----------------------------
+# Append-only log (object storage)
+# ----------------------------
+LOG_PREFIX = "history/log"
+SNAPSHOT_KEY = "history/snapshot.json"
+# fold the log into the snapshot once it has this many entries
+LOG_COMPACT_AFTER = 100
+# Without conditional writes, one compactor at a time: it writes LEASE_KEY, waits
+# LEASE_SETTLE_SECONDS and only compacts if the lease is still its own (a racing writer
+# would have overwritten it by then). The lease lapses after LEASE_SECONDS.
+LEASE_KEY = "history/compact-lease.json"
+LEASE_SECONDS = 120.0
+LEASE_SETTLE_SECONDS = 2.0
+# warn (once per store) when the log grows past this: every cold refresh reads all of it
+LOG_WARN_AFTER = 1000
+
+
+class LogHistoryStore(HistoryStore):
+    """
+    Each append is a new object history/log/<ms>-<id>.json (never overwritten, so
+    concurrent writers can't lose each other's records). Readers merge the snapshot
+    with the log. Both are cached in memory and refreshed with one stat of the snapshot
+    plus one listing of the (short) log, so a refresh doesn't grow with history size.
+    """
+
+    def __init__(
+        self, storage: Storage, compact_after: int = LOG_COMPACT_AFTER, lease_settle: float = LEASE_SETTLE_SECONDS
+    ) -> None:
+        self.storage = storage
+        self.compact_after = int(compact_after)
+        self.lease_settle = float(lease_settle)
+        self._warned = False
+        self._lock = threading.Lock()
+        self._snapshot_etag: Optional[str] = None
+        self._snapshot: dict[str, dict] = {}
+        self._log: dict[str, dict] = {}  # log key -> record
+        # log key -> (size, mtime, etag) when read: a retried job re-appends the same key
+        self._log_sig: dict[str, tuple[int, float, str]] = {}
+        self._by_id: dict[str, dict] = {}
+        self._order: list[tuple[float, str]] = []  # (-created_ts, id) ascending = newest first
+        self._words: dict[str, set[str]] = {}  # search word -> ids
+        self._vocab: list[str] = []  # sorted words, for prefix lookups
+
+    def _log_key(self, record: dict) -> str:
+        return f"{LOG_PREFIX}/{int(record_ts(record) * 1000):013d}-{record['id']}.json"
+
+    def append(self, record: dict) -> None:
+        record = dict(record)
+        record.setdefault("created_ts", record_ts(record))
+        self.storage.write_json(self._log_key(record), record)
+        try:
+            self.refresh()
+            if len(self._log) >= self.compact_after:
+                if self.storage.conditional_writes_supported():
+                    self.compact()
+                else:
+                    # racing compactions could overwrite each other's snapshot and delete the
+                    # log entries it held: only the lease holder compacts
+                    lease = self._take_lease()
+                    if lease is not None:
+                        try:
+                            self.compact()
+                        finally:
+                            self._drop_lease(lease)
+        except Exception:
+            # the record is durable; compaction just runs on a later append
+            pass
+        if len(self._log) >= LOG_WARN_AFTER and not self._warned:
+            self._warned = True
+            warnings.warn(
+                f"History log has {len(self._log)} uncompacted entries (compaction keeps failing or "
+                f"{LEASE_KEY} is stuck); every cold history read lists and reads all of them.",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    def _take_lease(self) -> Optional[str]:
+        cur = self.storage.read_json(LEASE_KEY, None)
+        if isinstance(cur, dict) and float(cur.get("expires", 0)) > time.time():
+            return None
+        token = uuid4().hex
+        self.storage.write_json(LEASE_KEY, {"owner": token, "expires": time.time() + LEASE_SECONDS})
+        time.sleep(self.lease_settle)
+        cur = self.storage.read_json(LEASE_KEY, None)
+        return token if isinstance(cur, dict) and cur.get("owner") == token else None
+
+    def _drop_lease(self, token: str) -> None:
+        cur = self.storage.read_json(LEASE_KEY, None)
+        if isinstance(cur, dict) and cur.get("owner") == token:
+            self.storage.delete(LEASE_KEY)
+
+    def _snapshot_records(self, snapshot: Optional[dict]) -> dict[str, dict]:
+        recs = snapshot.get("records", []) if snapshot is not None else _legacy_records(self.storage)
+        return {str(r["id"]): r for r in recs if isinstance(r, dict) and r.get("id")}
+
+    def _read_snapshot(self) -> tuple[dict[str, dict], str]:
+        # content and etag from the same read, so a concurrent compaction can't pair them wrongly
+        cur = self.storage.read_with_etag(SNAPSHOT_KEY)
+        if cur is None:
+            return self._snapshot_records(None), ""
+        return self._snapshot_records(json.loads(cur[0].decode("utf-8"))), cur[1]
+
+    def refresh(self) -> None:
+        info = self.storage.stat(SNAPSHOT_KEY)
+        etag = info.etag if info is not None else ""
+        log_sigs = {
+            o.key: (o.size, o.mtime, o.etag) for o in self.storage.list_objects(LOG_PREFIX) if o.key.endswith(".json")
+        }
+
+        with self._lock:
+            changed = False
+            if etag != self._snapshot_etag:
+                self._snapshot, self._snapshot_etag = self._read_snapshot()
+                changed = True
+            for k in list(self._log):
+                if k not in log_sigs:
+                    del self._log[k]
+                    self._log_sig.pop(k, None)
+                    changed = True
+            for k in sorted(k for k, sig in log_sigs.items() if self._log_sig.get(k) != sig):
+                try:
+                    self._log[k] = self.storage.read_json(k, None)
+                except Exception:
+                    continue
+                self._log_sig[k] = log_sigs[k]
+                changed = True
+            if changed:
+                by_id = dict(self._snapshot)
+                for k in sorted(self._log):
+                    r = self._log[k]
+                    if isinstance(r, dict) and r.get("id"):
+                        by_id[str(r["id"])] = r
+                self._by_id = by_id
+                self._order = sorted(_order_key(r) for r in by_id.values())
+                self._words = {}
+                for r in by_id.values():
+                    for w in set(query_tokens(search_text(r))):
+                        self._words.setdefault(w, set()).add(str(r["id"]))
+                self._vocab = sorted(self._words)
+
+    def compact(self) -> int:
+        """
+        Folds the log into the snapshot, then deletes the folded log objects.
+        Returns how many log entries were folded. Concurrent compactions are only safe
+        where storage.conditional_writes_supported(); otherwise append() compacts only
+        under the compaction lease (LEASE_KEY).
+        """
+        self.refresh()
+        with self._lock:
+            folded = dict(self._log)
+        if not folded:
+            return 0
+
+        def fold(snapshot: Optional[dict]) -> dict:
+            # merged into the snapshot as it is now, not as we last saw it: another compactor
+            # may have folded (and deleted) log entries we never read
+            by_id = self._snapshot_records(snapshot)
+            for k in sorted(folded):
+                r = folded[k]
+                if isinstance(r, dict) and r.get("id"):
+                    by_id[str(r["id"])] = r
+            return {"compacted_at": time.time(), "records": sorted(by_id.values(), key=_order_key)}
+
+        # conditional write (If-Match on the snapshot etag), re-folded on conflict;
+        # the log is only deleted once its records are in the snapshot
+        update_json(self.storage, SNAPSHOT_KEY, fold)
+        for k in folded:
+            try:
+                self.storage.delete(k)
+            except Exception:
+                pass
+        self.refresh()
+        return len(folded)
+
+    def get(self, item_id: str) -> Optional[dict]:
+        self.refresh()
+        return self._by_id.get(item_id)
+
+    def page(self, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        self.refresh()
+        with self._lock:
+            order, by_id = self._order, self._by_id
+        i = 0 if before is None else bisect.bisect_right(order, (-float(before[0]), str(before[1])))
+        return [by_id[item_id] for _, item_id in order[i : i + int(limit)]]
+
+    def count(self) -> int:
+        self.refresh()
+        return len(self._by_id)
+
+    def latest_by_title(self, title: str) -> Optional[dict]:
+        self.refresh()
+        with self._lock:
+            order, by_id = self._order, self._by_id
+        for _, item_id in order:
+            r = by_id[item_id]
+            if r.get("title") == title:
+                return r
+        return None
+
+    def search(self, query: str, limit: int = 50, before: Optional[Cursor] = None) -> list[dict]:
+        words, span = parse_query(query)
+        if not words and span is None:
+            return self.page(limit, before)
+        self.refresh()
+        with self._lock:
+            by_id, index, vocab = self._by_id, self._words, self._vocab
+        hits: Optional[set[str]] = None if words else set(by_id)
+        for w in words:
+            ids: set[str] = set()
+            i = bisect.bisect_left(vocab, w)
+            while i < len(vocab) and vocab[i].startswith(w):
+                ids |= index[vocab[i]]
+                i += 1
+            hits = ids if hits is None else hits & ids
+            if not hits:
+                return []
+        if span is not None:
+            hits = {x for x in hits if span[0] <= record_ts(by_id[x]) < span[1]}
+        order = sorted(_order_key(by_id[x]) for x in hits)
+        i = 0 if before is None else bisect.bisect_right(order, (-float(before[0]), str(before[1])))
+        return [by_id[item_id] for _, item_id in order[i : i + int(limit)]]
+
+
+def _order_key(record: dict) -> tuple[float, str]:
+    # same order as the SQLite store: created_ts DESC, id
+    return (-record_ts(record), str(record["id"]))
+
+
+# ----------------------------
+# Selection + module-level helpers
+# ----------------------------
+_stores: dict[int, tuple[Storage, HistoryStore]] = {}
+_stores_lock = threading.Lock()
+
+
+def history_store(storage: Storage) -> HistoryStore:
+    """
+    The history store for `storage`: one per storage object per process, since the log
+    store keeps its merged index in memory between calls.
+    """
+    with _stores_lock:
+        hit = _stores.get(id(storage))
+        if hit is not None and hit[0] is storage:
+            return hit[1]
+        store: HistoryStore = SqliteHistoryStore(storage) if isinstance(storage, LocalStorage) else LogHistoryStore(storage)
+        _stores[id(storage)] = (storage, store)
+        return store
+
+
+def load_history(storage: Storage) -> list[dict]:
+    """
+    Every record, newest first. Prefer history_store(storage).page() where a page will do.
+    """
+    return history_store(storage).all()
+
+
+def append_history(storage: Storage, record: dict) -> None:
+    history_store(storage).append(record)
@@ -0,0 +1,267 @@
+# core/jobs.py
+from __future__ import annotations
+
+import json
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+# job.status values
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# a RUNNING job whose worker hasn't heartbeated for this long is handed out again
+STALE_AFTER_SECONDS = 120.0
+# claims per job: a job whose worker keeps dying (OOM, crash mid-chunk) is failed, not re-run forever
+MAX_ATTEMPTS = 3
+# DONE rows are only needed until the session that queued them has noticed
+DONE_RETENTION_SECONDS = 24 * 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id             TEXT PRIMARY KEY,
+    item_id        TEXT NOT NULL,
+    status         TEXT NOT NULL,
+    payload        TEXT NOT NULL,
+    created_ts     REAL NOT NULL,
+    updated_ts     REAL NOT NULL,
+    heartbeat_ts   REAL,
+    worker         TEXT,
+    owner          TEXT,
+    attempts       INTEGER NOT NULL DEFAULT 0,
+    progress_done  INTEGER NOT NULL DEFAULT 0,
+    progress_total INTEGER NOT NULL DEFAULT 0,
+    message        TEXT NOT NULL DEFAULT '',
+    error          TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created_ts);
+"""
+# columns added after the first release: (name, definition) for ALTER TABLE on older files
+_ADDED_COLUMNS = [("owner", "TEXT")]
+
+
+@dataclass
+class Job:
+    id: str
+    item_id: str
+    status: str
+    owner: Optional[str]
+    payload: dict
+    created_ts: float
+    updated_ts: float
+    attempts: int
+    progress_done: int
+    progress_total: int
+    message: str
+    error: Optional[str]
+
+    @property
+    def title(self) -> str:
+        return str(self.payload.get("title") or "")
+
+    @property
+    def fraction(self) -> float:
+        if self.progress_total <= 0:
+            return 0.0
+        return min(1.0, self.progress_done / float(self.progress_total))
+
+
+def _row_to_job(r: sqlite3.Row) -> Job:
+    return Job(
+        id=r["id"],
+        item_id=r["item_id"],
+        status=r["status"],
+        owner=r["owner"],
+        payload=json.loads(r["payload"]),
+        created_ts=float(r["created_ts"]),
+        updated_ts=float(r["updated_ts"]),
+        attempts=int(r["attempts"]),
+        progress_done=int(r["progress_done"]),
+        progress_total=int(r["progress_total"]),
+        message=r["message"] or "",
+        error=r["error"],
+    )
+
+
+class JobQueue:
+    """
+    Durable generation queue in a SQLite file.
+    The UI enqueues + polls; worker processes (core.worker) claim and run jobs.
+    Safe across processes: claims happen inside BEGIN IMMEDIATE transactions, and a
+    worker's updates only land while it still holds the claim (see claim/complete).
+    Jobs carry an optional owner (the UI session that queued them) to scope listings.
+    """
+
+    def __init__(self, db_path: Path, max_attempts: int = MAX_ATTEMPTS) -> None:
+        self.db_path = Path(db_path)
+        self.max_attempts = max(1, int(max_attempts))
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.executescript(_SCHEMA)
+            have = {r["name"] for r in c.execute("PRAGMA table_info(jobs)")}
+            for name, decl in _ADDED_COLUMNS:
+                if name not in have:
+                    c.execute(f"ALTER TABLE jobs ADD COLUMN {name} {decl}")
+            c.execute("CREATE INDEX IF NOT EXISTS jobs_owner_status ON jobs (owner, status, created_ts)")
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        # short-lived connections: cheap for SQLite, and safe across threads/processes
+        c = sqlite3.connect(str(self.db_path), timeout=30.0, isolation_level=None)
+        c.row_factory = sqlite3.Row
+        try:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            yield c
+        finally:
+            c.close()
+
+    def enqueue(self, payload: dict[str, Any], item_id: Optional[str] = None, owner: Optional[str] = None) -> Job:
+        now = time.time()
+        job_id = uuid.uuid4().hex
+        item_id = item_id or uuid.uuid4().hex
+        with self._conn() as c:
+            c.execute(
+                "INSERT INTO jobs (id, item_id, status, payload, created_ts, updated_ts, owner) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, item_id, QUEUED, json.dumps(payload), now, now, owner),
+            )
+        job = self.get(job_id)
+        assert job is not None
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._conn() as c:
+            r = c.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return _row_to_job(r) if r else None
+
+    def claim(self, worker: str) -> Optional[Job]:
+        """
+        Atomically take the oldest queued (or stale running) job.
+        Stale jobs that already used max_attempts claims are failed instead, keeping their
+        last error/progress message.
+        """
+        now = time.time()
+        stale_before = now - STALE_AFTER_SECONDS
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute(
+                    "UPDATE jobs SET status = ?, message = 'Failed', updated_ts = ?, "
+                    "error = COALESCE(error, 'Worker stopped responding ' || attempts || ' times; last status: ' || "
+                    "COALESCE(NULLIF(message, ''), 'none')) "
+                    "WHERE status = ? AND COALESCE(heartbeat_ts, 0) < ? AND attempts >= ?",
+                    (FAILED, now, RUNNING, stale_before, self.max_attempts),
+                )
+                r = c.execute(
+                    "SELECT * FROM jobs WHERE status = ? OR (status = ? AND COALESCE(heartbeat_ts, 0) < ?) "
+                    "ORDER BY created_ts LIMIT 1",
+                    (QUEUED, RUNNING, stale_before),
+                ).fetchone()
+                if r is None:
+                    c.execute("COMMIT")
+                    return None
+                c.execute(
+                    "UPDATE jobs SET status = ?, worker = ?, attempts = attempts + 1, "
+                    "heartbeat_ts = ?, updated_ts = ?, error = NULL WHERE id = ?",
+                    (RUNNING, worker, now, now, r["id"]),
+                )
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+        return self.get(r["id"])
+
+    # The worker-side updates below only apply while `worker` still holds the claim: once a
+    # stale job has been reclaimed, the slow original worker can't overwrite the new run.
+
+    def heartbeat(self, job_id: str, worker: str) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE jobs SET heartbeat_ts = ? WHERE id = ? AND status = ? AND worker = ?",
+                (now, job_id, RUNNING, worker),
+            )
+        return cur.rowcount > 0
+
+    def progress(
+        self, job_id: str, worker: str, message: str, done: Optional[int] = None, total: Optional[int] = None
+    ) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE jobs SET message = ?, progress_done = COALESCE(?, progress_done), "
+                "progress_total = COALESCE(?, progress_total), heartbeat_ts = ?, updated_ts = ? "
+                "WHERE id = ? AND status = ? AND worker = ?",
+                (message, done, total, now, now, job_id, RUNNING, worker),
+            )
+        return cur.rowcount > 0
+
+    def complete(self, job_id: str, worker: str) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE jobs SET status = ?, message = 'Done', progress_done = progress_total, updated_ts = ? "
+                "WHERE id = ? AND status = ? AND worker = ?",
+                (DONE, now, job_id, RUNNING, worker),
+            )
+        return cur.rowcount > 0
+
+    def fail(self, job_id: str, worker: str, error: str) -> bool:
+        now = time.time()
+        with self._conn() as c:
+            cur = c.execute(
+                "UPDATE jobs SET status = ?, error = ?, message = 'Failed', updated_ts = ? "
+                "WHERE id = ? AND status = ? AND worker = ?",
+                (FAILED, error[:4000], now, job_id, RUNNING, worker),
+            )
+        return cur.rowcount > 0
+
+    def retry(self, job_id: str, owner: Optional[str] = None) -> None:
+        now = time.time()
+        with self._conn() as c:
+            c.execute(
+                "UPDATE jobs SET status = ?, error = NULL, message = 'Queued for retry', attempts = 0, updated_ts = ? "
+                "WHERE id = ? AND status = ? AND (? IS NULL OR owner = ?)",
+                (QUEUED, now, job_id, FAILED, owner, owner),
+            )
+
+    def dismiss(self, job_id: str, owner: Optional[str] = None) -> None:
+        with self._conn() as c:
+            c.execute(
+                "DELETE FROM jobs WHERE id = ? AND status IN (?, ?) AND (? IS NULL OR owner = ?)",
+                (job_id, DONE, FAILED, owner, owner),
+            )
+
+    def prune(self, older_than_seconds: float = DONE_RETENTION_SECONDS) -> int:
+        """
+        Deletes DONE jobs last updated more than older_than_seconds ago. Returns how many.
+        """
+        with self._conn() as c:
+            cur = c.execute(
+                "DELETE FROM jobs WHERE status = ? AND updated_ts < ?", (DONE, time.time() - float(older_than_seconds))
+            )
+        return cur.rowcount
+
+    def list_jobs(
+        self, statuses: Optional[tuple[str, ...]] = None, limit: int = 50, owner: Optional[str] = None
+    ) -> list[Job]:
+        """
+        Newest first; owner=None lists every owner's jobs (CLI / admin use).
+        """
+        where, args = [], []
+        if statuses:
+            where.append(f"status IN ({','.join('?' for _ in statuses)})")
+            args.extend(statuses)
+        if owner is not None:
+            where.append("owner = ?")
+            args.append(owner)
+        sql = "SELECT * FROM jobs" + (f" WHERE {' AND '.join(where)}" if where else "")
+        with self._conn() as c:
+            rows = c.execute(sql + " ORDER BY created_ts DESC LIMIT ?", (*args, int(limit))).fetchall()
+        return [_row_to_job(r) for r in rows]
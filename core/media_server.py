@@ -0,0 +1,264 @@
+# core/media_server.py
+"""
+Tiny HTTP server for item media (HLS playlists + segments, audio files), so the
+player can fetch audio lazily by URL instead of getting it base64-embedded in the page.
+Objects are streamed from storage with Range (206) support and ETags; long cache
+lifetimes only for versioned URLs (see cache_control_for).
+
+  python -m core.media_server --port 8502      # standalone
+  start_media_server(storage, port=8502)       # in-process (background thread)
+
+Only GET/HEAD of audio and playlist objects (SERVED_SUFFIXES) under items/ are served,
+read through the Storage backend; texts, segments and manifests are not. Binds to
+127.0.0.1 unless told otherwise (put it behind the app's reverse proxy, or pass --host).
+GET /healthz answers with HEALTH_HEADER set, for media_server_healthy().
+"""
+from __future__ import annotations
+
+import argparse
+import threading
+import urllib.request
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional, Union
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from core.storage import ObjectInfo, Storage, get_storage
+
+SERVED_PREFIX = "items/"
+DEFAULT_MEDIA_HOST = "127.0.0.1"
+DEFAULT_MEDIA_PORT = 8502
+HEALTH_PATH = "/healthz"
+HEALTH_HEADER = "X-Peachy-Media"
+
+_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".mp3": "audio/mpeg",
+    ".opus": "audio/ogg",
+    ".m4a": "audio/mp4",
+    ".wav": "audio/wav",
+}
+SERVED_SUFFIXES = frozenset(_CONTENT_TYPES)
+
+
+# Item media is rewritten in place when a failed job is retried (same item id, same keys),
+# so a bare key is revalidated (cheap 304s via ETag). The app versions the URLs it hands out
+# (?v=<manifest ETag>; generate_item writes the manifest last, so a rewrite changes it):
+# audio behind a versioned URL never changes and browsers may keep it for good. Only while
+# v is the item's current version, though: a stale or made-up v is revalidated like a bare key.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+VERSION_PARAM = "v"
+_IMMUTABLE_SUFFIXES = {".mp3", ".opus", ".m4a", ".wav"}
+
+
+def content_type_for(key: str) -> str:
+    return _CONTENT_TYPES.get(Path(key).suffix.lower(), "application/octet-stream")
+
+
+def cache_control_for(key: str, versioned: bool = False) -> str:
+    if versioned and Path(key).suffix.lower() in _IMMUTABLE_SUFFIXES:
+        return IMMUTABLE_CACHE_CONTROL
+    return REVALIDATE_CACHE_CONTROL
+
+
+def _etags(header: Optional[str]) -> set[str]:
+    if not header:
+        return set()
+    if header.strip() == "*":
+        return {"*"}
+    # weak validators match too for If-None-Match
+    return {t.strip().removeprefix("W/") for t in header.split(",") if t.strip()}
+
+
+def parse_range(header: str, size: int) -> Union[tuple[int, int], str, None]:
+    """
+    (start, end) byte span (end exclusive) for a single-range "bytes=..." header;
+    None to ignore the header (malformed or multi-range: serve the whole object),
+    "unsatisfiable" for a range that starts past the end.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash:
+        return None
+    try:
+        if first == "":
+            n = int(last)  # suffix range: the last n bytes
+            if n <= 0:
+                return "unsatisfiable"
+            return max(0, size - n), size
+        start = int(first)
+        end = int(last) + 1 if last else size
+    except ValueError:
+        return None
+    if start >= size:
+        return "unsatisfiable"
+    if end <= start:
+        return None
+    return start, min(end, size)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    storage: Storage  # set on the per-server subclass
+
+    def _key(self) -> Optional[str]:
+        key = unquote(urlsplit(self.path).path).lstrip("/")
+        if not key.startswith(SERVED_PREFIX) or ".." in key.split("/"):
+            return None
+        if Path(key).suffix.lower() not in SERVED_SUFFIXES:
+            return None
+        return key
+
+    def _is_current_version(self, key: str) -> bool:
+        v = parse_qs(urlsplit(self.path).query).get(VERSION_PARAM)
+        if not v:
+            return False
+        item_prefix = "/".join(key.split("/", 2)[:2])
+        try:
+            info = self.storage.stat(f"{item_prefix}/manifest.json")
+        except Exception:
+            return False
+        return info is not None and bool(info.etag) and v[0] == info.etag
+
+    def _cors(self) -> None:
+        # the player runs in the Streamlit page, which is another origin (port)
+        self.send_header("Access-Control-Allow-Origin", "*")
+
+    def _serve(self, body: bool) -> None:
+        key = self._key()
+        info = None
+        if key is not None:
+            try:
+                info = self.storage.stat(key)
+            except Exception:
+                info = None
+        if info is None:
+            self.send_error(404)
+            return
+
+        if info.etag and info.etag in _etags(self.headers.get("If-None-Match")):
+            self.send_response(304)
+            self._cache_headers(key, info)
+            self.end_headers()
+            return
+
+        size = info.size
+        rng = None
+        if_range = self.headers.get("If-Range")
+        if self.headers.get("Range") and (not if_range or if_range == info.etag):
+            rng = parse_range(self.headers["Range"], size)
+            if rng == "unsatisfiable":
+                self.send_response(416)
+                self._cors()
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+        if rng is None:
+            start, end = 0, size
+            self.send_response(200)
+        else:
+            start, end = rng
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end - 1}/{size}")
+        self._cache_headers(key, info)
+        self.send_header("Content-Type", content_type_for(key))
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if not body or end <= start:
+            return
+
+        # streamed block by block: memory per request doesn't grow with the file
+        try:
+            for block in self.storage.iter_range(key, start, end):
+                self.wfile.write(block)
+        except (BrokenPipeError, ConnectionResetError):
+            # players drop connections all the time (seeks, next range)
+            pass
+
+    def _cache_headers(self, key: str, info: ObjectInfo) -> None:
+        self._cors()
+        self.send_header("Accept-Ranges", "bytes")
+        if info.etag:
+            self.send_header("ETag", info.etag)
+        if info.mtime:
+            self.send_header("Last-Modified", formatdate(info.mtime, usegmt=True))
+        self.send_header("Cache-Control", cache_control_for(key, self._is_current_version(key)))
+
+    def do_GET(self) -> None:
+        if urlsplit(self.path).path == HEALTH_PATH:
+            self.send_response(200)
+            self.send_header(HEALTH_HEADER, "1")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self._serve(body=True)
+
+    def do_HEAD(self) -> None:
+        self._serve(body=False)
+
+    def do_OPTIONS(self) -> None:
+        self.send_response(204)
+        self._cors()
+        self.send_header("Access-Control-Allow-Methods", "GET, HEAD, OPTIONS")
+        self.send_header("Access-Control-Allow-Headers", "*")
+        self.end_headers()
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def make_media_server(
+    storage: Storage, host: str = DEFAULT_MEDIA_HOST, port: int = DEFAULT_MEDIA_PORT
+) -> ThreadingHTTPServer:
+    handler = type("MediaHandler", (_Handler,), {"storage": storage})
+    server = ThreadingHTTPServer((host, int(port)), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_media_server(
+    storage: Storage, host: str = DEFAULT_MEDIA_HOST, port: int = DEFAULT_MEDIA_PORT
+) -> ThreadingHTTPServer:
+    """
+    Serves `storage` from a daemon thread; returns the server (server.server_port is the bound port).
+    """
+    server = make_media_server(storage, host, port)
+    threading.Thread(target=server.serve_forever, name="peachy-media", daemon=True).start()
+    return server
+
+
+def media_server_healthy(base_url: str, timeout: float = 2.0) -> bool:
+    """
+    True if a media server answers at base_url (checked from this host, which is the best
+    a server can do; a URL only the browser can reach fails it, and the app embeds audio).
+    """
+    try:
+        with urllib.request.urlopen(base_url.rstrip("/") + HEALTH_PATH, timeout=timeout) as r:
+            return r.status == 200 and r.headers.get(HEALTH_HEADER) == "1"
+    except (OSError, ValueError):
+        return False
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.media_server", description="Serve Peachy item media over HTTP.")
+    ap.add_argument("--host", default=DEFAULT_MEDIA_HOST, help="bind address (0.0.0.0 to expose it directly)")
+    ap.add_argument("--port", type=int, default=DEFAULT_MEDIA_PORT)
+    ap.add_argument("--data-dir", default=None, help="LocalStorage root (default: ./data)")
+    args = ap.parse_args(argv)
+
+    server = make_media_server(get_storage(Path(args.data_dir) if args.data_dir else None), args.host, args.port)
+    print(f"serving item media on http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,35 @@
+# core/openai_client.py
+from __future__ import annotations
+
+import os
+from functools import lru_cache
+
+from openai import AsyncOpenAI, OpenAI
+
+from core.config import get_secret
+
+
+def _api_key() -> str:
+    return get_secret("OPENAI_KEY")
+
+
+@lru_cache(maxsize=1)
+def get_client() -> OpenAI:
+    """
+    Process-wide sync client (thread-safe, shares one connection pool).
+    Retries are done by core.retry, so the SDK's own are off.
+    """
+    return OpenAI(api_key=_api_key(), max_retries=0)
+
+
+if hasattr(os, "register_at_fork"):
+    # as for core.storage's S3 client: a forked child opens its own connections
+    os.register_at_fork(after_in_child=get_client.cache_clear)
+
+
+def new_async_client() -> AsyncOpenAI:
+    """
+    Async clients hold an event-loop-bound connection pool, so create one per
+    event loop (e.g. per asyncio.run) and close it when done.
+    """
+    return AsyncOpenAI(api_key=_api_key(), max_retries=0)
@@ -0,0 +1,713 @@
+# core/pipeline.py
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Optional
+
+from openai import AsyncOpenAI
+
+from core.openai_client import new_async_client
+from core.tts import tts_to_pcm, tts_to_pcm_async, tts_to_wav_file, tts_to_wav_file_async
+from core.stt import (
+    whisper_segments_verbose_json,
+    whisper_segments_verbose_json_async,
+    extract_segments,
+    merge_segments,
+)
+from core.audio_utils import (
+    PCM_SPEC,
+    PcmArena,
+    pcm_duration_seconds,
+    pcm_to_wav_bytes,
+    stitch_wavs,
+    wav_bytes_to_pcm,
+    wav_duration_seconds,
+    whole_frames,
+)
+from core.alignment import align_segments_to_text, AlignConfig
+from core.checkpoints import ChunkCheckpoints, chunk_fingerprint
+from core.chunking import split_sentences_with_offsets
+from core.vad import PauseConfig, pause_align, pcm_to_mono
+
+# How segment timings are obtained
+TIMING_WHISPER = "whisper"    # TTS per chunk, Whisper STT, fuzzy alignment
+TIMING_SENTENCE = "sentence"  # TTS per sentence; timings = measured WAV durations, no STT
+TIMING_PAUSE = "pause"        # TTS per chunk; local pause detection, Whisper only for unsure chunks
+TIMING_MODES = (TIMING_WHISPER, TIMING_SENTENCE, TIMING_PAUSE)
+
+# How chunk audio is held between TTS and the final encode
+AUDIO_WAV = "wav"  # one WAV file per chunk in work_dir
+AUDIO_PCM = "pcm"  # raw PCM in a memory-mapped PcmArena (whisper/pause timing)
+
+# rough speech rate, only used to size the PCM arena up front
+_PCM_CHARS_PER_SECOND = 14.0
+
+
+@dataclass
+class PipelineConfig:
+    voice: str = "nova"
+    speed: float = 1.0
+    # how many chunks may be in flight at once (TTS/STT/align overlap across chunks)
+    max_in_flight: int = 4
+    # async driver: max concurrent API calls (TTS + STT share one semaphore)
+    api_concurrency: int = 32
+    seg_max_seconds: float = 10.0
+    seg_max_chars: int = 520
+    align: AlignConfig = field(default_factory=AlignConfig)
+    timing: str = TIMING_WHISPER
+    # sentence timing: concurrent TTS requests per chunk (threaded pipeline)
+    sentence_workers: int = 8
+    # pause timing: detector settings + Whisper fallback threshold (pause.min_confidence)
+    pause: PauseConfig = field(default_factory=PauseConfig)
+    audio_format: str = AUDIO_WAV
+
+
+@dataclass
+class ChunkResult:
+    index: int
+    # None when the audio only lives in `pcm`
+    wav_path: Optional[Path]
+    duration: float
+    # chunk-local times + chunk-local orig spans (orig_char_*_local)
+    segments: list[dict]
+    # extra per-chunk manifest fields (e.g. which timing method was used)
+    meta: dict = field(default_factory=dict)
+    # AUDIO_PCM: this chunk's frames (PCM_SPEC) inside the pipeline's PcmArena
+    pcm: Optional[memoryview] = None
+
+
+@dataclass
+class PipelineResult:
+    wav_paths: list[Path]
+    segments: list[dict]
+    chunks: list[dict]
+    total_seconds: float
+    # AUDIO_PCM: per-chunk frames in order (views into `arena`, which keeps them mapped
+    # until the caller closes it)
+    pcm: list[memoryview] = field(default_factory=list)
+    arena: Optional[PcmArena] = None
+
+
+def _pcm_arena(chunks: list[dict], work_dir: Path, cfg: PipelineConfig) -> Optional[PcmArena]:
+    if cfg.audio_format != AUDIO_PCM or cfg.timing == TIMING_SENTENCE:
+        return None
+    ch, sw, fr = PCM_SPEC
+    chars = sum(len(c["text"]) for c in chunks)
+    est = chars / _PCM_CHARS_PER_SECOND / max(0.25, float(cfg.speed)) * ch * sw * fr
+    return PcmArena(work_dir, initial_bytes=int(est * 1.25) + 1)
+
+
+def _restore_pcm(ckpt: ChunkCheckpoints, index: int, fp: str, arena: PcmArena) -> Optional[memoryview]:
+    data = ckpt.load_wav_bytes(index, fp)
+    if data is None:
+        return None
+    frames, spec = wav_bytes_to_pcm(data)
+    if spec != PCM_SPEC:
+        raise ValueError(f"Checkpointed chunk {index} is {spec}, expected {PCM_SPEC}")
+    return arena.add(frames)
+
+
+def process_chunk(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    ckpt: Optional[ChunkCheckpoints] = None,
+    arena: Optional[PcmArena] = None,
+) -> ChunkResult:
+    """
+    TTS -> STT -> merge -> align for ONE chunk.
+    Everything returned is chunk-local; offsets are applied in order by the caller.
+    With checkpoints, each finished stage is saved and completed stages are skipped.
+    With an arena, the audio is fetched as raw PCM and kept there (no WAV file).
+    """
+    if cfg.timing == TIMING_SENTENCE:
+        return process_chunk_sentences(index, chunk, work_dir, cfg, ckpt)
+    if arena is not None:
+        return process_chunk_pcm(index, chunk, work_dir, cfg, arena, ckpt)
+
+    chunk_text = chunk["text"]
+    wav_path = work_dir / f"chunk_{index:04d}.wav"
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    have_wav = ckpt is not None and ckpt.restore_wav(index, fp, wav_path)
+    if have_wav:
+        done = ckpt.load_result(index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, wav_path, done)
+    else:
+        tts_to_wav_file(chunk_text, str(wav_path), voice=cfg.voice, speed=float(cfg.speed))
+        if ckpt is not None:
+            ckpt.save_wav(index, fp, wav_path)
+    dur = wav_duration_seconds(wav_path)
+
+    meta: dict = {}
+    if cfg.timing == TIMING_PAUSE:
+        res = pause_timing(index, wav_path, dur, chunk_text, cfg, ckpt, fp)
+        if res.segments:
+            return res
+        meta = res.meta
+
+    stt_verbose = ckpt.load_stt(index, fp) if ckpt is not None else None
+    if stt_verbose is None:
+        stt_verbose = whisper_segments_verbose_json(str(wav_path))
+        if ckpt is not None:
+            ckpt.save_stt(index, fp, stt_verbose)
+
+    segs = segments_from_stt(stt_verbose, chunk_text, cfg)
+    if ckpt is not None:
+        ckpt.save_result(index, fp, dur, segs, meta)
+
+    return ChunkResult(index=index, wav_path=wav_path, duration=dur, segments=segs, meta=meta)
+
+
+def _result_from_checkpoint(
+    index: int,
+    wav_path: Optional[Path],
+    done: dict,
+    pcm: Optional[memoryview] = None,
+) -> ChunkResult:
+    return ChunkResult(
+        index=index,
+        wav_path=wav_path,
+        duration=float(done["duration_seconds"]),
+        segments=done["segments"],
+        meta=done.get("meta") or {},
+        pcm=pcm,
+    )
+
+
+def process_chunk_pcm(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    arena: PcmArena,
+    ckpt: Optional[ChunkCheckpoints] = None,
+) -> ChunkResult:
+    """
+    process_chunk with raw PCM: the TTS response is read into memory and copied into
+    the arena (no file per chunk), duration comes from the byte count and STT / pause
+    detection get it from memory.
+    """
+    chunk_text = chunk["text"]
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    pcm = _restore_pcm(ckpt, index, fp, arena) if ckpt is not None else None
+    if pcm is not None:
+        done = ckpt.load_result(index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, None, done, pcm)
+    else:
+        pcm = arena.add(whole_frames(tts_to_pcm(chunk_text, voice=cfg.voice, speed=float(cfg.speed))))
+        if ckpt is not None:
+            ckpt.save_wav_bytes(index, fp, pcm_to_wav_bytes(pcm))
+    dur = pcm_duration_seconds(len(pcm))
+
+    meta: dict = {}
+    if cfg.timing == TIMING_PAUSE:
+        res = pause_timing(index, None, dur, chunk_text, cfg, ckpt, fp, pcm=pcm)
+        if res.segments:
+            return res
+        meta = res.meta
+
+    stt_verbose = ckpt.load_stt(index, fp) if ckpt is not None else None
+    if stt_verbose is None:
+        stt_verbose = whisper_segments_verbose_json(f"chunk_{index:04d}.wav", audio=pcm_to_wav_bytes(pcm))
+        if ckpt is not None:
+            ckpt.save_stt(index, fp, stt_verbose)
+
+    segs = segments_from_stt(stt_verbose, chunk_text, cfg)
+    if ckpt is not None:
+        ckpt.save_result(index, fp, dur, segs, meta)
+
+    return ChunkResult(index=index, wav_path=None, duration=dur, segments=segs, meta=meta, pcm=pcm)
+
+
+def pause_timing(
+    index: int,
+    wav_path: Optional[Path],
+    dur: float,
+    chunk_text: str,
+    cfg: PipelineConfig,
+    ckpt: Optional[ChunkCheckpoints],
+    fp: str,
+    pcm: Optional[memoryview] = None,
+) -> ChunkResult:
+    """
+    Local pause-detection timing for one chunk WAV (or its PCM_SPEC frames).
+    Confident -> finished ChunkResult (checkpointed). Unsure -> ChunkResult with no
+    segments and meta describing why, so the caller falls back to Whisper.
+    """
+    samples = None
+    if pcm is not None:
+        ch, sw, fr = PCM_SPEC
+        samples = (pcm_to_mono(pcm, ch, sw), fr)
+    segs, confidence = pause_align(wav_path, chunk_text, cfg.pause, samples=samples)
+    confidence = round(float(confidence), 3)
+
+    if segs and confidence >= cfg.pause.min_confidence:
+        segs = merge_timed_spans(segs, max_seconds=cfg.seg_max_seconds, max_chars=cfg.seg_max_chars)
+        meta = {"timing": TIMING_PAUSE, "timing_confidence": confidence}
+        if ckpt is not None:
+            ckpt.save_result(index, fp, dur, segs, meta)
+        return ChunkResult(index=index, wav_path=wav_path, duration=dur, segments=segs, meta=meta, pcm=pcm)
+
+    return ChunkResult(
+        index=index,
+        wav_path=wav_path,
+        duration=dur,
+        segments=[],
+        meta={"timing": TIMING_WHISPER, "pause_confidence": confidence},
+        pcm=pcm,
+    )
+
+
+def segments_from_stt(stt_verbose: dict, chunk_text: str, cfg: PipelineConfig) -> list[dict]:
+    segs = extract_segments(stt_verbose)
+
+    # merge for readability + better alignment anchors
+    segs = merge_segments(segs, max_seconds=cfg.seg_max_seconds, max_chars=cfg.seg_max_chars)
+
+    # align merged segments back to THIS chunk's original text slice
+    align_segments_to_text(chunk_text, segs, cfg=cfg.align)
+    return segs
+
+
+# ----------------------------
+# Sentence timing (no STT)
+# ----------------------------
+def sentence_segments(sentences: list[dict], durations: list[float]) -> list[dict]:
+    """
+    One segment per sentence: exact chunk-local char span, time = running sum of durations.
+    """
+    out: list[dict] = []
+    t = 0.0
+    for s, d in zip(sentences, durations):
+        out.append(
+            {
+                "start": t,
+                "end": t + float(d),
+                "text": s["text"],
+                "orig_char_start_local": int(s["start"]),
+                "orig_char_end_local": int(s["end"]),
+                "align_score": 100,
+            }
+        )
+        t += float(d)
+    return out
+
+
+def merge_timed_spans(segments: list[dict], max_seconds: float, max_chars: int) -> list[dict]:
+    """
+    Like merge_segments, but for segments that already carry local char spans:
+    merged segment spans from the first one's start to the last one's end.
+    """
+    merged: list[dict] = []
+    cur = None
+
+    for s in segments:
+        if cur is None:
+            cur = dict(s)
+            continue
+
+        candidate_text = (cur["text"] + " " + s["text"]).strip()
+        duration = float(s["end"]) - float(cur["start"])
+
+        if duration <= max_seconds and len(candidate_text) <= max_chars:
+            cur["end"] = s["end"]
+            cur["text"] = candidate_text
+            cur["orig_char_end_local"] = s["orig_char_end_local"]
+        else:
+            merged.append(cur)
+            cur = dict(s)
+
+    if cur is not None:
+        merged.append(cur)
+
+    return merged
+
+
+def _sentence_paths(index: int, work_dir: Path, n: int) -> list[Path]:
+    d = work_dir / f"chunk_{index:04d}_sentences"
+    d.mkdir(parents=True, exist_ok=True)
+    return [d / f"s_{k:04d}.wav" for k in range(n)]
+
+
+def _finish_sentence_chunk(
+    index: int,
+    sentences: list[dict],
+    sentence_wavs: list[Path],
+    wav_path: Path,
+    cfg: PipelineConfig,
+    ckpt: Optional[ChunkCheckpoints],
+    fp: str,
+) -> ChunkResult:
+    durations = [wav_duration_seconds(p) for p in sentence_wavs]
+    stitch_wavs(sentence_wavs, wav_path)
+    dur = wav_duration_seconds(wav_path)
+
+    segs = sentence_segments(sentences, durations)
+    segs = merge_timed_spans(segs, max_seconds=cfg.seg_max_seconds, max_chars=cfg.seg_max_chars)
+
+    meta = {"timing": TIMING_SENTENCE}
+    if ckpt is not None:
+        ckpt.save_wav(index, fp, wav_path)
+        ckpt.save_result(index, fp, dur, segs, meta)
+    return ChunkResult(index=index, wav_path=wav_path, duration=dur, segments=segs, meta=meta)
+
+
+def process_chunk_sentences(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    ckpt: Optional[ChunkCheckpoints] = None,
+) -> ChunkResult:
+    """
+    Sentence timing: one TTS request per sentence (concurrently), segment times from
+    the measured WAV durations and char spans straight from the text. No STT, no alignment.
+    """
+    chunk_text = chunk["text"]
+    wav_path = work_dir / f"chunk_{index:04d}.wav"
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    if ckpt is not None and ckpt.restore_wav(index, fp, wav_path):
+        done = ckpt.load_result(index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, wav_path, done)
+
+    sentences = split_sentences_with_offsets(chunk_text)
+    paths = _sentence_paths(index, work_dir, len(sentences))
+
+    def tts_one(k: int) -> None:
+        tts_to_wav_file(sentences[k]["text"], str(paths[k]), voice=cfg.voice, speed=float(cfg.speed))
+
+    workers = max(1, min(int(cfg.sentence_workers), len(sentences)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="peachy-sentence") as pool:
+        list(pool.map(tts_one, range(len(sentences))))
+
+    return _finish_sentence_chunk(index, sentences, paths, wav_path, cfg, ckpt, fp)
+
+
+def finalize_chunk_segments(segs: list[dict], chunk_orig_start: int, audio_offset: float) -> list[dict]:
+    """
+    Offset time + convert local orig spans to global orig spans (mutates + returns segs).
+    """
+    for s in segs:
+        s["start"] = float(s.get("start", 0.0)) + audio_offset
+        s["end"] = float(s.get("end", 0.0)) + audio_offset
+
+        if "orig_char_start_local" in s and "orig_char_end_local" in s:
+            local_a = int(s["orig_char_start_local"])
+            local_b = int(s["orig_char_end_local"])
+
+            s["orig_char_start"] = chunk_orig_start + local_a
+            s["orig_char_end"] = chunk_orig_start + local_b
+
+            del s["orig_char_start_local"]
+            del s["orig_char_end_local"]
+
+    return segs
+
+
+def _assemble(chunks: list[dict], results: list[ChunkResult], arena: Optional[PcmArena] = None) -> PipelineResult:
+    """
+    In-order reassembly: accumulate audio_offset and build manifest["chunks"].
+    """
+    wav_paths: list[Path] = []
+    pcm: list[memoryview] = []
+    all_segments: list[dict] = []
+    chunk_meta: list[dict] = []
+    audio_offset = 0.0
+
+    for ch, res in zip(chunks, results):
+        chunk_orig_start = int(ch["orig_start"])
+
+        finalize_chunk_segments(res.segments, chunk_orig_start, audio_offset)
+        all_segments.extend(res.segments)
+        if res.wav_path is not None:
+            wav_paths.append(res.wav_path)
+        if res.pcm is not None:
+            pcm.append(res.pcm)
+
+        chunk_meta.append(
+            {
+                "index": res.index,
+                "orig_char_start": chunk_orig_start,
+                "orig_char_end": int(ch["orig_end"]),
+                "chars": len(ch["text"]),
+                "duration_seconds": res.duration,
+                "audio_offset_seconds": audio_offset,
+                **res.meta,
+            }
+        )
+        audio_offset += res.duration
+
+    return PipelineResult(
+        wav_paths=wav_paths,
+        segments=all_segments,
+        chunks=chunk_meta,
+        total_seconds=audio_offset,
+        pcm=pcm,
+        arena=arena,
+    )
+
+
+def render_chunks(
+    chunks: list[dict],
+    work_dir: Path,
+    cfg: PipelineConfig,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    ckpt: Optional[ChunkCheckpoints] = None,
+    on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+) -> PipelineResult:
+    """
+    Runs process_chunk for every chunk on a bounded thread pool, so chunk i+1's TTS
+    is in flight while chunk i is being transcribed/aligned.
+
+    Results are consumed strictly in chunk order on the calling thread, which is where
+    audio_offset is accumulated and on_chunk(result) / on_progress(done, total) are
+    called (safe for Streamlit; on_chunk can stream the audio out in order).
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    total = len(chunks)
+    results: list[ChunkResult] = []
+    arena = _pcm_arena(chunks, work_dir, cfg)
+
+    workers = max(1, min(int(cfg.max_in_flight), total or 1))
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="peachy-chunk") as pool:
+            futures = [pool.submit(process_chunk, i, ch, work_dir, cfg, ckpt, arena) for i, ch in enumerate(chunks)]
+
+            try:
+                for i, fut in enumerate(futures):
+                    results.append(fut.result())
+                    if on_chunk is not None:
+                        on_chunk(results[-1])
+                    if on_progress is not None:
+                        on_progress(i + 1, total)
+            except BaseException:
+                if ckpt is None:
+                    # don't keep paying for chunks nobody will use
+                    for f in futures:
+                        f.cancel()
+                else:
+                    # let the other chunks finish + checkpoint, so a resume only redoes failures
+                    wait(futures)
+                raise
+    except BaseException:
+        # the pool has drained by now, so nothing still writes into the arena
+        if arena is not None:
+            arena.close()
+        raise
+
+    return _assemble(chunks, results, arena)
+
+
+# ----------------------------
+# Async driver (AsyncOpenAI)
+# ----------------------------
+async def process_chunk_async(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    client: AsyncOpenAI,
+    sem: asyncio.Semaphore,
+    ckpt: Optional[ChunkCheckpoints] = None,
+    arena: Optional[PcmArena] = None,
+) -> ChunkResult:
+    if cfg.timing == TIMING_SENTENCE:
+        return await process_chunk_sentences_async(index, chunk, work_dir, cfg, client, sem, ckpt)
+    if arena is not None:
+        return await process_chunk_pcm_async(index, chunk, work_dir, cfg, client, sem, arena, ckpt)
+
+    chunk_text = chunk["text"]
+    wav_path = work_dir / f"chunk_{index:04d}.wav"
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    # storage calls are blocking; run them off the event loop
+    have_wav = ckpt is not None and await asyncio.to_thread(ckpt.restore_wav, index, fp, wav_path)
+    if have_wav:
+        done = await asyncio.to_thread(ckpt.load_result, index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, wav_path, done)
+    else:
+        # hold the semaphore only while an API call is outstanding
+        async with sem:
+            await tts_to_wav_file_async(chunk_text, str(wav_path), voice=cfg.voice, speed=float(cfg.speed), client=client)
+        if ckpt is not None:
+            await asyncio.to_thread(ckpt.save_wav, index, fp, wav_path)
+    dur = wav_duration_seconds(wav_path)
+
+    meta: dict = {}
+    if cfg.timing == TIMING_PAUSE:
+        res = await asyncio.to_thread(pause_timing, index, wav_path, dur, chunk_text, cfg, ckpt, fp)
+        if res.segments:
+            return res
+        meta = res.meta
+
+    stt_verbose = await asyncio.to_thread(ckpt.load_stt, index, fp) if ckpt is not None else None
+    if stt_verbose is None:
+        async with sem:
+            stt_verbose = await whisper_segments_verbose_json_async(str(wav_path), client=client)
+        if ckpt is not None:
+            await asyncio.to_thread(ckpt.save_stt, index, fp, stt_verbose)
+
+    # alignment is CPU work; keep it off the event loop
+    segs = await asyncio.to_thread(segments_from_stt, stt_verbose, chunk_text, cfg)
+    if ckpt is not None:
+        await asyncio.to_thread(ckpt.save_result, index, fp, dur, segs, meta)
+    return ChunkResult(index=index, wav_path=wav_path, duration=dur, segments=segs, meta=meta)
+
+
+async def process_chunk_pcm_async(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    client: AsyncOpenAI,
+    sem: asyncio.Semaphore,
+    arena: PcmArena,
+    ckpt: Optional[ChunkCheckpoints] = None,
+) -> ChunkResult:
+    chunk_text = chunk["text"]
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    pcm = await asyncio.to_thread(_restore_pcm, ckpt, index, fp, arena) if ckpt is not None else None
+    if pcm is not None:
+        done = await asyncio.to_thread(ckpt.load_result, index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, None, done, pcm)
+    else:
+        async with sem:
+            data = await tts_to_pcm_async(chunk_text, voice=cfg.voice, speed=float(cfg.speed), client=client)
+        pcm = arena.add(whole_frames(data))
+        if ckpt is not None:
+            await asyncio.to_thread(ckpt.save_wav_bytes, index, fp, pcm_to_wav_bytes(pcm))
+    dur = pcm_duration_seconds(len(pcm))
+
+    meta: dict = {}
+    if cfg.timing == TIMING_PAUSE:
+        res = await asyncio.to_thread(pause_timing, index, None, dur, chunk_text, cfg, ckpt, fp, pcm)
+        if res.segments:
+            return res
+        meta = res.meta
+
+    stt_verbose = await asyncio.to_thread(ckpt.load_stt, index, fp) if ckpt is not None else None
+    if stt_verbose is None:
+        async with sem:
+            stt_verbose = await whisper_segments_verbose_json_async(
+                f"chunk_{index:04d}.wav", client=client, audio=pcm_to_wav_bytes(pcm)
+            )
+        if ckpt is not None:
+            await asyncio.to_thread(ckpt.save_stt, index, fp, stt_verbose)
+
+    segs = await asyncio.to_thread(segments_from_stt, stt_verbose, chunk_text, cfg)
+    if ckpt is not None:
+        await asyncio.to_thread(ckpt.save_result, index, fp, dur, segs, meta)
+    return ChunkResult(index=index, wav_path=None, duration=dur, segments=segs, meta=meta, pcm=pcm)
+
+
+async def process_chunk_sentences_async(
+    index: int,
+    chunk: dict,
+    work_dir: Path,
+    cfg: PipelineConfig,
+    client: AsyncOpenAI,
+    sem: asyncio.Semaphore,
+    ckpt: Optional[ChunkCheckpoints] = None,
+) -> ChunkResult:
+    chunk_text = chunk["text"]
+    wav_path = work_dir / f"chunk_{index:04d}.wav"
+    fp = chunk_fingerprint(chunk_text, cfg.voice, cfg.speed, cfg.timing)
+
+    if ckpt is not None and await asyncio.to_thread(ckpt.restore_wav, index, fp, wav_path):
+        done = await asyncio.to_thread(ckpt.load_result, index, fp)
+        if done is not None:
+            return _result_from_checkpoint(index, wav_path, done)
+
+    sentences = split_sentences_with_offsets(chunk_text)
+    paths = _sentence_paths(index, work_dir, len(sentences))
+
+    async def tts_one(k: int) -> None:
+        async with sem:
+            await tts_to_wav_file_async(
+                sentences[k]["text"], str(paths[k]), voice=cfg.voice, speed=float(cfg.speed), client=client
+            )
+
+    await asyncio.gather(*(tts_one(k) for k in range(len(sentences))))
+    return await asyncio.to_thread(_finish_sentence_chunk, index, sentences, paths, wav_path, cfg, ckpt, fp)
+
+
+async def render_chunks_async(
+    chunks: list[dict],
+    work_dir: Path,
+    cfg: PipelineConfig,
+    client: Optional[AsyncOpenAI] = None,
+    sem: Optional[asyncio.Semaphore] = None,
+    ckpt: Optional[ChunkCheckpoints] = None,
+    on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+) -> PipelineResult:
+    """
+    Fans out every chunk at once as tasks. Concurrency is bounded by `sem`
+    (shared by TTS + STT calls; pass your own to share it across documents), which
+    defaults to cfg.api_concurrency. No thread per request.
+
+    Results are awaited in chunk order; on_chunk(result) runs in a worker thread so
+    it may block (e.g. feed an encoder) without stalling the event loop.
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    if sem is None:
+        sem = asyncio.Semaphore(max(1, int(cfg.api_concurrency)))
+
+    own_client = client is None
+    if own_client:
+        client = new_async_client()
+
+    arena = _pcm_arena(chunks, work_dir, cfg)
+    tasks = [
+        asyncio.ensure_future(process_chunk_async(i, ch, work_dir, cfg, client, sem, ckpt, arena))
+        for i, ch in enumerate(chunks)
+    ]
+    results: list[ChunkResult] = []
+    try:
+        for t in tasks:
+            results.append(await t)
+            if on_chunk is not None:
+                await asyncio.to_thread(on_chunk, results[-1])
+    except BaseException:
+        if ckpt is None:
+            for t in tasks:
+                t.cancel()
+        # with checkpoints, let every chunk finish (and checkpoint) before surfacing a failure
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if arena is not None:
+            arena.close()
+        raise
+    finally:
+        if own_client:
+            await client.close()
+
+    return _assemble(chunks, results, arena)
+
+
+def run_render_chunks_async(
+    chunks: list[dict],
+    work_dir: Path,
+    cfg: PipelineConfig,
+    ckpt: Optional[ChunkCheckpoints] = None,
+    on_chunk: Optional[Callable[[ChunkResult], None]] = None,
+) -> PipelineResult:
+    """
+    Sync entry point for render_chunks_async (own event loop + client).
+    """
+    return asyncio.run(render_chunks_async(chunks, work_dir, cfg, ckpt=ckpt, on_chunk=on_chunk))
@@ -0,0 +1,432 @@
+# core/ratelimit.py
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import AsyncIterator, Iterator, Optional
+
+from core.config import get_secret
+
+# outcome of one API call, reported back to the limiter
+OK = "ok"
+THROTTLED = "throttled"   # 429
+SERVER_ERROR = "server_error"  # 5xx
+OTHER_ERROR = "other_error"    # anything else (doesn't say anything about load)
+
+
+def classify_exception(e: BaseException) -> str:
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    if status == 429:
+        return THROTTLED
+    if isinstance(status, int) and status >= 500:
+        return SERVER_ERROR
+    return OTHER_ERROR
+
+
+def retry_after_seconds(e: BaseException) -> Optional[float]:
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class LimiterConfig:
+    requests_per_minute: float = 500.0
+    burst: float = 20.0
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    # after a 429/5xx, don't halve again for this long (one decrease per congestion event)
+    decrease_cooldown: float = 2.0
+    # default pause after a 429 without Retry-After
+    throttle_pause: float = 1.0
+
+
+class SqliteTokenBucket:
+    """
+    Token bucket shared by every process that points at the same SQLite file.
+    """
+
+    def __init__(self, db_path: Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS limiter_metrics (name TEXT NOT NULL, pid INTEGER NOT NULL, host TEXT NOT NULL, "
+                "ts REAL NOT NULL, data TEXT NOT NULL, PRIMARY KEY (name, pid, host))"
+            )
+
+    @contextmanager
+    def _conn(self) -> Iterator[sqlite3.Connection]:
+        c = sqlite3.connect(str(self.db_path), timeout=10.0, isolation_level=None)
+        try:
+            c.execute("PRAGMA journal_mode=WAL")
+            yield c
+        finally:
+            c.close()
+
+    def take(self, name: str, rate_per_sec: float, burst: float) -> float:
+        """
+        Take one token. Returns 0.0 on success, else seconds to wait before trying again.
+        """
+        now = time.time()
+        with self._conn() as c:
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                r = c.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (name,)).fetchone()
+                tokens, updated = (float(r[0]), float(r[1])) if r else (burst, now)
+                tokens = min(burst, tokens + max(0.0, now - updated) * rate_per_sec)
+                wait = 0.0
+                if tokens >= 1.0:
+                    tokens -= 1.0
+                else:
+                    wait = (1.0 - tokens) / rate_per_sec
+                c.execute(
+                    "INSERT INTO buckets (name, tokens, updated) VALUES (?, ?, ?) "
+                    "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                    (name, tokens, now),
+                )
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+        return wait
+
+    def publish(self, name: str, data: dict) -> None:
+        with self._conn() as c:
+            c.execute(
+                "INSERT OR REPLACE INTO limiter_metrics (name, pid, host, ts, data) VALUES (?, ?, ?, ?, ?)",
+                (name, os.getpid(), socket.gethostname(), time.time(), json.dumps(data)),
+            )
+
+    def read_metrics(self, max_age: float = 60.0) -> list[dict]:
+        with self._conn() as c:
+            rows = c.execute(
+                "SELECT name, pid, host, ts, data FROM limiter_metrics WHERE ts >= ? ORDER BY name, host, pid",
+                (time.time() - max_age,),
+            ).fetchall()
+        return [{"name": r[0], "pid": r[1], "host": r[2], "ts": r[3], **json.loads(r[4])} for r in rows]
+
+
+# longest a waiter sleeps before re-checking; callers held back by a full window are
+# woken by release() sooner
+MAX_WAIT_SECONDS = 1.0
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket (requests/minute) + AIMD concurrency window for one API.
+
+    - every call takes a token (process-local, or from a shared SqliteTokenBucket)
+    - at most `limit` calls in flight; limit grows by ~1 per window of successes and
+      halves on 429/5xx (at most once per decrease_cooldown)
+    - a 429 also pauses new calls for Retry-After (or throttle_pause) seconds
+
+    The async path never touches the shared SQLite bucket on the event loop (it may wait
+    on another process' lock): acquire_async/release_async run it in a worker thread.
+    """
+
+    def __init__(self, name: str, cfg: LimiterConfig, shared: Optional[SqliteTokenBucket] = None) -> None:
+        self.name = name
+        self.cfg = cfg
+        self.shared = shared
+
+        self._lock = threading.Lock()
+        # signalled whenever a slot is freed; _releases counts them, so a waiter can't miss one
+        self._released = threading.Condition(self._lock)
+        self._releases = 0
+        self._async_waiters: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._rate = cfg.requests_per_minute / 60.0
+        self._tokens = float(cfg.burst)
+        self._updated = time.monotonic()
+        self._limit = float(cfg.max_concurrency)
+        self._in_flight = 0
+        self._waiting = 0  # acquire() calls currently held back
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        self._counts = {OK: 0, THROTTLED: 0, SERVER_ERROR: 0, OTHER_ERROR: 0}
+        self._recent: deque[float] = deque()  # completion times, for current rate
+        self._last_publish = 0.0
+
+    # --- acquire / release
+    def _reserve(self) -> tuple[float, int]:
+        """
+        Takes a slot (+ a local token without a shared bucket): (0.0, _) on success, else
+        (seconds to wait before retrying, release count to wait for a release after).
+        """
+        now = time.monotonic()
+        with self._lock:
+            seq = self._releases
+            if now < self._paused_until:
+                return self._paused_until - now, seq
+            if self._in_flight >= int(self._limit):
+                return MAX_WAIT_SECONDS, seq
+
+            if self.shared is None:
+                self._tokens = min(float(self.cfg.burst), self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens < 1.0:
+                    return (1.0 - self._tokens) / self._rate, seq
+                self._tokens -= 1.0
+
+            self._in_flight += 1
+            return 0.0, seq
+
+    def _take_shared(self) -> float:
+        """
+        Takes a token from the shared bucket for a reserved slot, giving the slot back if
+        there is none. Blocks on the bucket's SQLite lock.
+        """
+        try:
+            wait = self.shared.take(self.name, self._rate, float(self.cfg.burst))
+        except sqlite3.Error:
+            wait = 0.0  # never fail a request because the limiter DB is unhappy
+        if wait > 0.0:
+            with self._lock:
+                self._in_flight -= 1
+                self._wake()
+        return wait
+
+    def _wake(self) -> None:
+        # a slot was freed (called with the lock held): wake sync and async waiters
+        self._releases += 1
+        self._released.notify_all()
+        for loop, ev in self._async_waiters:
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:  # that loop is closed
+                pass
+
+    def _try_acquire(self) -> float:
+        """
+        0.0 if a slot + token were taken, else seconds to wait before retrying.
+        """
+        wait, _ = self._reserve()
+        if wait <= 0.0 and self.shared is not None:
+            wait = self._take_shared()
+        return wait
+
+    def _set_waiting(self, delta: int) -> None:
+        with self._lock:
+            self._waiting += delta
+
+    def acquire(self) -> None:
+        wait, seq = self._reserve()
+        if wait <= 0.0 and self.shared is not None:
+            wait = self._take_shared()
+        if wait <= 0.0:
+            return
+        self._set_waiting(1)
+        try:
+            while wait > 0.0:
+                with self._lock:
+                    self._released.wait_for(lambda: self._releases != seq, min(wait, MAX_WAIT_SECONDS))
+                wait, seq = self._reserve()
+                if wait <= 0.0 and self.shared is not None:
+                    wait = self._take_shared()
+        finally:
+            self._set_waiting(-1)
+
+    async def _wait_release_async(self, seq: int, timeout: float) -> None:
+        ev = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), ev)
+        with self._lock:
+            if self._releases != seq:
+                return
+            self._async_waiters.add(waiter)
+        try:
+            await asyncio.wait_for(ev.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._lock:
+                self._async_waiters.discard(waiter)
+
+    async def acquire_async(self) -> None:
+        wait, seq = self._reserve()
+        if wait <= 0.0 and self.shared is not None:
+            wait = await asyncio.to_thread(self._take_shared)
+        if wait <= 0.0:
+            return
+        self._set_waiting(1)
+        try:
+            while wait > 0.0:
+                await self._wait_release_async(seq, min(wait, MAX_WAIT_SECONDS))
+                wait, seq = self._reserve()
+                if wait <= 0.0 and self.shared is not None:
+                    wait = await asyncio.to_thread(self._take_shared)
+        finally:
+            self._set_waiting(-1)
+
+    def congested(self) -> bool:
+        """
+        True while calls are being held back: paused after a 429, the concurrency window
+        is full, or callers are queued for a token. (No time to add duplicate requests.)
+        """
+        with self._lock:
+            return (
+                time.monotonic() < self._paused_until
+                or self._waiting > 0
+                or self._in_flight >= int(self._limit)
+            )
+
+    def _release(self, outcome: str, error: Optional[BaseException]) -> bool:
+        """
+        Frees the slot, updates the window and wakes waiters. True if metrics are due for publishing.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._wake()
+            self._counts[outcome] = self._counts.get(outcome, 0) + 1
+
+            if outcome == OK:
+                self._recent.append(time.time())
+                # additive increase: ~+1 per `limit` successes
+                self._limit = min(float(self.cfg.max_concurrency), self._limit + 1.0 / max(1.0, self._limit))
+            elif outcome in (THROTTLED, SERVER_ERROR):
+                if now - self._last_decrease >= self.cfg.decrease_cooldown:
+                    self._limit = max(float(self.cfg.min_concurrency), self._limit / 2.0)
+                    self._last_decrease = now
+                if outcome == THROTTLED:
+                    pause = (retry_after_seconds(error) if error is not None else None) or self.cfg.throttle_pause
+                    self._paused_until = max(self._paused_until, now + pause)
+
+            publish = self.shared is not None and (time.time() - self._last_publish) >= 5.0
+            if publish:
+                self._last_publish = time.time()
+        return publish
+
+    def _publish(self) -> None:
+        try:
+            self.shared.publish(self.name, self.metrics())
+        except sqlite3.Error:
+            pass
+
+    def release(self, outcome: str, error: Optional[BaseException] = None) -> None:
+        if self._release(outcome, error):
+            self._publish()
+
+    async def release_async(self, outcome: str, error: Optional[BaseException] = None) -> None:
+        if self._release(outcome, error):
+            await asyncio.to_thread(self._publish)
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        self.acquire()
+        try:
+            yield
+        except BaseException as e:
+            self.release(classify_exception(e), e)
+            raise
+        self.release(OK)
+
+    @asynccontextmanager
+    async def slot_async(self) -> AsyncIterator[None]:
+        await self.acquire_async()
+        try:
+            yield
+        except BaseException as e:
+            await self.release_async(classify_exception(e), e)
+            raise
+        await self.release_async(OK)
+
+    # --- metrics
+    def metrics(self) -> dict:
+        now = time.time()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60.0:
+                self._recent.popleft()
+            return {
+                "requests_per_minute_limit": self.cfg.requests_per_minute,
+                "requests_last_minute": len(self._recent),
+                "concurrency_limit": int(self._limit),
+                "in_flight": self._in_flight,
+                "waiting": self._waiting,
+                "paused_for": max(0.0, self._paused_until - time.monotonic()),
+                **{f"count_{k}": v for k, v in self._counts.items()},
+            }
+
+
+# ----------------------------
+# Process-wide limiters (one per API)
+# ----------------------------
+_limiters: dict[str, AdaptiveLimiter] = {}
+_shared: Optional[SqliteTokenBucket] = None
+_registry_lock = threading.Lock()
+
+
+def _config_for(name: str) -> LimiterConfig:
+    p = name.upper()
+    defaults = {"TTS": (500.0, 16), "STT": (500.0, 16)}.get(p, (500.0, 16))
+    return LimiterConfig(
+        requests_per_minute=float(get_secret(f"{p}_RPM", defaults[0])),
+        burst=float(get_secret(f"{p}_BURST", 20)),
+        max_concurrency=int(get_secret(f"{p}_MAX_CONCURRENCY", defaults[1])),
+    )
+
+
+def rate_limit_db_path(data_dir: Path) -> Optional[Path]:
+    """
+    RATE_LIMIT_DB overrides the location; RATE_LIMIT_DB=off keeps limits per process.
+    """
+    v = str(get_secret("RATE_LIMIT_DB", "") or "").strip()
+    if v.lower() in {"off", "0", "none", "false"}:
+        return None
+    return Path(v) if v else Path(data_dir) / "ratelimit.sqlite"
+
+
+def configure_rate_limits(db_path: Optional[Path]) -> None:
+    """
+    Share token buckets (and publish metrics) across processes via a SQLite file.
+    None = process-local limits only. Call before the first API request.
+    """
+    global _shared
+    with _registry_lock:
+        _shared = SqliteTokenBucket(Path(db_path)) if db_path else None
+        for lim in _limiters.values():
+            lim.shared = _shared
+
+
+def get_limiter(name: str) -> AdaptiveLimiter:
+    with _registry_lock:
+        lim = _limiters.get(name)
+        if lim is None:
+            lim = AdaptiveLimiter(name, _config_for(name), shared=_shared)
+            _limiters[name] = lim
+        return lim
+
+
+def limiter_metrics() -> dict[str, dict]:
+    """
+    This process's limiters.
+    """
+    with _registry_lock:
+        lims = list(_limiters.values())
+    return {lim.name: lim.metrics() for lim in lims}
+
+
+def shared_limiter_metrics(db_path: Path, max_age: float = 60.0) -> list[dict]:
+    """
+    Latest metrics published by every process using the shared limiter DB.
+    """
+    p = Path(db_path)
+    if not p.exists():
+        return []
+    return SqliteTokenBucket(p).read_metrics(max_age=max_age)
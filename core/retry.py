@@ -0,0 +1,285 @@
+# core/retry.py
+from __future__ import annotations
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from core.config import get_secret
+from core.ratelimit import AdaptiveLimiter, retry_after_seconds
+
+T = TypeVar("T")
+
+# same set the OpenAI SDK retries itself (its built-in retries are turned off in
+# core.openai_client so attempts aren't multiplied)
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(e: BaseException) -> bool:
+    if isinstance(e, openai.APIConnectionError):  # includes APITimeoutError
+        return True
+    status = getattr(e, "status_code", None)
+    if status is None:
+        status = getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(status, int) and (status in RETRYABLE_STATUS or status >= 500)
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 20.0
+
+    def delay(self, attempt: int, error: Optional[BaseException] = None) -> float:
+        """
+        "Full jitter" backoff for the wait after failed attempt number `attempt` (0-based),
+        never shorter than the server's Retry-After.
+        """
+        d = random.uniform(0.0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        ra = retry_after_seconds(error) if error is not None else None
+        return max(d, min(ra, self.max_delay)) if ra else d
+
+
+def call_with_retry(fn: Callable[[], T], policy: RetryPolicy) -> T:
+    for attempt in range(max(1, policy.max_attempts)):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt + 1 >= policy.max_attempts or not is_retryable(e):
+                raise
+            time.sleep(policy.delay(attempt, e))
+    raise AssertionError("unreachable")
+
+
+async def call_with_retry_async(fn: Callable[[], Awaitable[T]], policy: RetryPolicy) -> T:
+    for attempt in range(max(1, policy.max_attempts)):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt + 1 >= policy.max_attempts or not is_retryable(e):
+                raise
+            await asyncio.sleep(policy.delay(attempt, e))
+    raise AssertionError("unreachable")
+
+
+# ----------------------------
+# Hedging
+# ----------------------------
+class LatencyTracker:
+    """
+    Recent request latencies, normalized by request size (e.g. characters of text)
+    so chunk-sized and sentence-sized requests share one distribution.
+    """
+
+    def __init__(self, window: int = 200) -> None:
+        self._lock = threading.Lock()
+        self._samples: deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float, size: float = 1.0) -> None:
+        with self._lock:
+            self._samples.append(seconds / max(1.0, size))
+
+    def threshold(self, q: float, size: float = 1.0, min_samples: int = 10) -> Optional[float]:
+        """
+        q-quantile latency for a request of `size`, or None until min_samples are in.
+        """
+        with self._lock:
+            xs = sorted(self._samples)
+        if len(xs) < min_samples:
+            return None
+        i = min(len(xs) - 1, int(q * len(xs)))
+        return xs[i] * max(1.0, size)
+
+
+@dataclass
+class HedgePolicy:
+    enabled: bool = True
+    # fire the duplicate once the first request is slower than this quantile
+    quantile: float = 0.95
+    min_samples: int = 10
+    # never hedge sooner than this (seconds), whatever the quantile says
+    min_delay: float = 1.0
+
+    def delay(self, tracker: LatencyTracker, size: float) -> Optional[float]:
+        if not self.enabled:
+            return None
+        t = tracker.threshold(self.quantile, size, self.min_samples)
+        return None if t is None else max(self.min_delay, t)
+
+
+_hedge_pool: Optional[ThreadPoolExecutor] = None
+_hedge_pool_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _hedge_pool
+    with _hedge_pool_lock:
+        if _hedge_pool is None:
+            _hedge_pool = ThreadPoolExecutor(max_workers=64, thread_name_prefix="hedge")
+        return _hedge_pool
+
+
+def _run(
+    fn: Callable[[int], T],
+    n: int,
+    tracker: LatencyTracker,
+    size: float,
+    limiter: Optional[AdaptiveLimiter],
+    started: Optional[threading.Event] = None,
+) -> T:
+    # only the request itself is timed, not the wait for a limiter slot: queueing under
+    # throttling would otherwise inflate the latencies the hedge delay is derived from
+    with limiter.slot() if limiter is not None else nullcontext():
+        if started is not None:
+            started.set()
+        t0 = time.monotonic()
+        out = fn(n)
+        tracker.record(time.monotonic() - t0, size)
+    return out
+
+
+def hedged_call(
+    fn: Callable[[int], T],
+    tracker: LatencyTracker,
+    hedge: HedgePolicy,
+    size: float = 1.0,
+    discard: Optional[Callable[[T], None]] = None,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> T:
+    """
+    Runs fn(0); if it hasn't finished after the hedge delay, also runs fn(1) and
+    returns whichever succeeds first. fn(n) must not share output with fn(m)
+    (e.g. write to its own temp file). A losing call can't be interrupted; its
+    result is passed to `discard` when it eventually finishes.
+    With a limiter, each call runs in a limiter slot; the hedge delay counts from when
+    fn(0) got its slot, and no duplicate is sent while the limiter is congested.
+    """
+    delay = hedge.delay(tracker, size)
+    if delay is None:
+        return _run(fn, 0, tracker, size, limiter)
+
+    pool = _pool()
+    started = threading.Event()
+    futs: list[Future] = [pool.submit(_run, fn, 0, tracker, size, limiter, started)]
+    while not started.wait(0.05) and not futs[0].done():
+        pass
+    done, _ = wait(futs, timeout=delay)
+    if not done and not (limiter is not None and limiter.congested()):
+        futs.append(pool.submit(_run, fn, 1, tracker, size, limiter))
+
+    winner: Optional[Future] = None
+    first_error: Optional[BaseException] = None
+    pending = set(futs)
+    while pending and winner is None:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None:
+                winner = winner or f
+            elif first_error is None:
+                first_error = f.exception()
+
+    for f in pending:
+        if not f.cancel() and discard is not None:
+            f.add_done_callback(lambda f: discard(f.result()) if f.exception() is None else None)
+
+    if winner is None:
+        raise first_error  # type: ignore[misc]
+    return winner.result()
+
+
+async def hedged_call_async(
+    fn: Callable[[int], Awaitable[T]],
+    tracker: LatencyTracker,
+    hedge: HedgePolicy,
+    size: float = 1.0,
+    limiter: Optional[AdaptiveLimiter] = None,
+) -> T:
+    """
+    Async hedged_call (same limiter handling); the losing request is cancelled.
+    """
+    started = asyncio.Event()
+
+    async def timed(n: int) -> T:
+        # as in _run: the limiter wait isn't part of the measured latency
+        async with limiter.slot_async() if limiter is not None else nullcontext():
+            started.set()
+            t0 = time.monotonic()
+            out = await fn(n)
+            tracker.record(time.monotonic() - t0, size)
+        return out
+
+    delay = hedge.delay(tracker, size)
+    if delay is None:
+        return await timed(0)
+
+    tasks = [asyncio.ensure_future(timed(0))]
+    started_wait = asyncio.ensure_future(started.wait())
+    await asyncio.wait([tasks[0], started_wait], return_when=asyncio.FIRST_COMPLETED)
+    started_wait.cancel()
+    done, _ = await asyncio.wait(tasks, timeout=delay)
+    if not done and not (limiter is not None and limiter.congested()):
+        tasks.append(asyncio.ensure_future(timed(1)))
+
+    winner: Optional[asyncio.Future] = None
+    first_error: Optional[BaseException] = None
+    pending = set(tasks)
+    try:
+        while pending and winner is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for t in done:
+                if t.exception() is None:
+                    winner = winner or t
+                elif first_error is None:
+                    first_error = t.exception()
+    finally:
+        for t in pending:
+            t.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    if winner is None:
+        raise first_error  # type: ignore[misc]
+    return winner.result()
+
+
+# ----------------------------
+# Process-wide policies (one per API)
+# ----------------------------
+_trackers: dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def retry_policy(name: str) -> RetryPolicy:
+    p = name.upper()
+    return RetryPolicy(
+        max_attempts=int(get_secret(f"{p}_MAX_ATTEMPTS", 4)),
+        base_delay=float(get_secret(f"{p}_RETRY_BASE_SECONDS", 0.5)),
+        max_delay=float(get_secret(f"{p}_RETRY_MAX_SECONDS", 20)),
+    )
+
+
+@lru_cache(maxsize=None)
+def hedge_policy(name: str) -> HedgePolicy:
+    p = name.upper()
+    return HedgePolicy(
+        enabled=str(get_secret(f"{p}_HEDGE", "1")).strip().lower() not in {"0", "false", "off", "no"},
+        quantile=float(get_secret(f"{p}_HEDGE_QUANTILE", 0.95)),
+    )
+
+
+def latency_tracker(name: str) -> LatencyTracker:
+    with _trackers_lock:
+        t = _trackers.get(name)
+        if t is None:
+            t = _trackers[name] = LatencyTracker()
+        return t
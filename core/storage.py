@@ -1,14 +1,40 @@
 from __future__ import annotations
 
+import hashlib
 import json
+import os
+import random
+import tempfile
+import threading
+import time
+import warnings
+from contextlib import contextmanager
 from dataclasses import dataclass
+from functools import lru_cache
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Iterator, Optional
+from uuid import uuid4
 
 import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
+from core.config import get_secret
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+DEFAULT_DATA_DIR = Path.cwd() / "data"
+
+
+class ConflictError(RuntimeError):
+    """
+    A conditional write kept losing to concurrent writers (see update_json).
+    """
+
 
 def _clean_key(key: str) -> str:
     k = (key or "").lstrip("/").replace("\\", "/")
@@ -17,6 +43,14 @@ def _clean_key(key: str) -> str:
     return k
 
 
+@dataclass
+class ObjectInfo:
+    key: str
+    size: int
+    mtime: float  # unix seconds
+    etag: str = ""  # changes whenever the content does (quoted, as sent in HTTP headers)
+
+
 class Storage:
     def write_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
         raise NotImplementedError
@@ -27,6 +61,69 @@ class Storage:
     def exists(self, key: str) -> bool:
         raise NotImplementedError
 
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def list_objects(self, prefix: str) -> list[ObjectInfo]:
+        raise NotImplementedError
+
+    def copy(self, src_key: str, dst_key: str, content_type: Optional[str] = None) -> None:
+        self.write_bytes(dst_key, self.read_bytes(src_key), content_type=content_type)
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        """
+        Size/mtime/etag of one object, or None if it doesn't exist.
+        """
+        if not self.exists(key):
+            return None
+        data = self.read_bytes(key)
+        return ObjectInfo(key=key, size=len(data), mtime=0.0, etag=f'"{hashlib.md5(data).hexdigest()}"')
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        """
+        Bytes [start, end) of an object as a stream of blocks (end=None: to the end).
+        """
+        yield self.read_bytes(key)[start:end]
+
+    def touch(self, key: str) -> None:
+        """
+        Marks an object as just used: its mtime becomes now (content unchanged).
+        """
+        self.copy(key, key)
+
+    def presigned_url(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        """
+        Time-limited URL a browser can GET the object from directly, or None if the
+        backend can't hand out one (then serve it via core.media_server).
+        """
+        return None
+
+    def read_with_etag(self, key: str) -> Optional[tuple[bytes, str]]:
+        """
+        (content, etag) from one read, so the etag is exactly that content's; None if missing.
+        """
+        raise NotImplementedError
+
+    def compare_and_swap(
+        self,
+        key: str,
+        data: bytes,
+        if_match: Optional[str],
+        content_type: Optional[str] = None,
+    ) -> bool:
+        """
+        Writes `data` only if the object is still at etag `if_match` (from read_with_etag),
+        or, with if_match=None, only if it doesn't exist yet. False if another writer got there first.
+        """
+        raise NotImplementedError
+
+    def conditional_writes_supported(self) -> bool:
+        """
+        True if compare_and_swap is atomic; False if it can only check, then write
+        (a writer racing in between is overwritten: last writer wins).
+        """
+        return False
+
     def write_text(self, key: str, text: str, encoding: str = "utf-8") -> None:
         self.write_bytes(key, (text or "").encode(encoding), content_type="text/plain; charset=utf-8")
 
@@ -46,6 +143,56 @@ class Storage:
         return json.loads(self.read_text(key))
 
 
+def _current_umask() -> int:
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError):
+        pass
+    # no way to read it without setting it; done once, at import
+    mask = os.umask(0o022)
+    os.umask(mask)
+    return mask
+
+
+# mkstemp creates 0600 files; stored files get the mode a plain open() would have given them
+_FILE_MODE = 0o666 & ~_current_umask()
+
+
+def _local_etag(stt: os.stat_result) -> str:
+    # writes are write + rename, so (size, mtime, inode) identifies the content
+    return f'"{stt.st_size:x}-{stt.st_mtime_ns:x}-{stt.st_ino:x}"'
+
+
+@contextmanager
+def _file_lock(lock_path: Path) -> Iterator[None]:
+    """
+    Exclusive inter-process lock on `lock_path` (created if missing), held for the block.
+    """
+    with open(lock_path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return
+        f.seek(0)
+        while True:
+            try:
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                break
+            except OSError:
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 @dataclass
 class LocalStorage(Storage):
     root: Path
@@ -56,7 +203,19 @@ class LocalStorage(Storage):
     def write_bytes(self, key: str, data: bytes, content_type: Optional[str] = None) -> None:
         p = self._path(key)
         p.parent.mkdir(parents=True, exist_ok=True)
-        p.write_bytes(data)
+        # write + rename so concurrent readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=str(p.parent), prefix=f".{p.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.chmod(tmp, _FILE_MODE)
+            os.replace(tmp, p)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
 
     def read_bytes(self, key: str) -> bytes:
         return self._path(key).read_bytes()
@@ -64,6 +223,179 @@ class LocalStorage(Storage):
     def exists(self, key: str) -> bool:
         return self._path(key).exists()
 
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            stt = self._path(key).stat()
+        except FileNotFoundError:
+            return None
+        return ObjectInfo(key=key, size=stt.st_size, mtime=stt.st_mtime, etag=_local_etag(stt))
+
+    def read_with_etag(self, key: str) -> Optional[tuple[bytes, str]]:
+        try:
+            with open(self._path(key), "rb") as f:
+                # fstat of the open file: a concurrent rename can't swap the content under us
+                return f.read(), _local_etag(os.fstat(f.fileno()))
+        except FileNotFoundError:
+            return None
+
+    def compare_and_swap(
+        self,
+        key: str,
+        data: bytes,
+        if_match: Optional[str],
+        content_type: Optional[str] = None,
+    ) -> bool:
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        # every conditional writer of `key` takes this lock; readers never need it (write + rename)
+        with _file_lock(p.with_name(f".{p.name}.lock")):
+            cur = self.stat(key)
+            if (cur.etag if cur is not None else None) != if_match:
+                return False
+            self.write_bytes(key, data, content_type=content_type)
+            return True
+
+    def conditional_writes_supported(self) -> bool:
+        return True
+
+    def touch(self, key: str) -> None:
+        os.utime(self._path(key))
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        with open(self._path(key), "rb") as f:
+            f.seek(start)
+            left = None if end is None else max(0, end - start)
+            while left is None or left > 0:
+                block = f.read(READ_BLOCK_BYTES if left is None else min(READ_BLOCK_BYTES, left))
+                if not block:
+                    break
+                if left is not None:
+                    left -= len(block)
+                yield block
+
+    def delete(self, key: str) -> None:
+        try:
+            self._path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def list_objects(self, prefix: str) -> list[ObjectInfo]:
+        base = self._path(prefix)
+        if not base.is_dir():
+            return []
+        out = []
+        for p in base.rglob("*"):
+            if not p.is_file() or p.name.endswith((".tmp", ".lock")):
+                continue
+            try:
+                stt = p.stat()
+            except FileNotFoundError:
+                continue
+            out.append(ObjectInfo(key=p.relative_to(self.root).as_posix(), size=stt.st_size, mtime=stt.st_mtime))
+        return out
+
+
+# Conditional read-modify-write of shared JSON objects
+CAS_MAX_ATTEMPTS = 8
+CAS_BASE_DELAY_SECONDS = 0.05
+CAS_MAX_DELAY_SECONDS = 2.0
+
+
+def update_json(
+    storage: Storage,
+    key: str,
+    update: Callable[[Any], Any],
+    default: Any = None,
+    max_attempts: int = CAS_MAX_ATTEMPTS,
+) -> Any:
+    """
+    Read `key` (default if missing), apply update(obj) and write the result back only if
+    nobody else wrote `key` in between; on a conflict re-read and re-apply, with jittered
+    backoff, up to max_attempts times (then ConflictError). update() must be safe to
+    call more than once. Returns the object that was written. Only as safe as
+    storage.compare_and_swap: see conditional_writes_supported().
+    """
+    for attempt in range(max(1, int(max_attempts))):
+        cur = storage.read_with_etag(key)
+        obj = json.loads(cur[0].decode("utf-8")) if cur is not None else default
+        new = update(obj)
+        data = json.dumps(new, indent=2).encode("utf-8")
+        if storage.compare_and_swap(key, data, cur[1] if cur is not None else None, "application/json; charset=utf-8"):
+            return new
+        time.sleep(random.uniform(0.0, min(CAS_MAX_DELAY_SECONDS, CAS_BASE_DELAY_SECONDS * (2 ** attempt))))
+    raise ConflictError(f"Gave up updating {key} after {max_attempts} conflicting writes")
+
+
+# B2 (S3 API) connection pool: enough for the pipeline's parallel chunk uploads + the
+# media/playback reads, kept alive between requests. Retries use botocore's standard
+# mode (exponential backoff with jitter on throttling and 5xx).
+DEFAULT_B2_POOL_CONNECTIONS = 32
+DEFAULT_B2_MAX_ATTEMPTS = 5
+B2_CONNECT_TIMEOUT_SECONDS = 5
+B2_READ_TIMEOUT_SECONDS = 60
+
+
+@lru_cache(maxsize=8)
+def _s3_client(endpoint_url: str, access_key_id: str, secret_access_key: str, max_pool_connections: int, max_attempts: int):
+    """
+    One client (and connection pool) per process and credentials: building one resolves
+    credentials/endpoints and starts with cold connections, so B2Storage objects share them.
+    boto3 clients are thread-safe.
+    """
+    return boto3.session.Session().client(
+        "s3",
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_access_key,
+        config=Config(
+            signature_version="s3v4",
+            s3={"addressing_style": "path"},
+            max_pool_connections=max_pool_connections,
+            tcp_keepalive=True,
+            connect_timeout=B2_CONNECT_TIMEOUT_SECONDS,
+            read_timeout=B2_READ_TIMEOUT_SECONDS,
+            retries={"mode": "standard", "max_attempts": max_attempts},
+        ),
+    )
+
+
+if hasattr(os, "register_at_fork"):
+    # a forked child (e.g. core.batch's process pool) must not share the parent's pooled
+    # connections: it builds its own client on first use
+    os.register_at_fork(after_in_child=_s3_client.cache_clear)
+
+
+# Conditional writes (If-Match / If-None-Match on PUT) aren't enforced by every S3-compatible
+# endpoint: some reject the headers (501, 400), some silently ignore them. Probed once per
+# (endpoint, bucket) and process; without them compare_and_swap falls back to check-then-write.
+# Each probe uses its own key, so processes probing at the same time can't delete each other's.
+CAS_PROBE_PREFIX = ".peachy/cas-probe"
+_cas_support: dict[tuple[str, str], bool] = {}
+_cas_support_lock = threading.Lock()
+
+
+def _is_conflict(e: ClientError) -> bool:
+    # 412: precondition failed; 409: a concurrent conditional write to the same key
+    code = str(e.response.get("Error", {}).get("Code", ""))
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in {"PreconditionFailed", "ConditionalRequestConflict"} or status in {409, 412}
+
+
+def _is_unsupported(e: ClientError) -> bool:
+    code = str(e.response.get("Error", {}).get("Code", ""))
+    status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in {"NotImplemented", "InvalidArgument", "InvalidRequest"} or status in {400, 501}
+
+
+def _warn_no_conditional_writes(bucket: str) -> None:
+    warnings.warn(
+        f"Bucket {bucket!r} doesn't enforce conditional writes; shared JSON objects are updated "
+        "check-then-write (a concurrent writer can be overwritten) and the history log is compacted "
+        "by one lease holder at a time.",
+        RuntimeWarning,
+        stacklevel=3,
+    )
+
 
 @dataclass
 class B2Storage(Storage):
@@ -72,15 +404,17 @@ class B2Storage(Storage):
     access_key_id: str
     secret_access_key: str
     prefix: str = ""
+    max_pool_connections: int = DEFAULT_B2_POOL_CONNECTIONS
+    max_attempts: int = DEFAULT_B2_MAX_ATTEMPTS
 
     def __post_init__(self) -> None:
         self.prefix = _clean_key(self.prefix).rstrip("/")
-        self.s3 = boto3.client(
-            "s3",
-            endpoint_url=self.endpoint_url,
-            aws_access_key_id=self.access_key_id,
-            aws_secret_access_key=self.secret_access_key,
-            config=Config(signature_version="s3v4", s3={"addressing_style": "path"}),
+        self.s3 = _s3_client(
+            self.endpoint_url,
+            self.access_key_id,
+            self.secret_access_key,
+            int(self.max_pool_connections),
+            int(self.max_attempts),
         )
 
     def _k(self, key: str) -> str:
@@ -106,3 +440,187 @@ class B2Storage(Storage):
             if code in {"404", "NoSuchKey", "NotFound"}:
                 return False
             raise
+
+    def stat(self, key: str) -> Optional[ObjectInfo]:
+        try:
+            r = self.s3.head_object(Bucket=self.bucket, Key=self._k(key))
+        except ClientError as e:
+            code = str(e.response.get("Error", {}).get("Code", ""))
+            if code in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+        return ObjectInfo(
+            key=key,
+            size=int(r.get("ContentLength", 0)),
+            mtime=r["LastModified"].timestamp(),
+            etag=r.get("ETag", ""),
+        )
+
+    def iter_range(self, key: str, start: int = 0, end: Optional[int] = None) -> Iterator[bytes]:
+        if end is not None and end <= start:
+            return
+        kwargs = {"Bucket": self.bucket, "Key": self._k(key)}
+        if start or end is not None:
+            kwargs["Range"] = f"bytes={start}-{'' if end is None else end - 1}"
+        body = self.s3.get_object(**kwargs)["Body"]
+        try:
+            yield from body.iter_chunks(READ_BLOCK_BYTES)
+        finally:
+            body.close()
+
+    def read_with_etag(self, key: str) -> Optional[tuple[bytes, str]]:
+        try:
+            r = self.s3.get_object(Bucket=self.bucket, Key=self._k(key))
+        except ClientError as e:
+            code = str(e.response.get("Error", {}).get("Code", ""))
+            if code in {"404", "NoSuchKey", "NotFound"}:
+                return None
+            raise
+        return r["Body"].read(), r.get("ETag", "")
+
+    def compare_and_swap(
+        self,
+        key: str,
+        data: bytes,
+        if_match: Optional[str],
+        content_type: Optional[str] = None,
+    ) -> bool:
+        if not self.conditional_writes_supported():
+            return self._check_then_write(key, data, if_match, content_type)
+        # S3 conditional writes: If-Match on the etag we read, If-None-Match: * to create
+        kwargs = {"Bucket": self.bucket, "Key": self._k(key), "Body": data}
+        if if_match is None:
+            kwargs["IfNoneMatch"] = "*"
+        else:
+            kwargs["IfMatch"] = if_match
+        if content_type:
+            kwargs["ContentType"] = content_type
+        try:
+            self.s3.put_object(**kwargs)
+        except ClientError as e:
+            if _is_conflict(e):
+                return False
+            if not _is_unsupported(e):
+                raise
+            # the probe's If-None-Match passed but this header was refused (e.g. If-Match)
+            with _cas_support_lock:
+                _cas_support[(self.endpoint_url, self.bucket)] = False
+            _warn_no_conditional_writes(self.bucket)
+            return self._check_then_write(key, data, if_match, content_type)
+        return True
+
+    def _check_then_write(self, key: str, data: bytes, if_match: Optional[str], content_type: Optional[str]) -> bool:
+        cur = self.stat(key)
+        if (cur.etag if cur is not None else None) != if_match:
+            return False
+        self.write_bytes(key, data, content_type=content_type)
+        return True
+
+    def conditional_writes_supported(self) -> bool:
+        with _cas_support_lock:
+            ok = _cas_support.get((self.endpoint_url, self.bucket))
+            if ok is None:
+                # a negative answer disables CAS for the process' lifetime: make sure of it
+                ok = self._probe_conditional_writes() or self._probe_conditional_writes()
+                _cas_support[(self.endpoint_url, self.bucket)] = ok
+                if not ok:
+                    _warn_no_conditional_writes(self.bucket)
+        return ok
+
+    def _probe_conditional_writes(self) -> bool:
+        # creating an object that exists must fail with 412 (not be rejected, not go through)
+        k = self._k(f"{CAS_PROBE_PREFIX}/{uuid4().hex}")
+        self.s3.put_object(Bucket=self.bucket, Key=k, Body=b"")
+        try:
+            self.s3.put_object(Bucket=self.bucket, Key=k, Body=b"", IfNoneMatch="*")
+            return False
+        except ClientError as e:
+            if _is_conflict(e):
+                return True
+            if _is_unsupported(e):
+                return False
+            raise
+        finally:
+            try:
+                self.s3.delete_object(Bucket=self.bucket, Key=k)
+            except ClientError:
+                pass
+
+    def presigned_url(self, key: str, expires_in: int = 3600) -> Optional[str]:
+        # signed locally (no request to B2); range requests work on it like on the object
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": self._k(key)},
+            ExpiresIn=int(expires_in),
+        )
+
+    def delete(self, key: str) -> None:
+        self.s3.delete_object(Bucket=self.bucket, Key=self._k(key))
+
+    def copy(self, src_key: str, dst_key: str, content_type: Optional[str] = None) -> None:
+        # server-side copy: no bytes through this process
+        self.s3.copy_object(
+            Bucket=self.bucket,
+            Key=self._k(dst_key),
+            CopySource={"Bucket": self.bucket, "Key": self._k(src_key)},
+        )
+
+    def touch(self, key: str) -> None:
+        # S3 has no utime: copy the object onto itself (server-side), which resets LastModified.
+        # A self-copy must replace the metadata, so carry the current metadata over.
+        k = self._k(key)
+        head = self.s3.head_object(Bucket=self.bucket, Key=k)
+        kwargs = {
+            "Bucket": self.bucket,
+            "Key": k,
+            "CopySource": {"Bucket": self.bucket, "Key": k},
+            "MetadataDirective": "REPLACE",
+            "Metadata": head.get("Metadata") or {},
+        }
+        if head.get("ContentType"):
+            kwargs["ContentType"] = head["ContentType"]
+        self.s3.copy_object(**kwargs)
+
+    def list_objects(self, prefix: str) -> list[ObjectInfo]:
+        full_prefix = self._k(prefix)
+        strip = f"{self.prefix}/" if self.prefix else ""
+        out = []
+        paginator = self.s3.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=full_prefix):
+            for obj in page.get("Contents", []):
+                k = obj["Key"]
+                out.append(
+                    ObjectInfo(
+                        key=k[len(strip):] if strip and k.startswith(strip) else k,
+                        size=int(obj.get("Size", 0)),
+                        mtime=obj["LastModified"].timestamp(),
+                        etag=obj.get("ETag", ""),
+                    )
+                )
+        return out
+
+
+# Block size for streamed (ranged) reads
+READ_BLOCK_BYTES = 64 * 1024
+
+
+# ----------------------------
+# Storage selection (local vs B2)
+# ----------------------------
+def get_storage(data_dir: Optional[Path] = None) -> Storage:
+    backend = (get_secret("STORAGE_BACKEND", "") or "local").lower()
+
+    if backend == "b2":
+        return B2Storage(
+            endpoint_url=get_secret("B2_S3_ENDPOINT"),
+            bucket=get_secret("B2_BUCKET"),
+            access_key_id=get_secret("B2_ACCESS_KEY_ID"),
+            secret_access_key=get_secret("B2_SECRET_APPL_KEY"),
+            prefix=get_secret("B2_PREFIX", ""),
+            max_pool_connections=int(get_secret("B2_MAX_POOL_CONNECTIONS", DEFAULT_B2_POOL_CONNECTIONS)),
+            max_attempts=int(get_secret("B2_MAX_ATTEMPTS", DEFAULT_B2_MAX_ATTEMPTS)),
+        )
+
+    root = Path(data_dir) if data_dir is not None else DEFAULT_DATA_DIR
+    root.mkdir(parents=True, exist_ok=True)
+    return LocalStorage(root=root)
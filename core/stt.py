@@ -1,34 +1,145 @@
+import asyncio
 from pathlib import Path
-from openai import OpenAI
-import streamlit as st
+from typing import Optional
 
-client = OpenAI(api_key=st.secrets["OPENAI_KEY"])
+from openai import AsyncOpenAI
 
-def whisper_segments_verbose_json(mp3_path: str) -> dict:
+from core.cache import BlobCache, stt_cache_key
+from core.openai_client import get_client, new_async_client
+from core.ratelimit import get_limiter
+from core.retry import call_with_retry, call_with_retry_async, retry_policy
+
+STT_MODEL = "whisper-1"
+STT_GRANULARITIES = ["segment"]
+
+# Transcript cache keyed by audio content hash (see set_stt_cache)
+_stt_cache: Optional[BlobCache] = None
+
+# False once the installed SDK rejected timestamp_granularities (older openai packages):
+# transcripts are then requested, and cached, without them
+_sdk_takes_granularities = True
+
+def _to_dict(r) -> dict:
+    if hasattr(r, "model_dump"):
+        return r.model_dump()
+    if hasattr(r, "to_dict"):
+        return r.to_dict()
+    return dict(r)
+
+def _granularities() -> list[str]:
+    return STT_GRANULARITIES if _sdk_takes_granularities else []
+
+def _no_granularities() -> None:
+    global _sdk_takes_granularities
+    _sdk_takes_granularities = False
+
+def set_stt_cache(cache: Optional[BlobCache]) -> None:
+    """
+    Install (or remove, with None) the process-wide transcript cache.
+    """
+    global _stt_cache
+    _stt_cache = cache
+
+def whisper_segments_verbose_json(mp3_path: str, audio: Optional[bytes] = None) -> dict:
     """
     Whisper with segment timestamps (when supported by SDK).
+    Cached by audio content hash when a transcript cache is installed.
+    Pass `audio` when the file contents are already in memory; mp3_path then only
+    names the upload (its extension tells the API the format).
     """
     p = Path(mp3_path)
-    with p.open("rb") as f:
-        try:
-            r = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
+    if audio is None:
+        audio = p.read_bytes()
+
+    cache = _stt_cache
+    digest = stt_cache_key(audio, STT_MODEL, _granularities()) if cache else ""
+    if cache is not None:
+        hit = cache.get_json(digest)
+        if hit is not None:
+            return hit
+
+    client = get_client()
+    upload = (p.name, audio)
+
+    def attempt():
+        # -> (response, granularities it was requested with)
+        with get_limiter("stt").slot():
+            if _sdk_takes_granularities:
+                try:
+                    return client.audio.transcriptions.create(
+                        model=STT_MODEL,
+                        file=upload,
+                        response_format="verbose_json",
+                        timestamp_granularities=STT_GRANULARITIES,
+                    ), STT_GRANULARITIES
+                except TypeError:
+                    _no_granularities()
+            return client.audio.transcriptions.create(
+                model=STT_MODEL,
+                file=upload,
                 response_format="verbose_json",
-                timestamp_granularities=["segment"],
-            )
-        except TypeError:
-            r = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=f,
+            ), []
+
+    r, used = call_with_retry(attempt, retry_policy("stt"))
+    out = _to_dict(r)
+    if cache is not None:
+        # under what was actually requested: a plain transcript never answers a segment lookup
+        cache.put_json(stt_cache_key(audio, STT_MODEL, used), out)
+    return out
+
+async def whisper_segments_verbose_json_async(
+    mp3_path: str,
+    client: Optional[AsyncOpenAI] = None,
+    audio: Optional[bytes] = None,
+) -> dict:
+    """
+    AsyncOpenAI version of whisper_segments_verbose_json.
+    """
+    p = Path(mp3_path)
+    if audio is None:
+        audio = await asyncio.to_thread(p.read_bytes)
+
+    cache = _stt_cache
+    digest = stt_cache_key(audio, STT_MODEL, _granularities()) if cache else ""
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.get_json, digest)
+        if hit is not None:
+            return hit
+
+    upload = (p.name, audio)
+
+    own_client = client is None
+    if own_client:
+        client = new_async_client()
+
+    async def attempt():
+        async with get_limiter("stt").slot_async():
+            if _sdk_takes_granularities:
+                try:
+                    return await client.audio.transcriptions.create(
+                        model=STT_MODEL,
+                        file=upload,
+                        response_format="verbose_json",
+                        timestamp_granularities=STT_GRANULARITIES,
+                    ), STT_GRANULARITIES
+                except TypeError:
+                    _no_granularities()
+            return await client.audio.transcriptions.create(
+                model=STT_MODEL,
+                file=upload,
                 response_format="verbose_json",
-            )
+            ), []
 
-    if hasattr(r, "model_dump"):
-        return r.model_dump()
-    if hasattr(r, "to_dict"):
-        return r.to_dict()
-    return dict(r)
+    try:
+        r, used = await call_with_retry_async(attempt, retry_policy("stt"))
+    finally:
+        if own_client:
+            await client.close()
+
+    out = _to_dict(r)
+    if cache is not None:
+        await asyncio.to_thread(cache.put_json, stt_cache_key(audio, STT_MODEL, used), out)
+    return out
 
 def extract_segments(stt_verbose_json: dict) -> list[dict]:
     segs = stt_verbose_json.get("segments") or []
@@ -1,8 +1,23 @@
+import asyncio
+import os
+import secrets
 from pathlib import Path
-from openai import OpenAI
-import streamlit as st
+from typing import Optional
 
-client = OpenAI(api_key=st.secrets["OPENAI_KEY"])
+from openai import AsyncOpenAI
+
+from core.cache import BlobCache, tts_cache_key
+from core.openai_client import get_client, new_async_client
+from core.ratelimit import get_limiter
+from core.retry import (
+    call_with_retry,
+    call_with_retry_async,
+    hedge_policy,
+    hedged_call,
+    hedged_call_async,
+    latency_tracker,
+    retry_policy,
+)
 
 DEFAULT_INSTRUCTIONS = (
     "Speak like a calm, confident interviewer. "
@@ -12,6 +27,23 @@ DEFAULT_INSTRUCTIONS = (
     "Do not sound robotic."
 )
 
+# Content-addressed TTS cache, consulted before every request (see set_tts_cache)
+_tts_cache: Optional[BlobCache] = None
+
+def set_tts_cache(cache: Optional[BlobCache]) -> None:
+    """
+    Install (or remove, with None) the process-wide TTS cache.
+    """
+    global _tts_cache
+    _tts_cache = cache
+
+def _part_path(out: Path, token: str, n: int) -> Path:
+    # each (hedged) attempt streams into its own file; the winner is renamed to `out`
+    return out.with_name(f".{out.name}.{token}-{n}.part")
+
+def _unlink(p: Path) -> None:
+    p.unlink(missing_ok=True)
+
 def _tts_to_file(
     text: str,
     out_path: str,
@@ -24,15 +56,45 @@ def _tts_to_file(
     out = Path(out_path)
     out.parent.mkdir(parents=True, exist_ok=True)
 
-    with client.audio.speech.with_streaming_response.create(
-        model=model,
-        voice=voice,
-        input=text,
-        speed=speed,
-        instructions=instructions,
-        response_format=response_format,
-    ) as response:
-        response.stream_to_file(out)
+    cache = _tts_cache
+    digest = tts_cache_key(text, voice, speed, model, instructions, response_format) if cache else ""
+    if cache is not None and cache.get_file(digest, out):
+        return out
+
+    token = secrets.token_hex(4)
+
+    def attempt(n: int) -> Path:
+        part = _part_path(out, token, n)
+        try:
+            with get_client().audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,
+                input=text,
+                speed=speed,
+                instructions=instructions,
+                response_format=response_format,
+            ) as response:
+                response.stream_to_file(part)
+        except BaseException:
+            _unlink(part)
+            raise
+        return part
+
+    part = call_with_retry(
+        lambda: hedged_call(
+            attempt,
+            latency_tracker("tts"),
+            hedge_policy("tts"),
+            size=len(text),
+            discard=_unlink,
+            limiter=get_limiter("tts"),
+        ),
+        retry_policy("tts"),
+    )
+    os.replace(part, out)
+
+    if cache is not None:
+        cache.put_file(digest, out)
 
     return out
 
@@ -71,3 +133,183 @@ def tts_to_wav_file(
         instructions=instructions,
         response_format="wav",
     )
+
+def tts_to_pcm(
+    text: str,
+    voice: str = "nova",
+    speed: float = 1.0,
+    model: str = "gpt-4o-mini-tts",
+    instructions: str = DEFAULT_INSTRUCTIONS,
+) -> bytes:
+    """
+    Headless PCM (see audio_utils.PCM_SPEC), read into memory: no container to parse,
+    duration = bytes / rate, and no file to write and read back.
+    """
+    cache = _tts_cache
+    digest = tts_cache_key(text, voice, speed, model, instructions, "pcm") if cache else ""
+    if cache is not None:
+        hit = cache.get_bytes(digest)
+        if hit is not None:
+            return hit
+
+    def attempt(n: int) -> bytes:
+        # each (hedged) attempt reads into its own buffer
+        buf = bytearray()
+        with get_client().audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            speed=speed,
+            instructions=instructions,
+            response_format="pcm",
+        ) as response:
+            for part in response.iter_bytes():
+                buf += part
+        return bytes(buf)
+
+    data = call_with_retry(
+        lambda: hedged_call(
+            attempt,
+            latency_tracker("tts"),
+            hedge_policy("tts"),
+            size=len(text),
+            limiter=get_limiter("tts"),
+        ),
+        retry_policy("tts"),
+    )
+
+    if cache is not None:
+        cache.put_bytes(digest, data)
+
+    return data
+
+
+# ----------------------------
+# Async (AsyncOpenAI) variants
+# ----------------------------
+async def _tts_to_file_async(
+    text: str,
+    out_path: str,
+    voice: str,
+    speed: float,
+    model: str,
+    instructions: str,
+    response_format: str,
+    client: Optional[AsyncOpenAI] = None,
+) -> Path:
+    out = Path(out_path)
+    out.parent.mkdir(parents=True, exist_ok=True)
+
+    cache = _tts_cache
+    digest = tts_cache_key(text, voice, speed, model, instructions, response_format) if cache else ""
+    if cache is not None and await asyncio.to_thread(cache.get_file, digest, out):
+        return out
+
+    own_client = client is None
+    if own_client:
+        client = new_async_client()
+
+    token = secrets.token_hex(4)
+
+    async def attempt(n: int) -> Path:
+        part = _part_path(out, token, n)
+        try:
+            async with client.audio.speech.with_streaming_response.create(
+                model=model,
+                voice=voice,
+                input=text,
+                speed=speed,
+                instructions=instructions,
+                response_format=response_format,
+            ) as response:
+                await response.stream_to_file(part)
+        except BaseException:
+            _unlink(part)
+            raise
+        return part
+
+    try:
+        part = await call_with_retry_async(
+            lambda: hedged_call_async(
+                attempt, latency_tracker("tts"), hedge_policy("tts"), size=len(text), limiter=get_limiter("tts")
+            ),
+            retry_policy("tts"),
+        )
+        os.replace(part, out)
+    finally:
+        if own_client:
+            await client.close()
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put_file, digest, out)
+
+    return out
+
+async def tts_to_wav_file_async(
+    text: str,
+    out_path: str,
+    voice: str = "nova",
+    speed: float = 1.0,
+    model: str = "gpt-4o-mini-tts",
+    instructions: str = DEFAULT_INSTRUCTIONS,
+    client: Optional[AsyncOpenAI] = None,
+) -> Path:
+    return await _tts_to_file_async(
+        text=text,
+        out_path=out_path,
+        voice=voice,
+        speed=speed,
+        model=model,
+        instructions=instructions,
+        response_format="wav",
+        client=client,
+    )
+
+async def tts_to_pcm_async(
+    text: str,
+    voice: str = "nova",
+    speed: float = 1.0,
+    model: str = "gpt-4o-mini-tts",
+    instructions: str = DEFAULT_INSTRUCTIONS,
+    client: Optional[AsyncOpenAI] = None,
+) -> bytes:
+    cache = _tts_cache
+    digest = tts_cache_key(text, voice, speed, model, instructions, "pcm") if cache else ""
+    if cache is not None:
+        hit = await asyncio.to_thread(cache.get_bytes, digest)
+        if hit is not None:
+            return hit
+
+    own_client = client is None
+    if own_client:
+        client = new_async_client()
+
+    async def attempt(n: int) -> bytes:
+        buf = bytearray()
+        async with client.audio.speech.with_streaming_response.create(
+            model=model,
+            voice=voice,
+            input=text,
+            speed=speed,
+            instructions=instructions,
+            response_format="pcm",
+        ) as response:
+            async for part in response.iter_bytes():
+                buf += part
+        return bytes(buf)
+
+    try:
+        data = await call_with_retry_async(
+            lambda: hedged_call_async(
+                attempt, latency_tracker("tts"), hedge_policy("tts"), size=len(text), limiter=get_limiter("tts")
+            ),
+            retry_policy("tts"),
+        )
+    finally:
+        if own_client:
+            await client.close()
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put_bytes, digest, data)
+
+    return data
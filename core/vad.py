@@ -0,0 +1,198 @@
+# core/vad.py
+from __future__ import annotations
+
+import wave
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from core.chunking import split_sentences_with_offsets
+
+
+@dataclass
+class PauseConfig:
+    frame_ms: float = 20.0
+    # frames quieter than (speech level + silence_db) count as silence
+    silence_db: float = -32.0
+    min_pause_ms: float = 160.0
+    # how far (seconds) a pause may sit from a boundary's predicted time and still be snapped to it
+    snap_tolerance: float = 0.9
+    # below this, the caller should fall back to Whisper for the chunk
+    min_confidence: float = 0.7
+    # sentence units (chars); tiny ones are merged so each boundary is a real pause
+    min_unit_chars: int = 25
+
+
+def read_wav_mono(wav_path: Path) -> tuple[np.ndarray, int]:
+    """
+    Returns (float32 samples in [-1, 1], sample_rate). Multi-channel is averaged.
+    """
+    with wave.open(str(wav_path), "rb") as w:
+        ch = w.getnchannels()
+        sw = w.getsampwidth()
+        fr = w.getframerate()
+        raw = w.readframes(w.getnframes())
+    return pcm_to_mono(raw, ch, sw), int(fr)
+
+
+def pcm_to_mono(raw, ch: int, sw: int) -> np.ndarray:
+    """
+    Raw little-endian PCM frames (bytes or memoryview) -> float32 mono samples in [-1, 1].
+    A trailing partial sample is ignored.
+    """
+    if sw > 0 and len(raw) % sw:
+        raw = raw[: len(raw) - len(raw) % sw]
+    if sw == 1:
+        x = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sw == 2:
+        x = np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768.0
+    elif sw == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        v = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        v = np.where(v & 0x800000, v - 0x1000000, v)
+        x = v.astype(np.float32) / 8388608.0
+    elif sw == 4:
+        x = np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {sw}")
+
+    if ch > 1:
+        x = x[: (len(x) // ch) * ch].reshape(-1, ch).mean(axis=1)
+    return x
+
+
+def frame_levels_db(x: np.ndarray, sr: int, frame_ms: float) -> tuple[np.ndarray, float]:
+    """
+    Per-frame RMS in dBFS, and the frame duration in seconds.
+    """
+    n = max(1, int(sr * frame_ms / 1000.0))
+    frames = len(x) // n
+    if frames == 0:
+        return np.zeros(0, dtype=np.float32), n / float(sr)
+    f = x[: frames * n].reshape(frames, n)
+    rms = np.sqrt(np.mean(f * f, axis=1) + 1e-12)
+    return 20.0 * np.log10(rms), n / float(sr)
+
+
+def find_pauses(x: np.ndarray, sr: int, cfg: PauseConfig) -> tuple[list[tuple[float, float]], float, float]:
+    """
+    Returns (pauses, speech_start, speech_end) in seconds.
+    pauses = silence gaps >= min_pause_ms strictly between first and last speech frames.
+    """
+    db, hop = frame_levels_db(x, sr, cfg.frame_ms)
+    if len(db) == 0:
+        return [], 0.0, 0.0
+
+    # speech level = loud-ish percentile, so the threshold adapts to the voice/gain
+    speech_level = float(np.percentile(db, 90))
+    silent = db < (speech_level + cfg.silence_db)
+
+    voiced = np.flatnonzero(~silent)
+    if len(voiced) == 0:
+        return [], 0.0, 0.0
+    first, last = int(voiced[0]), int(voiced[-1])
+
+    # run-length encode silence inside [first, last]
+    inner = silent[first : last + 1].astype(np.int8)
+    edges = np.diff(np.concatenate(([0], inner, [0])))
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    min_frames = max(1, int(round(cfg.min_pause_ms / cfg.frame_ms)))
+    pauses = [
+        ((first + s) * hop, (first + e) * hop)
+        for s, e in zip(starts, ends)
+        if (e - s) >= min_frames
+    ]
+    return pauses, first * hop, (last + 1) * hop
+
+
+def _spoken_weight(s: str) -> int:
+    # letters/digits drive speaking time; punctuation and whitespace mostly don't
+    return max(1, sum(1 for c in s if c.isalnum()))
+
+
+def pause_align(
+    wav_path: Path | None,
+    chunk_text: str,
+    cfg: PauseConfig | None = None,
+    samples: tuple[np.ndarray, int] | None = None,
+) -> tuple[list[dict], float]:
+    """
+    Times sentence units of `chunk_text` against silence gaps in the chunk WAV.
+
+    Each boundary between units gets a predicted time (speech span split by spoken
+    character weight, re-anchored at every snapped boundary so speaking-rate drift
+    doesn't accumulate) and is snapped to the nearest unused pause within
+    snap_tolerance. Returns (segments with chunk-local times + orig_char_*_local,
+    confidence = fraction of boundaries that snapped to a real pause).
+    `samples` = (mono samples, sample_rate) for audio already in memory (wav_path is then unused).
+    """
+    if cfg is None:
+        cfg = PauseConfig()
+
+    units = split_sentences_with_offsets(chunk_text, min_chars=cfg.min_unit_chars)
+    if not units:
+        return [], 0.0
+
+    x, sr = samples if samples is not None else read_wav_mono(Path(wav_path))
+    pauses, t0, t1 = find_pauses(x, sr, cfg)
+    if t1 <= t0:
+        return [], 0.0
+
+    weights = [_spoken_weight(u["text"]) for u in units]
+    n = len(units)
+
+    # boundary k sits between unit k and unit k+1
+    bounds: list[tuple[float, float]] = []  # (end of unit k, start of unit k+1)
+    snapped = 0
+    anchor_t = t0
+    anchor_w = 0
+    total_w = sum(weights)
+    done_w = 0
+    next_pause = 0
+
+    for k in range(n - 1):
+        done_w += weights[k]
+        remaining_w = total_w - anchor_w
+        frac = (done_w - anchor_w) / float(remaining_w) if remaining_w > 0 else 1.0
+        predicted = anchor_t + (t1 - anchor_t) * frac
+
+        best = -1
+        best_dist = cfg.snap_tolerance
+        for j in range(next_pause, len(pauses)):
+            mid = 0.5 * (pauses[j][0] + pauses[j][1])
+            dist = abs(mid - predicted)
+            if dist <= best_dist:
+                best, best_dist = j, dist
+            elif mid > predicted:
+                # pauses are sorted; further ones only get farther away
+                break
+
+        if best >= 0:
+            p_start, p_end = pauses[best]
+            bounds.append((p_start, p_end))
+            next_pause = best + 1
+            snapped += 1
+            anchor_t, anchor_w = p_end, done_w
+        else:
+            bounds.append((predicted, predicted))
+
+    segs: list[dict] = []
+    confidence = snapped / float(n - 1) if n > 1 else 1.0
+    score = int(round(confidence * 100))
+    for k, u in enumerate(units):
+        start = t0 if k == 0 else bounds[k - 1][1]
+        end = t1 if k == n - 1 else bounds[k][0]
+        segs.append(
+            {
+                "start": float(start),
+                "end": float(max(end, start)),
+                "text": u["text"],
+                "orig_char_start_local": int(u["start"]),
+                "orig_char_end_local": int(u["end"]),
+                "align_score": score,
+            }
+        )
+    return segs, confidence
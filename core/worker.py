@@ -0,0 +1,141 @@
+# core/worker.py
+"""
+Generation worker: claims jobs from the SQLite queue (core.jobs) and runs them.
+
+  python -m core.worker                    # loop forever, ./data/jobs.sqlite
+  python -m core.worker --once             # drain the queue, then exit
+
+Run as many of these as you like (one node or several sharing the DB file).
+Workers started by the app (--exit-with <app pid>) exit once the app process is gone.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from pathlib import Path
+from typing import Optional
+
+from core.generate import generate_item, configure_caches
+from core.history import append_history
+from core.jobs import JobQueue, Job
+from core.pipeline import TIMING_WHISPER
+from core.ratelimit import configure_rate_limits, rate_limit_db_path
+from core.storage import Storage, get_storage, DEFAULT_DATA_DIR
+
+JOBS_DB_NAME = "jobs.sqlite"
+HEARTBEAT_SECONDS = 10.0
+# how often an idle worker deletes old DONE rows (JobQueue.prune)
+PRUNE_EVERY_SECONDS = 3600.0
+
+
+def default_db_path(data_dir: Optional[Path] = None) -> Path:
+    return Path(data_dir or DEFAULT_DATA_DIR) / JOBS_DB_NAME
+
+
+def run_job(queue: JobQueue, storage: Storage, job: Job, worker: str) -> None:
+    p = job.payload
+
+    stop = threading.Event()
+
+    def beat() -> None:
+        # a single chunk can take a while; keep the claim alive in between progress updates
+        while not stop.wait(HEARTBEAT_SECONDS):
+            queue.heartbeat(job.id, worker)
+
+    hb = threading.Thread(target=beat, name=f"peachy-heartbeat-{job.id[:8]}", daemon=True)
+    hb.start()
+
+    try:
+        record = generate_item(
+            storage,
+            title=p["title"],
+            full_text=p.get("text") or "",
+            voice=p["voice"],
+            speed=float(p["speed"]),
+            item_id=job.item_id,
+            created_at=p.get("created_at"),
+            created_ts=job.created_ts,
+            reuse_from=p.get("reuse_from"),
+            timing=p.get("timing") or TIMING_WHISPER,
+            progressive=bool(p.get("progressive", False)),
+            on_status=lambda msg: queue.progress(job.id, worker, msg),
+            on_progress=lambda done, total: queue.progress(job.id, worker, f"Chunk {done}/{total}", done, total),
+        )
+        append_history(storage, record)
+        queue.complete(job.id, worker)
+    except Exception as e:
+        queue.fail(job.id, worker, f"{type(e).__name__}: {e}\n\n{traceback.format_exc()}")
+    finally:
+        stop.set()
+
+
+def _parent_gone(parent_pid: int) -> bool:
+    # an orphaned process is re-parented (to init / a subreaper), so its ppid changes
+    return os.getppid() != parent_pid
+
+
+def work_loop(
+    queue: JobQueue,
+    storage: Storage,
+    poll_seconds: float = 1.0,
+    once: bool = False,
+    exit_with: Optional[int] = None,
+) -> None:
+    worker_name = f"{socket.gethostname()}:{os.getpid()}"
+    last_prune = 0.0
+    while True:
+        if exit_with is not None and _parent_gone(exit_with):
+            return
+        job = queue.claim(worker_name)
+        if job is None:
+            if once:
+                return
+            if time.monotonic() - last_prune >= PRUNE_EVERY_SECONDS:
+                last_prune = time.monotonic()
+                queue.prune()
+            time.sleep(poll_seconds)
+            continue
+        run_job(queue, storage, job, worker_name)
+
+
+def spawn_local_workers(n: int, db_path: Path, data_dir: Path) -> list[subprocess.Popen]:
+    """
+    Start n `python -m core.worker` processes (used by the app when no external workers
+    are deployed). They finish their current job and exit when this process goes away.
+    """
+    repo_root = Path(__file__).resolve().parent.parent
+    cmd = [sys.executable, "-m", "core.worker", "--db", str(db_path), "--data-dir", str(data_dir)]
+    cmd += ["--exit-with", str(os.getpid())]
+    return [subprocess.Popen(cmd, cwd=str(repo_root)) for _ in range(max(0, int(n)))]
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    ap = argparse.ArgumentParser(prog="python -m core.worker", description="Run Peachy generation jobs.")
+    ap.add_argument("--data-dir", default=None, help="LocalStorage root (default: ./data)")
+    ap.add_argument("--db", default=None, help="job queue SQLite file (default: <data-dir>/jobs.sqlite)")
+    ap.add_argument("--poll", type=float, default=1.0, help="seconds between polls when idle")
+    ap.add_argument("--once", action="store_true", help="exit when the queue is empty")
+    ap.add_argument("--exit-with", type=int, default=None, metavar="PID", help="exit once parent process PID has exited")
+    args = ap.parse_args(argv)
+
+    data_dir = Path(args.data_dir) if args.data_dir else None
+    queue = JobQueue(Path(args.db) if args.db else default_db_path(data_dir))
+    storage = get_storage(data_dir)
+    configure_caches(storage)
+    configure_rate_limits(rate_limit_db_path(data_dir or DEFAULT_DATA_DIR))
+
+    try:
+        work_loop(queue, storage, poll_seconds=args.poll, once=args.once, exit_with=args.exit_with)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,172 @@
+import subprocess
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from core.audio_utils import (
+    PCM_SPEC,
+    PcmArena,
+    StreamingMp3Encoder,
+    encode_mp3_frames,
+    ffmpeg_available,
+    hls_playlist,
+    mp3_audio_frames,
+    mp3_encoder_tag,
+    mp3_info_frame,
+    mp3_samples_per_frame,
+    parse_hls_playlist,
+    parse_mp3_info_frame,
+    split_mp3_frames,
+    whole_frames,
+    write_mp3_frames,
+    write_mp3_segments,
+)
+
+
+def test_arena_views_stay_valid_across_blocks(tmp_path):
+    arena = PcmArena(tmp_path, initial_bytes=8, block_bytes=8)
+    a = arena.add(b"abcdef")
+    b = arena.add(b"ghijkl")  # doesn't fit: goes into a second block
+    assert bytes(a) == b"abcdef" and bytes(b) == b"ghijkl"
+    assert len(list(tmp_path.glob("pcm_arena_*.bin"))) == 2
+    arena.close()
+
+
+def test_arena_close_releases_views_and_deletes_blocks(tmp_path):
+    with PcmArena(tmp_path, initial_bytes=16) as arena:
+        view = arena.add(b"\x01\x02\x03\x04")
+    assert not list(tmp_path.glob("pcm_arena_*.bin"))
+    try:
+        bytes(view)
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("view still usable after close")
+
+
+def test_whole_frames_drops_a_trailing_partial_frame():
+    assert whole_frames(b"\x01\x02\x03", (1, 2, 24000)) == b"\x01\x02"
+    assert whole_frames(b"\x01\x02\x03\x04\x05\x06\x07", (2, 2, 24000)) == b"\x01\x02\x03\x04"
+    data = b"\x01\x02"
+    assert whole_frames(data) is data
+
+
+# ----------------------------
+# MP3 frames / Info frame
+# ----------------------------
+def mp3_frame(kbps_index: int = 8, pad: int = 0) -> bytes:
+    # MPEG-2 Layer III, no CRC, 24 kHz, mono (what PCM_SPEC encodes to); 8 -> 64 kbps
+    h = (0x7FF << 21) | (2 << 19) | (1 << 17) | (1 << 16) | (kbps_index << 12) | (1 << 10) | (pad << 9) | (3 << 6)
+    size = 72 * 64000 // 24000 + pad
+    return h.to_bytes(4, "big") + bytes(size - 4)
+
+
+def test_split_mp3_frames_skips_id3_and_stops_at_junk():
+    id3 = b"ID3\x04\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+    frames = [mp3_frame(), mp3_frame(pad=1), mp3_frame()]
+    out = split_mp3_frames(id3 + b"".join(frames) + b"TAG junk")
+    assert [bytes(f) for f in out] == frames
+
+
+def test_info_frame_round_trips():
+    first = mp3_frame()
+    info = mp3_info_frame(first, n_frames=100, audio_bytes=100 * len(first), delay=576, padding=960, encoder=b"Lavc61.3.")
+    split = split_mp3_frames(info + first)
+    assert len(split) == 2 and bytes(split[0]) == info  # a valid frame in its own right
+
+    tag = parse_mp3_info_frame(info)
+    assert tag == {
+        "frames": 100,
+        "bytes": len(info) + 100 * len(first),
+        "encoder": b"Lavc61.3.",
+        "delay": 576,
+        "padding": 960,
+        "crc_ok": True,
+    }
+    assert parse_mp3_info_frame(first) is None
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="needs ffmpeg")
+def test_encoder_tag_comes_from_the_installed_encoder():
+    encoder, delay = mp3_encoder_tag(PCM_SPEC)
+    assert len(encoder) == 9 and encoder.strip()
+    assert 0 < delay < 4096
+
+
+def decode_samples(mp3: Path) -> int:
+    p = subprocess.run(
+        ["ffmpeg", "-hide_banner", "-loglevel", "error", "-i", str(mp3), "-f", "s16le", "-ac", "1", "pipe:1"],
+        capture_output=True,
+        check=True,
+    )
+    return len(p.stdout) // 2
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="needs ffmpeg")
+def test_parallel_mp3_matches_one_encode_and_decodes_to_the_input_length(tmp_path):
+    ch, sw, fr = PCM_SPEC
+    # ~25 s of a tone, split unevenly across parts: enough frames for 3 slices
+    n = fr * 25 + 123
+    pcm = (np.sin(np.arange(n) * 0.05) * 8000).astype("<i2").tobytes()
+    parts = [pcm[: 2 * 7001], pcm[2 * 7001 : 2 * 300000], pcm[2 * 300000 :]]
+
+    frames, n_samples = encode_mp3_frames(parts, PCM_SPEC, 64, workers=3)
+    single, _ = encode_mp3_frames([pcm], PCM_SPEC, 64, workers=1)
+    assert n_samples == n
+    assert [bytes(f) for f in frames] == [bytes(f) for f in single]
+
+    out = tmp_path / "joined.mp3"
+    write_mp3_frames(frames, n_samples, out, PCM_SPEC)
+    data = out.read_bytes()
+    split = split_mp3_frames(data)
+    tag = parse_mp3_info_frame(split[0])
+    assert tag is not None and tag["crc_ok"]
+    assert tag["frames"] == len(split) - 1 == len(frames)
+    assert tag["bytes"] == len(data)
+    assert (tag["encoder"], tag["delay"]) == mp3_encoder_tag(PCM_SPEC)
+    assert tag["frames"] * mp3_samples_per_frame(fr) == tag["delay"] + n + tag["padding"]
+
+    # the decoder trims delay + padding from the tag: exactly the input comes back
+    assert decode_samples(out) == n
+
+
+@pytest.mark.skipif(not ffmpeg_available(), reason="needs ffmpeg")
+def test_streamed_mp3_without_reservoir_has_the_parallel_frames(tmp_path):
+    n = PCM_SPEC[2] * 6 + 77
+    pcm = (np.sin(np.arange(n) * 0.03) * 8000).astype("<i2").tobytes()
+    enc = StreamingMp3Encoder(tmp_path / "s.mp3", bitrate_kbps=64, reservoir=False)
+    enc.add_pcm(pcm[:20000])
+    enc.add_pcm(pcm[20000:])
+    enc.close()
+
+    streamed = mp3_audio_frames((tmp_path / "s.mp3").read_bytes())
+    parallel, _ = encode_mp3_frames([pcm], PCM_SPEC, 64, workers=1)
+    # the Info frame is dropped, and what's left can be segmented like the parallel encode
+    assert [bytes(f) for f in streamed] == [bytes(f) for f in parallel]
+
+
+# ----------------------------
+# HLS
+# ----------------------------
+def test_hls_playlist_round_trips():
+    segs = [("seg_00000.mp3", 9.984), ("seg_00001.mp3", 9.984), ("seg_00002.mp3", 3.12)]
+    text = hls_playlist(segs)
+    assert text.startswith("#EXTM3U\n") and text.endswith("#EXT-X-ENDLIST\n")
+    assert "#EXT-X-TARGETDURATION:10\n" in text
+    assert parse_hls_playlist(text) == segs
+
+
+def test_parse_hls_playlist_skips_tags_and_bad_durations():
+    text = "#EXTM3U\n#EXTINF:oops,\nlost.mp3\n#EXT-X-DISCONTINUITY\n#EXTINF:2.5,title\n\n  a.mp3  \nstray.mp3\n"
+    assert parse_hls_playlist(text) == [("a.mp3", 2.5)]
+    assert parse_hls_playlist("") == []
+
+
+def test_mp3_segments_cover_every_frame(tmp_path):
+    frames = [memoryview(mp3_frame()) for _ in range(45)]
+    segs = write_mp3_segments(frames, tmp_path, segment_seconds=0.5)  # ~21 frames of 576 @ 24 kHz
+    assert [n for n, _ in segs] == ["seg_00000.mp3", "seg_00001.mp3", "seg_00002.mp3"]
+    assert sum(d for _, d in segs) == pytest.approx(45 * 576 / 24000)
+    joined = b"".join((tmp_path / n).read_bytes() for n, _ in segs)
+    assert joined == b"".join(bytes(f) for f in frames)
@@ -0,0 +1,99 @@
+import os
+import threading
+import time
+
+from core.cache import BlobCache, MemoryLru
+from core.storage import LocalStorage
+
+
+def make_cache(tmp_path, **kw) -> BlobCache:
+    return BlobCache(LocalStorage(tmp_path), prefix="cache/t", ext="bin", content_type="application/octet-stream", **kw)
+
+
+def age(cache: BlobCache, digest: str, seconds_ago: float) -> None:
+    t = time.time() - seconds_ago
+    os.utime(cache.storage.root / cache.key_for(digest), (t, t))
+
+
+def test_eviction_drops_least_recently_used_first(tmp_path):
+    cache = make_cache(tmp_path, max_bytes=20, touch_interval_seconds=60)
+    for d in ("aa01", "bb02", "cc03"):
+        cache.put_bytes(d, b"x" * 10)
+    age(cache, "aa01", 3000)
+    age(cache, "bb02", 2000)
+    age(cache, "cc03", 1000)
+
+    # oldest write, but just read: it's the most recently used now
+    assert cache.get_bytes("aa01") == b"x" * 10
+    assert cache.evict() == 1
+    assert cache.get_bytes("bb02") is None
+    assert cache.get_bytes("aa01") is not None and cache.get_bytes("cc03") is not None
+
+
+def test_hits_touch_at_most_once_per_interval(tmp_path):
+    cache = make_cache(tmp_path, touch_interval_seconds=3600)
+    cache.put_bytes("aa01", b"x")
+    age(cache, "aa01", 600)
+    before = cache.storage.stat(cache.key_for("aa01")).mtime
+
+    cache.get_bytes("aa01")
+    assert cache.storage.stat(cache.key_for("aa01")).mtime == before
+
+
+def test_age_limit_applies_to_last_use(tmp_path):
+    cache = make_cache(tmp_path, max_age_seconds=100, touch_interval_seconds=10)
+    cache.put_bytes("aa01", b"x")
+    cache.put_bytes("bb02", b"y")
+    age(cache, "aa01", 500)
+    age(cache, "bb02", 500)
+
+    cache.get_bytes("aa01")
+    assert cache.evict() == 1
+    assert cache.get_bytes("aa01") == b"x"
+
+
+def test_memory_lru_evicts_least_recently_used_by_size():
+    lru = MemoryLru(max_bytes=10)
+    lru.put("a", "A", 4)
+    lru.put("b", "B", 4)
+    assert lru.get("a") == "A"  # b is now the least recently used
+
+    lru.put("c", "C", 4)
+    assert lru.get("b") is None
+    assert lru.get("a") == "A" and lru.get("c") == "C"
+    assert lru.stats() == {"entries": 2, "bytes": 8, "hits": 3, "misses": 1}
+
+
+def test_memory_lru_replacing_a_key_recounts_its_size():
+    lru = MemoryLru(max_bytes=10)
+    lru.put("a", "A", 8)
+    lru.put("a", "A2", 2)
+    lru.put("b", "B", 8)
+    assert lru.get("a") == "A2"
+    assert lru.stats()["bytes"] == 10
+
+
+def test_memory_lru_skips_values_larger_than_the_budget():
+    lru = MemoryLru(max_bytes=10)
+    lru.put("a", "A", 5)
+    lru.put("big", "X", 11)
+    assert lru.get("big") is None
+    assert lru.get("a") == "A"
+
+
+def test_memory_lru_stays_within_budget_under_concurrent_puts():
+    lru = MemoryLru(max_bytes=100)
+
+    def worker(n: int) -> None:
+        for i in range(500):
+            lru.put((n, i % 50), i, 3)
+            lru.get((n, (i * 7) % 50))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = lru.stats()
+    assert stats["bytes"] <= 100 and stats["bytes"] == 3 * stats["entries"]
+    assert stats["hits"] + stats["misses"] == 8 * 500
@@ -0,0 +1,116 @@
+import math
+import shutil
+import struct
+
+import pytest
+
+from core import checkpoints as checkpoints_mod
+from core.audio_utils import PCM_SPEC, encode_mp3_parallel, pcm_to_wav_bytes, wav_bytes_to_pcm
+from core.checkpoints import RETAIN_AUDIO, ChunkCheckpoints
+from core.storage import LocalStorage
+
+RATE = PCM_SPEC[2]
+
+
+def tone(seconds: float, hz: float) -> bytes:
+    n = int(seconds * RATE)
+    return struct.pack(f"<{n}h", *(int(8000 * math.sin(2 * math.pi * hz * i / RATE)) for i in range(n)))
+
+
+def finished_item(storage, prefix, parts, audio):
+    """
+    A finished item: manifest with chunk offsets, .json results, master audio, chunk audio pruned.
+    """
+    ckpt = ChunkCheckpoints(storage, prefix)
+    chunks, offset = [], 0.0
+    for i, pcm in enumerate(parts):
+        dur = len(pcm) / (2.0 * RATE)
+        ckpt.save_wav_bytes(i, f"fp{i}", pcm_to_wav_bytes(pcm))
+        ckpt.save_stt(i, f"fp{i}", {"text": ""})
+        ckpt.save_result(i, f"fp{i}", dur, [{"start": 0.0, "end": dur}])
+        chunks.append({"index": i, "duration_seconds": dur, "audio_offset_seconds": offset})
+        offset += dur
+    storage.write_bytes(audio["key"], audio.pop("data"))
+    storage.write_json(f"{prefix}/manifest.json", {"chunks": chunks, "audio": audio})
+    assert ckpt.prune_media() == 2 * len(parts)
+    return ckpt
+
+
+def test_prune_media_keeps_only_results(tmp_path):
+    storage = LocalStorage(tmp_path)
+    parts = [tone(0.5, 440), tone(0.25, 660)]
+    wav = pcm_to_wav_bytes(b"".join(parts))
+    finished_item(storage, "items/a", parts, {"format": "wav", "key": "items/a/audio.wav", "data": wav})
+
+    left = sorted(o.key for o in storage.list_objects("items/a/chunks/"))
+    assert left == ["items/a/chunks/0000-fp0.json", "items/a/chunks/0001-fp1.json"]
+
+
+def test_adopt_cuts_pruned_chunk_from_wav_master(tmp_path):
+    storage = LocalStorage(tmp_path)
+    parts = [tone(0.5, 440), tone(0.25, 660), tone(0.4, 550)]
+    wav = pcm_to_wav_bytes(b"".join(parts))
+    prior = finished_item(storage, "items/a", parts, {"format": "wav", "key": "items/a/audio.wav", "data": wav})
+
+    new = ChunkCheckpoints(storage, "items/b")
+    assert new.adopt(prior, 1, 0, "fp1")
+    pcm, spec = wav_bytes_to_pcm(new.load_wav_bytes(0, "fp1"))
+    assert spec == PCM_SPEC and pcm == parts[1]
+    assert new.load_result(0, "fp1")["index"] == 0
+
+    assert not new.adopt(prior, 7, 1, "fp7")
+
+
+@pytest.mark.skipif(not shutil.which("ffmpeg"), reason="needs ffmpeg")
+def test_adopt_cuts_pruned_chunk_from_mp3_master(tmp_path):
+    storage = LocalStorage(tmp_path)
+    parts = [tone(1.0, 440), tone(0.75, 660), tone(0.5, 550)]
+    mp3 = tmp_path / "master.mp3"
+    encode_mp3_parallel(parts, mp3, bitrate_kbps=64, workers=2, spec=PCM_SPEC)
+    prior = finished_item(
+        storage, "items/a", parts, {"format": "mp3", "key": "items/a/audio.mp3", "data": mp3.read_bytes()}
+    )
+
+    new = ChunkCheckpoints(storage, "items/b")
+    assert new.adopt(prior, 1, 0, "fp1")
+    pcm, _ = wav_bytes_to_pcm(new.load_wav_bytes(0, "fp1"))
+    # sample-exact length; lossy content, so only roughly the same signal
+    assert len(pcm) == len(parts[1])
+    got = struct.unpack(f"<{len(pcm) // 2}h", pcm)
+    want = struct.unpack(f"<{len(parts[1]) // 2}h", parts[1])
+    err = sum((a - b) ** 2 for a, b in zip(got, want)) / sum(b * b for b in want)
+    assert err < 0.05
+
+
+def test_audio_retention_keeps_chunk_wavs_for_lossless_reuse(tmp_path):
+    storage = LocalStorage(tmp_path)
+    prior = ChunkCheckpoints(storage, "items/a", preview_kbps=64 if shutil.which("ffmpeg") else None)
+    prior.save_wav_bytes(0, "fp0", pcm_to_wav_bytes(tone(0.25, 440)))
+    prior.save_stt(0, "fp0", {"text": ""})
+    prior.save_result(0, "fp0", 0.25, [])
+    prior.prune_media(RETAIN_AUDIO)
+
+    left = sorted(o.key for o in storage.list_objects("items/a/chunks/"))
+    assert left == ["items/a/chunks/0000-fp0.json", "items/a/chunks/0000-fp0.wav"]
+    new = ChunkCheckpoints(storage, "items/b")
+    assert new.adopt(prior, 0, 0, "fp0")
+    assert new.load_wav_bytes(0, "fp0") == prior.load_wav_bytes(0, "fp0")
+
+
+def test_adopting_many_chunks_decodes_the_master_once(tmp_path, monkeypatch):
+    storage = LocalStorage(tmp_path)
+    parts = [tone(0.2, 440), tone(0.3, 660), tone(0.1, 550)]
+    master = b"".join(parts)
+    prior = finished_item(storage, "items/a", parts, {"format": "mp3", "key": "items/a/audio.mp3", "data": b"mp3"})
+    decodes = []
+
+    def fake_decode(data, start, end, spec):
+        decodes.append((data, start, end))
+        return master
+
+    monkeypatch.setattr(checkpoints_mod, "decode_audio_range", fake_decode)
+    new = ChunkCheckpoints(storage, "items/b")
+    for i in (2, 0, 1):
+        assert new.adopt(prior, i, i, f"fp{i}")
+        assert wav_bytes_to_pcm(new.load_wav_bytes(i, f"fp{i}"))[0] == parts[i]
+    assert decodes == [(b"mp3", 0, None)]
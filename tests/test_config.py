@@ -0,0 +1,15 @@
+import pytest
+
+from core.config import get_number
+
+
+def test_get_number_falls_back_on_blank_or_malformed_values(monkeypatch):
+    monkeypatch.setenv("PEACHY_TEST_N", "2.5")
+    assert get_number("PEACHY_TEST_N", 10.0) == 2.5
+    monkeypatch.setenv("PEACHY_TEST_N", " ")
+    assert get_number("PEACHY_TEST_N", 10.0) == 10.0
+    monkeypatch.setenv("PEACHY_TEST_N", "ten")
+    with pytest.warns(UserWarning, match="PEACHY_TEST_N"):
+        assert get_number("PEACHY_TEST_N", 4, int) == 4
+    monkeypatch.delenv("PEACHY_TEST_N")
+    assert get_number("PEACHY_TEST_N", 4, int) == 4
@@ -0,0 +1,201 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+
+from core import history as history_mod
+from core.history import LEASE_KEY, LOG_PREFIX, TZ, LogHistoryStore, SqliteHistoryStore, record_ts
+from core.storage import LocalStorage
+
+T0 = 1_740_000_000.0  # 2025-02-19
+
+
+def rec(n: int, ts: float, title: str = "", voice: str = "nova") -> dict:
+    return {"id": f"i{n:03d}", "title": title or f"Item {n}", "voice": voice, "created_ts": ts, "item_dir": f"items/i{n:03d}"}
+
+
+@pytest.fixture(params=["sqlite", "log"])
+def store(request, tmp_path):
+    storage = LocalStorage(tmp_path)
+    return SqliteHistoryStore(storage) if request.param == "sqlite" else LogHistoryStore(storage, compact_after=4)
+
+
+@pytest.fixture(params=["sqlite", "sqlite-like", "log"])
+def search_store(request, tmp_path):
+    storage = LocalStorage(tmp_path)
+    if request.param == "log":
+        return LogHistoryStore(storage)
+    store = SqliteHistoryStore(storage)
+    store.fts = request.param == "sqlite"  # sqlite-like: the scan used when SQLite lacks FTS5
+    return store
+
+
+def pt(*args) -> float:
+    return datetime(*args, tzinfo=TZ).timestamp()
+
+
+def ids(records: list[dict]) -> list[str]:
+    return [r["id"] for r in records]
+
+
+def test_pages_follow_the_cursor_newest_first(store):
+    # three records share a timestamp: the id breaks the tie, so the cursor can't skip or repeat them
+    records = [rec(n, T0 + (n if n < 5 else 5)) for n in range(10)]
+    for r in records:
+        store.append(r)
+    expected = ids(sorted(records, key=lambda r: (-r["created_ts"], r["id"])))
+
+    seen: list[str] = []
+    cursor = None
+    while True:
+        batch = store.page(3, cursor)
+        seen.extend(ids(batch))
+        if len(batch) < 3:
+            break
+        cursor = (record_ts(batch[-1]), batch[-1]["id"])
+    assert seen == expected
+    assert ids(store.all()) == expected
+    assert store.count() == 10
+
+
+def test_append_replaces_by_id_and_latest_by_title(store):
+    store.append(rec(1, T0, "Same"))
+    store.append(rec(2, T0 + 10, "Same"))
+    store.append({**rec(1, T0), "title": "Renamed"})
+    assert store.count() == 2
+    assert store.get("i001")["title"] == "Renamed"
+    assert store.latest_by_title("Same")["id"] == "i002"
+    assert store.get("missing") is None
+
+
+def test_search_matches_word_prefixes_and_pages(store):
+    for n, title in enumerate(["Interview prep", "Interval training", "Cooking", "Interview recap"]):
+        store.append(rec(n, T0 + n, title))
+
+    assert ids(store.search("interv")) == ["i003", "i001", "i000"]
+    assert ids(store.search("INTERVIEW prep")) == ["i000"]
+    assert store.search("view") == []
+    assert ids(store.search("")) == ids(store.page())
+
+    first = store.search("interv", limit=2)
+    cursor = (record_ts(first[-1]), first[-1]["id"])
+    assert ids(store.search("interv", limit=2, before=cursor)) == ["i000"]
+
+
+def test_concurrent_appends_keep_every_record(store):
+    def worker(w: int) -> None:
+        for i in range(10):
+            store.append(rec(w * 100 + i, T0 + i, f"W{w}"))
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert store.count() == 40
+
+
+def test_concurrent_compactions_lose_nothing(tmp_path):
+    storage = LocalStorage(tmp_path)
+    # one store per writer, as in separate processes sharing the bucket
+    stores = [LogHistoryStore(storage, compact_after=3) for _ in range(4)]
+
+    def worker(w: int) -> None:
+        for i in range(15):
+            stores[w].append(rec(w * 100 + i, T0 + i))
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    stores[0].compact()
+    assert storage.list_objects(LOG_PREFIX) == []
+    fresh = LogHistoryStore(storage)
+    assert fresh.count() == 60
+    assert sorted(ids(fresh.all())) == sorted(f"i{w * 100 + i:03d}" for w in range(4) for i in range(15))
+
+
+def test_legacy_history_json_is_imported_once(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.write_json("history.json", [rec(1, T0), rec(2, T0 + 1), {"title": "no id"}])
+    assert ids(SqliteHistoryStore(storage).all()) == ["i002", "i001"]
+    assert ids(LogHistoryStore(storage).all()) == ["i002", "i001"]
+
+    storage.write_json("history.json", [rec(3, T0)])
+    assert SqliteHistoryStore(storage).count() == 2
+
+
+def test_date_terms_search_the_creation_date_not_its_digits(search_store):
+    search_store.append(rec(1, pt(2025, 3, 20, 10, 0), "Standup"))
+    search_store.append(rec(2, pt(2025, 4, 3, 9, 3), "Review"))  # day 03, minute 03
+    search_store.append(rec(3, pt(2025, 3, 3, 23, 30), "Plan"))
+    search_store.append(rec(4, pt(2025, 3, 31, 23, 59), "Review"))
+
+    assert ids(search_store.search("2025-03")) == ["i004", "i001", "i003"]
+    assert ids(search_store.search("2025-04-03")) == ["i002"]
+    assert ids(search_store.search("review 2025-3")) == ["i004"]
+    assert search_store.search("review 2025-02") == []
+
+    first = search_store.search("2025-03", limit=2)
+    cursor = (record_ts(first[-1]), first[-1]["id"])
+    assert ids(search_store.search("2025-03", limit=2, before=cursor)) == ["i003"]
+
+
+def test_search_ignores_fields_other_than_title_and_date(search_store):
+    search_store.append(rec(1, pt(2025, 3, 20, 10, 0), "Standup", voice="nova"))
+    assert search_store.search("nova") == []
+    assert search_store.search("items") == []
+    assert ids(search_store.search("stand")) == ["i001"]
+
+
+class NoCasStorage(LocalStorage):
+    """
+    Storage whose compare_and_swap checks, then writes (as B2Storage without conditional writes).
+    """
+
+    def conditional_writes_supported(self) -> bool:
+        return False
+
+    def compare_and_swap(self, key, data, if_match, content_type=None) -> bool:
+        cur = self.stat(key)
+        if (cur.etag if cur is not None else None) != if_match:
+            return False
+        time.sleep(0.005)  # room for a racing writer
+        self.write_bytes(key, data, content_type=content_type)
+        return True
+
+
+def test_log_is_compacted_under_a_lease_without_conditional_writes(tmp_path):
+    storage = NoCasStorage(tmp_path)
+    stores = [LogHistoryStore(storage, compact_after=3, lease_settle=0.05) for _ in range(4)]
+
+    def worker(w: int) -> None:
+        for i in range(15):
+            stores[w].append(rec(w * 100 + i, T0 + i))
+
+    threads = [threading.Thread(target=worker, args=(w,)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(storage.list_objects(LOG_PREFIX)) < 60  # compacted along the way
+    assert not storage.exists(LEASE_KEY)
+    assert LogHistoryStore(storage).count() == 60
+
+
+def test_held_lease_skips_compaction_and_a_long_log_warns(tmp_path, monkeypatch):
+    monkeypatch.setattr(history_mod, "LOG_WARN_AFTER", 4)
+    storage = NoCasStorage(tmp_path)
+    storage.write_json(LEASE_KEY, {"owner": "someone-else", "expires": time.time() + 60})
+    store = LogHistoryStore(storage, compact_after=2, lease_settle=0.0)
+    for n in range(3):
+        store.append(rec(n, T0 + n))
+    assert len(storage.list_objects(LOG_PREFIX)) == 3
+
+    with pytest.warns(RuntimeWarning, match="4 uncompacted"):
+        store.append(rec(3, T0 + 3))
+    assert store.count() == 4
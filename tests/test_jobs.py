@@ -0,0 +1,104 @@
+import sqlite3
+import time
+
+from core import jobs
+from core.jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue
+
+
+def test_claim_takes_oldest_queued_job_once(tmp_path):
+    q = JobQueue(tmp_path / "jobs.sqlite")
+    first = q.enqueue({"title": "a"})
+    second = q.enqueue({"title": "b"})
+
+    got = q.claim("w1")
+    assert got.id == first.id and got.status == RUNNING and got.attempts == 1
+    assert q.claim("w2").id == second.id
+    assert q.claim("w3") is None
+
+
+def test_stale_job_is_reclaimed_and_old_worker_cannot_finish_it(tmp_path, monkeypatch):
+    q = JobQueue(tmp_path / "jobs.sqlite")
+    job = q.enqueue({"title": "a"})
+    assert q.claim("slow").id == job.id
+
+    monkeypatch.setattr(jobs, "STALE_AFTER_SECONDS", -1.0)
+    again = q.claim("fast")
+    assert again.id == job.id and again.attempts == 2
+
+    # the original worker wakes up late: none of its updates land
+    assert not q.heartbeat(job.id, "slow")
+    assert not q.progress(job.id, "slow", "Chunk 1/2", 1, 2)
+    assert not q.fail(job.id, "slow", "boom")
+    assert q.get(job.id).status == RUNNING
+
+    assert q.complete(job.id, "fast")
+    assert q.get(job.id).status == DONE
+    assert not q.complete(job.id, "fast")
+
+
+def test_list_retry_and_dismiss_are_scoped_to_owner(tmp_path):
+    q = JobQueue(tmp_path / "jobs.sqlite")
+    mine = q.enqueue({"title": "mine"}, owner="me")
+    theirs = q.enqueue({"title": "theirs"}, owner="you")
+
+    assert [j.id for j in q.list_jobs((QUEUED,), owner="me")] == [mine.id]
+    assert {j.id for j in q.list_jobs((QUEUED,))} == {mine.id, theirs.id}
+
+    for _ in range(2):
+        job = q.claim("w")
+        q.fail(job.id, "w", "boom")
+    q.retry(theirs.id, owner="me")
+    q.dismiss(theirs.id, owner="me")
+    assert q.get(theirs.id).status == FAILED
+
+    q.retry(mine.id, owner="me")
+    assert q.get(mine.id).status == QUEUED
+
+
+def test_prune_deletes_only_old_done_jobs(tmp_path):
+    q = JobQueue(tmp_path / "jobs.sqlite")
+    old = q.enqueue({"title": "old"})
+    q.claim("w")
+    q.complete(old.id, "w")
+    queued = q.enqueue({"title": "queued"})
+
+    assert q.prune(older_than_seconds=3600) == 0
+    time.sleep(0.01)
+    assert q.prune(older_than_seconds=0) == 1
+    assert q.get(old.id) is None
+    assert q.get(queued.id) is not None
+
+
+def test_owner_column_is_added_to_existing_queue_files(tmp_path):
+    db = tmp_path / "jobs.sqlite"
+    c = sqlite3.connect(db)
+    c.executescript(jobs._SCHEMA.replace("    owner          TEXT,\n", ""))
+    c.execute(
+        "INSERT INTO jobs (id, item_id, status, payload, created_ts, updated_ts) VALUES ('j', 'i', ?, '{}', 1, 1)",
+        (QUEUED,),
+    )
+    c.commit()
+    c.close()
+
+    q = JobQueue(db)
+    assert q.get("j").owner is None
+    assert q.enqueue({}, owner="me").owner == "me"
+
+
+def test_job_that_keeps_going_stale_is_failed_after_max_attempts(tmp_path, monkeypatch):
+    q = JobQueue(tmp_path / "jobs.sqlite", max_attempts=2)
+    job = q.enqueue({"title": "a"})
+    monkeypatch.setattr(jobs, "STALE_AFTER_SECONDS", -1.0)
+
+    assert q.claim("w1").attempts == 1
+    assert q.claim("w2").attempts == 2
+    q.progress(job.id, "w2", "Chunk 3/9")
+    assert q.claim("w3") is None
+
+    failed = q.get(job.id)
+    assert failed.status == FAILED and failed.attempts == 2
+    assert "2 times" in failed.error and "Chunk 3/9" in failed.error
+
+    # a manual retry starts the count over
+    q.retry(job.id)
+    assert q.claim("w4").attempts == 1
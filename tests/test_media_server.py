@@ -0,0 +1,96 @@
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+import pytest
+
+from core.media_server import media_server_healthy, make_media_server, parse_range
+from core.storage import LocalStorage
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-99", (0, 100)),
+        ("bytes=100-", (100, 1000)),
+        ("bytes=900-5000", (900, 1000)),
+        ("bytes=-100", (900, 1000)),
+        ("bytes=-5000", (0, 1000)),
+        ("BYTES = 5-5", (5, 6)),
+        ("bytes=1000-", "unsatisfiable"),
+        ("bytes=-0", "unsatisfiable"),
+        ("bytes=0-1,5-9", None),
+        ("bytes=9-5", None),
+        ("bytes=a-b", None),
+        ("items=0-1", None),
+        ("bytes=5", None),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.fixture
+def server(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.write_bytes("items/a/audio.mp3", bytes(range(256)) * 4, content_type="audio/mpeg")
+    storage.write_text("items/a/full.txt", "private text")
+    storage.write_json("items/a/manifest.json", {"id": "a"})
+    srv = make_media_server(storage, port=0)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def base_url(srv) -> str:
+    return f"http://127.0.0.1:{srv.server_port}"
+
+
+def test_binds_to_localhost_by_default(server):
+    assert server.server_address[0] == "127.0.0.1"
+    assert media_server_healthy(base_url(server))
+    assert not media_server_healthy("http://127.0.0.1:9/")
+
+
+def test_serves_audio_ranges(server):
+    req = urllib.request.Request(base_url(server) + "/items/a/audio.mp3", headers={"Range": "bytes=10-19"})
+    with urllib.request.urlopen(req) as r:
+        assert r.status == 206
+        assert r.headers["Content-Range"] == "bytes 10-19/1024"
+        assert r.headers["Content-Type"] == "audio/mpeg"
+        assert r.read() == bytes(range(10, 20))
+
+
+@pytest.mark.parametrize("path", ["/items/a/full.txt", "/items/a/manifest.json", "/items/../items/a/audio.mp3", "/x.mp3"])
+def test_serves_nothing_but_item_media(server, path):
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(base_url(server) + path)
+    assert e.value.code == 404
+
+
+def test_only_currently_versioned_audio_urls_are_immutable(server):
+    storage = server.RequestHandlerClass.storage
+    with urllib.request.urlopen(base_url(server) + "/items/a/audio.mp3") as r:
+        assert r.headers["Cache-Control"] == "no-cache"
+        etag = r.headers["ETag"]
+    version = storage.stat("items/a/manifest.json").etag
+    current = base_url(server) + "/items/a/audio.mp3?" + urlencode({"v": version})
+    with urllib.request.urlopen(current) as r:
+        assert "immutable" in r.headers["Cache-Control"]
+    with urllib.request.urlopen(base_url(server) + "/items/a/audio.mp3?v=%22abc%22") as r:
+        assert r.headers["Cache-Control"] == "no-cache"
+
+    # the item is regenerated: the old version's URL is no longer cacheable for good
+    time.sleep(0.01)
+    storage.write_json("items/a/manifest.json", {"id": "a", "rev": 2})
+    assert storage.stat("items/a/manifest.json").etag != version
+    with urllib.request.urlopen(current) as r:
+        assert r.headers["Cache-Control"] == "no-cache"
+
+    req = urllib.request.Request(base_url(server) + "/items/a/audio.mp3", headers={"If-None-Match": etag})
+    with pytest.raises(urllib.error.HTTPError) as e:
+        urllib.request.urlopen(req)
+    assert e.value.code == 304
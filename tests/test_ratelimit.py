@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from core.ratelimit import (
+    MAX_WAIT_SECONDS,
+    OK,
+    SERVER_ERROR,
+    THROTTLED,
+    AdaptiveLimiter,
+    LimiterConfig,
+    SqliteTokenBucket,
+)
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+def limiter(**kw) -> AdaptiveLimiter:
+    return AdaptiveLimiter("t", LimiterConfig(**kw))
+
+
+def test_bucket_allows_a_burst_then_paces_at_the_rate():
+    lim = limiter(requests_per_minute=60.0, burst=3.0, max_concurrency=100)
+    for _ in range(3):
+        assert lim._try_acquire() == 0.0
+    wait = lim._try_acquire()
+    assert 0.9 < wait <= 1.0
+
+
+def test_concurrency_window_caps_calls_in_flight():
+    lim = limiter(requests_per_minute=6000.0, burst=100.0, max_concurrency=2)
+    assert lim._try_acquire() == 0.0
+    assert lim._try_acquire() == 0.0
+    assert lim._try_acquire() > 0.0
+    lim.release(OK)
+    assert lim._try_acquire() == 0.0
+
+
+def test_aimd_halves_once_per_cooldown_and_grows_back():
+    lim = limiter(max_concurrency=16, decrease_cooldown=60.0, throttle_pause=0.0)
+    lim._in_flight = 3
+    lim.release(SERVER_ERROR)
+    lim.release(SERVER_ERROR)  # same congestion event: no second halving
+    assert lim.metrics()["concurrency_limit"] == 8
+
+    # additive increase: +1/limit per success, so a little over `limit` successes per step
+    for _ in range(9):
+        lim._in_flight = 1
+        lim.release(OK)
+    assert lim.metrics()["concurrency_limit"] == 9
+
+
+def test_throttle_pauses_new_calls():
+    lim = limiter(throttle_pause=30.0)
+    with pytest.raises(Throttled):
+        with lim.slot():
+            raise Throttled()
+    m = lim.metrics()
+    assert m["count_throttled"] == 1 and m["paused_for"] > 29.0
+    assert lim._try_acquire() > 29.0
+
+
+def test_shared_bucket_is_shared_across_instances(tmp_path):
+    a = SqliteTokenBucket(tmp_path / "rl.sqlite")
+    b = SqliteTokenBucket(tmp_path / "rl.sqlite")
+    assert a.take("tts", rate_per_sec=1.0, burst=2.0) == 0.0
+    assert b.take("tts", rate_per_sec=1.0, burst=2.0) == 0.0
+    assert a.take("tts", rate_per_sec=1.0, burst=2.0) > 0.0
+    assert b.take("stt", rate_per_sec=1.0, burst=2.0) == 0.0
+
+    a.publish("tts", {"in_flight": 1})
+    assert [m["in_flight"] for m in b.read_metrics()] == [1]
+
+
+def test_waiter_wakes_on_release_not_on_a_timer():
+    lim = limiter(requests_per_minute=6000.0, burst=100.0, max_concurrency=1)
+    lim.acquire()
+    got = []
+
+    def waiter() -> None:
+        lim.acquire()
+        got.append(time.monotonic())
+
+    t = threading.Thread(target=waiter)
+    t.start()
+    time.sleep(0.1)
+    assert not got and lim.congested()
+    released = time.monotonic()
+    lim.release(OK)
+    t.join(2.0)
+    assert got and got[0] - released < MAX_WAIT_SECONDS / 2
+
+
+def test_async_waiter_wakes_on_release():
+    lim = limiter(requests_per_minute=6000.0, burst=100.0, max_concurrency=1)
+
+    async def main() -> float:
+        await lim.acquire_async()
+        waiter = asyncio.ensure_future(lim.acquire_async())
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        released = time.monotonic()
+        # released from another thread, as the hedging pool does
+        threading.Thread(target=lim.release, args=(OK,)).start()
+        await asyncio.wait_for(waiter, 2.0)
+        return time.monotonic() - released
+
+    assert asyncio.run(main()) < MAX_WAIT_SECONDS / 2
+
+
+def test_shared_bucket_stays_off_the_event_loop():
+    class SlowBucket:
+        def take(self, name, rate_per_sec, burst):
+            time.sleep(0.3)  # another process holds the SQLite lock
+            return 0.0
+
+        def publish(self, name, data):
+            time.sleep(0.3)
+
+    lim = AdaptiveLimiter("t", LimiterConfig(), shared=SlowBucket())
+
+    async def main() -> int:
+        ticks = 0
+
+        async def ticker() -> None:
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        tick = asyncio.ensure_future(ticker())
+        async with lim.slot_async():
+            pass
+        tick.cancel()
+        return ticks
+
+    # ~0.6 s of SQLite waits; the loop kept running through them
+    assert asyncio.run(main()) >= 20
@@ -0,0 +1,86 @@
+import asyncio
+import time
+
+import pytest
+
+from core.ratelimit import AdaptiveLimiter, LimiterConfig
+from core.retry import HedgePolicy, LatencyTracker, RetryPolicy, call_with_retry, hedged_call, hedged_call_async
+
+FAST_HEDGE = HedgePolicy(quantile=0.5, min_samples=3, min_delay=0.05)
+
+
+class Status(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def warm_tracker(seconds: float = 0.01) -> LatencyTracker:
+    t = LatencyTracker()
+    for _ in range(5):
+        t.record(seconds)
+    return t
+
+
+def slow_first(calls: list, seconds: float = 0.3):
+    def fn(n: int) -> int:
+        calls.append(n)
+        if n == 0:
+            time.sleep(seconds)
+        return n
+
+    return fn
+
+
+def test_retry_retries_retryable_errors_only():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise Status(503)
+        return "ok"
+
+    assert call_with_retry(flaky, RetryPolicy(max_attempts=4, base_delay=0.0)) == "ok"
+    assert len(calls) == 3
+
+    with pytest.raises(Status):
+        call_with_retry(lambda: (_ for _ in ()).throw(Status(400)), RetryPolicy(base_delay=0.0))
+
+
+def test_slow_request_is_hedged():
+    calls = []
+    assert hedged_call(slow_first(calls), warm_tracker(), FAST_HEDGE) == 1
+    assert sorted(calls) == [0, 1]
+
+
+def test_no_hedge_while_limiter_is_congested():
+    calls = []
+    lim = AdaptiveLimiter("t", LimiterConfig(max_concurrency=1))
+    assert hedged_call(slow_first(calls), warm_tracker(), FAST_HEDGE, limiter=lim) == 0
+    assert calls == [0]
+
+
+def test_limiter_wait_is_not_counted_as_latency():
+    lim = AdaptiveLimiter("t", LimiterConfig())
+    lim._paused_until = time.monotonic() + 0.3
+    tracker = LatencyTracker()
+    hedged_call(lambda n: n, tracker, HedgePolicy(enabled=False), limiter=lim)
+    assert tracker.threshold(1.0, min_samples=1) < 0.1
+
+
+def test_async_no_hedge_while_limiter_is_congested():
+    calls = []
+
+    async def fn(n: int) -> int:
+        calls.append(n)
+        if n == 0:
+            await asyncio.sleep(0.3)
+        return n
+
+    lim = AdaptiveLimiter("t", LimiterConfig(max_concurrency=1))
+    assert asyncio.run(hedged_call_async(fn, warm_tracker(), FAST_HEDGE, limiter=lim)) == 0
+    assert calls == [0]
+
+    calls.clear()
+    assert asyncio.run(hedged_call_async(fn, warm_tracker(), FAST_HEDGE)) == 1
+    assert sorted(calls) == [0, 1]
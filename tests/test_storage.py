@@ -0,0 +1,242 @@
+import json
+import os
+import stat
+import sys
+import threading
+from datetime import datetime, timezone
+
+import pytest
+from botocore.exceptions import ClientError
+
+from core import storage as storage_mod
+from core.storage import B2Storage, ConflictError, LocalStorage, update_json
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="POSIX permissions")
+def test_written_files_get_umask_permissions(tmp_path):
+    mask = os.umask(0)
+    os.umask(mask)
+    assert storage_mod._FILE_MODE == 0o666 & ~mask
+
+    storage = LocalStorage(tmp_path)
+    storage.write_bytes("a/b.bin", b"x")
+    storage.write_bytes("a/b.bin", b"y")
+    # not mkstemp's 0600
+    assert stat.S_IMODE((tmp_path / "a" / "b.bin").stat().st_mode) == 0o666 & ~mask
+
+
+def test_touch_bumps_mtime_not_content(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.write_bytes("k", b"data")
+    os.utime(tmp_path / "k", (1000, 1000))
+
+    storage.touch("k")
+    assert storage.stat("k").mtime > 1000
+    assert storage.read_bytes("k") == b"data"
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_forked_children_get_their_own_s3_client():
+    args = ("https://s3.example.invalid", "key", "secret", 4, 2)
+    parent = storage_mod._s3_client(*args)
+    assert storage_mod._s3_client(*args) is parent
+
+    r, w = os.pipe()
+    pid = os.fork()
+    if pid == 0:  # child
+        ok = storage_mod._s3_client.cache_info().currsize == 0 and storage_mod._s3_client(*args) is not parent
+        os.write(w, b"1" if ok else b"0")
+        os._exit(0)
+    os.close(w)
+    os.waitpid(pid, 0)
+    assert os.read(r, 1) == b"1"
+    os.close(r)
+    assert storage_mod._s3_client(*args) is parent
+
+
+def test_compare_and_swap_needs_the_current_etag(tmp_path):
+    storage = LocalStorage(tmp_path)
+    assert storage.compare_and_swap("k", b"1", None)
+    assert not storage.compare_and_swap("k", b"2", None)  # create, but it exists
+
+    data, etag = storage.read_with_etag("k")
+    assert storage.compare_and_swap("k", b"2", etag)
+    assert not storage.compare_and_swap("k", b"3", etag)  # stale
+    assert storage.read_bytes("k") == b"2"
+
+
+def test_update_json_reapplies_after_a_conflicting_write(tmp_path):
+    storage = LocalStorage(tmp_path)
+    storage.write_json("doc.json", {"n": 0})
+    calls = []
+
+    def bump(obj):
+        calls.append(dict(obj))
+        if len(calls) == 1:
+            # another writer lands between our read and our write
+            storage.write_json("doc.json", {"n": 10})
+        return {"n": obj["n"] + 1}
+
+    assert update_json(storage, "doc.json", bump) == {"n": 11}
+    assert calls == [{"n": 0}, {"n": 10}]
+    assert storage.read_json("doc.json", None) == {"n": 11}
+
+
+def test_update_json_gives_up_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_mod, "CAS_BASE_DELAY_SECONDS", 0.0)
+    storage = LocalStorage(tmp_path)
+    calls = []
+
+    def always_loses(obj):
+        calls.append(obj)
+        storage.write_json("doc.json", {"other": len(calls)})
+        return {"mine": True}
+
+    with pytest.raises(ConflictError):
+        update_json(storage, "doc.json", always_loses, default={}, max_attempts=3)
+    assert len(calls) == 3
+    assert storage.read_json("doc.json", None) == {"other": 3}
+
+
+def test_concurrent_update_json_loses_no_increment(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage_mod, "CAS_BASE_DELAY_SECONDS", 0.001)
+    storage = LocalStorage(tmp_path)
+
+    def worker() -> None:
+        for _ in range(10):
+            update_json(storage, "count.json", lambda n: n + 1, default=0, max_attempts=100)
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert storage.read_json("count.json", None) == 60
+
+
+class FakeS3:
+    """
+    put/head/get/delete of an S3 endpoint whose conditional writes are "enforced",
+    "ignored", or "rejected" (501), or whose If-Match alone is refused ("no-if-match", 400).
+    """
+
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self.objects: dict[str, bytes] = {}
+        self.versions: dict[str, int] = {}
+
+    @staticmethod
+    def _error(code: str, status: int) -> ClientError:
+        return ClientError({"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}, "op")
+
+    def _etag(self, key: str) -> str:
+        return f'"{self.versions[key]}"'
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, IfNoneMatch=None, IfMatch=None):
+        if self.mode == "rejected" and (IfNoneMatch or IfMatch):
+            raise self._error("NotImplemented", 501)
+        if self.mode == "no-if-match" and IfMatch:
+            raise self._error("InvalidArgument", 400)
+        if self.mode != "ignored":
+            if IfNoneMatch == "*" and Key in self.objects:
+                raise self._error("PreconditionFailed", 412)
+            if IfMatch is not None and (Key not in self.objects or IfMatch != self._etag(Key)):
+                raise self._error("PreconditionFailed", 412)
+        self.objects[Key] = bytes(Body)
+        self.versions[Key] = self.versions.get(Key, 0) + 1
+        return {}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self._error("404", 404)
+        return {"ContentLength": len(self.objects[Key]), "LastModified": datetime.now(timezone.utc), "ETag": self._etag(Key)}
+
+    def get_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self._error("NoSuchKey", 404)
+        body = self.objects[Key]
+        return {"Body": type("Body", (), {"read": lambda self: body})(), "ETag": self._etag(Key)}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+        return {}
+
+
+def fake_b2(monkeypatch, mode: str) -> B2Storage:
+    s3 = FakeS3(mode)
+    monkeypatch.setattr(storage_mod, "_s3_client", lambda *args: s3)
+    monkeypatch.setattr(storage_mod, "_cas_support", {})
+    return B2Storage(endpoint_url="https://s3.example.invalid", bucket="b", access_key_id="k", secret_access_key="s")
+
+
+def test_b2_uses_conditional_writes_where_enforced(monkeypatch):
+    b2 = fake_b2(monkeypatch, "enforced")
+    assert b2.conditional_writes_supported()
+    assert b2.s3.objects == {}  # probe objects are cleaned up
+
+    assert update_json(b2, "doc.json", lambda obj: {"n": 1}) == {"n": 1}
+    _, etag = b2.read_with_etag("doc.json")
+    b2.write_bytes("doc.json", b"{}")
+    assert not b2.compare_and_swap("doc.json", b"{}", etag)
+
+
+@pytest.mark.parametrize("mode", ["ignored", "rejected"])
+def test_b2_falls_back_to_check_then_write_with_a_warning(monkeypatch, mode):
+    b2 = fake_b2(monkeypatch, mode)
+    with pytest.warns(RuntimeWarning, match="conditional writes"):
+        assert not b2.conditional_writes_supported()
+
+    # the fallback still refuses stale or existing targets it can see
+    assert b2.compare_and_swap("doc.json", b"1", None)
+    assert not b2.compare_and_swap("doc.json", b"2", None)
+    _, etag = b2.read_with_etag("doc.json")
+    assert b2.compare_and_swap("doc.json", b"2", etag)
+    assert not b2.compare_and_swap("doc.json", b"3", etag)
+    assert update_json(b2, "count.json", lambda n: n + 1, default=0) == 1
+
+
+def test_b2_refused_if_match_switches_to_the_fallback(monkeypatch):
+    b2 = fake_b2(monkeypatch, "no-if-match")
+    assert b2.conditional_writes_supported()
+    b2.write_json("doc.json", {"n": 1})
+
+    with pytest.warns(RuntimeWarning, match="conditional writes"):
+        assert update_json(b2, "doc.json", lambda obj: {"n": obj["n"] + 1}) == {"n": 2}
+    assert json.loads(b2.read_bytes("doc.json")) == {"n": 2}
+    assert not b2.conditional_writes_supported()
+
+
+def test_interleaved_probes_both_see_conditional_writes(monkeypatch):
+    a = fake_b2(monkeypatch, "enforced")
+    b = B2Storage(endpoint_url="https://s3.example.invalid", bucket="b", access_key_id="k", secret_access_key="s")
+    put = a.s3.put_object
+    results = []
+
+    def put_then_probe_b(**kw):
+        out = put(**kw)
+        if not results and "IfNoneMatch" not in kw:
+            # another replica's whole probe (put, conditional put, delete) lands inside ours
+            results.append(None)
+            results[0] = b._probe_conditional_writes()
+        return out
+
+    monkeypatch.setattr(a.s3, "put_object", put_then_probe_b)
+    assert a.conditional_writes_supported()
+    assert results == [True]
+    assert a.s3.objects == {}
+
+
+def test_probe_is_retried_before_giving_up_on_conditional_writes(monkeypatch):
+    b2 = fake_b2(monkeypatch, "ignored")
+    put = b2.s3.put_object
+    calls = []
+
+    def ignored_once(**kw):
+        calls.append(kw)
+        if len(calls) > 2:
+            b2.s3.mode = "enforced"
+        return put(**kw)
+
+    monkeypatch.setattr(b2.s3, "put_object", ignored_once)
+    assert b2.conditional_writes_supported()
+    assert len(calls) == 4
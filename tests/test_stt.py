@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+import pytest
+
+from core import stt
+from core.cache import BlobCache, stt_cache_key
+from core.storage import LocalStorage
+
+
+class FakeTranscriptions:
+    def __init__(self, takes_granularities: bool):
+        self.takes_granularities = takes_granularities
+        self.calls = []
+
+    def create(self, model, file, response_format, **kw):
+        if "timestamp_granularities" in kw and not self.takes_granularities:
+            raise TypeError("create() got an unexpected keyword argument 'timestamp_granularities'")
+        self.calls.append(kw)
+        return {"text": "hi", "segments": [{"start": 0, "end": 1, "text": "hi"}] if kw else []}
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    c = BlobCache(LocalStorage(tmp_path), prefix="cache/stt", ext="json", content_type="application/json")
+    monkeypatch.setattr(stt, "_stt_cache", c)
+    monkeypatch.setattr(stt, "_sdk_takes_granularities", True)
+    return c
+
+
+def use_sdk(monkeypatch, takes_granularities: bool) -> FakeTranscriptions:
+    t = FakeTranscriptions(takes_granularities)
+    client = SimpleNamespace(audio=SimpleNamespace(transcriptions=t))
+    monkeypatch.setattr(stt, "get_client", lambda: client)
+    return t
+
+
+def test_fallback_transcript_is_not_cached_as_segment_transcript(cache, monkeypatch):
+    old = use_sdk(monkeypatch, takes_granularities=False)
+    out = stt.whisper_segments_verbose_json("a.mp3", audio=b"audio")
+    assert out["segments"] == [] and len(old.calls) == 1
+    assert cache.get_json(stt_cache_key(b"audio", stt.STT_MODEL, [])) == out
+    assert cache.get_json(stt_cache_key(b"audio", stt.STT_MODEL, stt.STT_GRANULARITIES)) is None
+
+    # same process, same old SDK: the plain transcript is a hit now
+    stt.whisper_segments_verbose_json("a.mp3", audio=b"audio")
+    assert len(old.calls) == 1
+
+    # a newer SDK doesn't get the downgraded transcript
+    monkeypatch.setattr(stt, "_sdk_takes_granularities", True)
+    new = use_sdk(monkeypatch, takes_granularities=True)
+    out = stt.whisper_segments_verbose_json("a.mp3", audio=b"audio")
+    assert out["segments"] and new.calls == [{"timestamp_granularities": stt.STT_GRANULARITIES}]
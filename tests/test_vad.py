@@ -0,0 +1,14 @@
+import numpy as np
+
+from core.vad import pcm_to_mono
+
+
+def test_pcm_to_mono_ignores_a_trailing_partial_sample():
+    raw = np.array([0, 16384, -16384], dtype="<i2").tobytes() + b"\x7f"
+    x = pcm_to_mono(memoryview(raw), 1, 2)
+    assert x.tolist() == [0.0, 0.5, -0.5]
+
+
+def test_pcm_to_mono_averages_channels():
+    raw = np.array([16384, 0, -16384, -16384], dtype="<i2").tobytes()
+    assert pcm_to_mono(raw, 2, 2).tolist() == [0.25, -0.5]